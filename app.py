@@ -1,3 +1,5 @@
+import json
+
 import aws_cdk as cdk
 import boto3
 
@@ -5,6 +7,8 @@ from cdk_infrastructure import CDCStack
 
 app = cdk.App()
 environment = app.node.try_get_context("environment")
+with open("lambda_settings.json") as f:  # see `benchmarks/profile_handlers.py`
+    environment["LAMBDA_SETTINGS"] = json.load(f)
 account = boto3.client("sts").get_caller_identity()["Account"]
 response = (
     boto3.Session(region_name=environment["AWS_REGION"])
@@ -0,0 +1,2 @@
+"""Local benchmarks for the CDC Lambdas; run from the repo root, eg
+`python -m benchmarks.cold_start`."""
@@ -0,0 +1,117 @@
+"""Import time of each handler, which is the part of a Lambda cold start we control.
+
+Each handler is imported `--repeat` times, each in a fresh interpreter (like the
+Lambda runtime does on a cold start), with placeholder environment variables and
+the CDC runtime layer on `sys.path`. Medians are compared against
+`cold_start_baseline.json` and the exit code is 1 if any handler regressed, or
+has no baseline (eg a new handler) until the baseline is updated.
+
+    $ python -m benchmarks.cold_start
+    $ python -m benchmarks.cold_start --update-baseline
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.common import HANDLER_NAMES, SOURCE_DIR, create_subprocess_environment
+
+BASELINE_FILENAME = Path(__file__).resolve().parent / "cold_start_baseline.json"
+MEASURE_IMPORT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import handler
+import_seconds = time.perf_counter() - start
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "num_modules": len(sys.modules),
+}))
+"""
+
+
+def measure_handler(handler_name: str, repeat: int) -> dict:
+    measurements = []
+    for _ in range(repeat):
+        completed_process = subprocess.run(
+            [sys.executable, "-c", MEASURE_IMPORT],
+            cwd=SOURCE_DIR / handler_name,  # Lambda imports `handler` from its cwd
+            env=create_subprocess_environment(),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        measurements.append(json.loads(completed_process.stdout.splitlines()[-1]))
+    return {
+        key: statistics.median(measurement[key] for measurement in measurements)
+        for key in measurements[0]
+    }
+
+
+def find_regressions(
+    results: dict, baseline: dict, tolerance: float, min_seconds: float
+) -> list:
+    """Regressed if slower than baseline by more than `tolerance` (relative)
+    and `min_seconds` (absolute, so that noise on tiny imports is ignored), or
+    not in the baseline, so that a handler is never silently left unchecked"""
+    regressions = []
+    for handler_name, result in results.items():
+        if handler_name not in baseline:
+            regressions.append(f"{handler_name}: not in the baseline")
+            continue
+        baseline_seconds = baseline[handler_name]["import_seconds"]
+        slowdown_seconds = result["import_seconds"] - baseline_seconds
+        if (
+            slowdown_seconds > min_seconds
+            and slowdown_seconds > tolerance * baseline_seconds
+        ):
+            regressions.append(
+                f"{handler_name}: {result['import_seconds'] * 1000:.1f} ms "
+                f"(baseline {baseline_seconds * 1000:.1f} ms)"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-ms", type=float, default=5.0)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("handler_names", nargs="*", default=HANDLER_NAMES)
+    args = parser.parse_args()
+
+    results = {}
+    for handler_name in args.handler_names:
+        results[handler_name] = measure_handler(handler_name, repeat=args.repeat)
+        print(
+            f"{handler_name}: {results[handler_name]['import_seconds'] * 1000:.1f} ms, "
+            f"{results[handler_name]['num_modules']:.0f} modules, "
+            f"{results[handler_name]['max_rss_kb'] / 1024:.1f} MB max RSS"
+        )
+    if args.update_baseline:
+        baseline = {}
+        if BASELINE_FILENAME.exists():
+            baseline = json.loads(BASELINE_FILENAME.read_text())
+        baseline.update(results)
+        BASELINE_FILENAME.write_text(json.dumps(baseline, indent=4, sort_keys=True) + "\n")
+        print(f"Updated {BASELINE_FILENAME}")
+    elif not BASELINE_FILENAME.exists():
+        print(f"No baseline at {BASELINE_FILENAME}; run with --update-baseline")
+        sys.exit(1)
+    else:
+        regressions = find_regressions(
+            results,
+            baseline=json.loads(BASELINE_FILENAME.read_text()),
+            tolerance=args.tolerance,
+            min_seconds=args.min_ms / 1000,
+        )
+        if regressions:
+            print("Cold start regressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
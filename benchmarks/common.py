@@ -0,0 +1,160 @@
+import copy
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SOURCE_DIR = REPO_DIR / "source"
+CDC_RUNTIME_LAYER_DIR = SOURCE_DIR / "cdc_runtime_layer" / "python"
+EVENTS_DIR = Path(__file__).resolve().parent / "events"
+HANDLER_NAMES = sorted(
+    path.parent.name for path in SOURCE_DIR.glob("*/handler.py")
+)
+
+
+def load_cdk_environment() -> dict:
+    with open(REPO_DIR / "cdk.json") as f:
+        return json.load(f)["context"]["environment"]
+
+
+def create_lambda_environment(**overrides) -> dict:
+    """Environment variables of every handler (a superset, as extra ones are
+    ignored), where deploy time values are replaced by local placeholders.
+    The DynamoDB table of each CDC table is named after its registry key."""
+    environment = load_cdk_environment()
+    lambda_environment = {
+        "AWS_DEFAULT_REGION": environment["AWS_REGION"],
+        "AWS_ACCESS_KEY_ID": "local",
+        "AWS_SECRET_ACCESS_KEY": "local",
+        "AWSREGION": environment["AWS_REGION"],
+        "CSV_FILENAME": environment["CSV_FILENAME"],
+        "UNPROCESSED_DYNAMODB_STREAM_FOLDER": environment[
+            "UNPROCESSED_DYNAMODB_STREAM_FOLDER"
+        ],
+        "PROCESSED_DYNAMODB_STREAM_FOLDER": environment[
+            "PROCESSED_DYNAMODB_STREAM_FOLDER"
+        ],
+        "S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT": "local-cdc-bucket",
+        "RDS_HOST": "127.0.0.1",
+        "RDS_USER": environment["RDS_USER"],
+        "RDS_PASSWORD": environment["RDS_PASSWORD"],
+        "RDS_DATABASE_NAME": environment["RDS_DATABASE_NAME"],
+        "RDS_TABLE_NAME": environment["RDS_TABLE_NAME"],
+        "RDS_CSV_NORMALIZATION": json.dumps(environment["RDS_CSV_NORMALIZATION"]),
+        "DMS_REPLICATION_TASK_ARNS": json.dumps(
+            [
+                f"arn:aws:dms:{environment['AWS_REGION']}:000000000000:task:LOCAL{index}"
+                for index, _ in enumerate(
+                    environment["DMS_REPLICATION_TASK_TABLE_GROUPS"]
+                )
+            ]
+        ),
+        "DMS_REPLICATION_TASK_TABLE_GROUPS": json.dumps(
+            environment["DMS_REPLICATION_TASK_TABLE_GROUPS"]
+        ),
+        "PRINT_RDS_AND_REDSHIFT_NUM_ROWS": json.dumps(
+            environment["PRINT_RDS_AND_REDSHIFT_NUM_ROWS"]
+        ),
+        "REDSHIFT_ENDPOINT_ADDRESS": f"127.0.0.1:{environment['REDSHIFT_PORT']}",
+        "REDSHIFT_USER": environment["REDSHIFT_USER"],
+        "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
+        "REDSHIFT_ROLE_ARN": "arn:aws:iam::000000000000:role/local",
+        "REDSHIFT_DATABASE_NAME": environment["REDSHIFT_DATABASE_NAME"],
+        "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC": environment[
+            "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
+        ],
+        "MAX_CONCURRENT_REDSHIFT_COPIES": json.dumps(
+            environment["MAX_CONCURRENT_REDSHIFT_COPIES"]
+        ),
+        "REDSHIFT_ROLLUPS": json.dumps(environment["REDSHIFT_ROLLUPS"]),
+        "REDSHIFT_MAINTENANCE": json.dumps(environment["REDSHIFT_MAINTENANCE"]),
+        "DYNAMODB_CDC_TABLES": json.dumps(environment["DYNAMODB_CDC_TABLES"]),
+        "DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY": json.dumps(
+            {key: key for key in environment["DYNAMODB_CDC_TABLES"]}
+        ),
+        "DYNAMODB_CDC_TABLE_KEY_TO_TABLE_ARN": json.dumps(
+            {
+                key: f"arn:aws:dynamodb:{environment['AWS_REGION']}:000000000000:table/{key}"
+                for key in environment["DYNAMODB_CDC_TABLES"]
+            }
+        ),
+        "DYNAMODB_EXPORT_FOLDER": environment["DYNAMODB_EXPORT_BOOTSTRAP"]["S3_FOLDER"],
+        "INCREMENTAL_EXPORT_INTERVAL_MINUTES": json.dumps(
+            environment["DYNAMODB_EXPORT_BOOTSTRAP"]["INCREMENTAL_EXPORT_INTERVAL_MINUTES"]
+        ),
+        "DYNAMODB_AUDIT": json.dumps(environment["DYNAMODB_AUDIT"]),
+        "DYNAMODB_CDC_PIPELINE": json.dumps(environment["DYNAMODB_CDC_PIPELINE"]),
+        "DYNAMODB_SEEDING": json.dumps(environment["DYNAMODB_SEEDING"]),
+        "DYNAMODB_TABLE_NAME_TO_JSON_FILENAME": json.dumps(
+            {
+                key: cdc_table["JSON_FILENAME"]
+                for key, cdc_table in environment["DYNAMODB_CDC_TABLES"].items()
+                if "JSON_FILENAME" in cdc_table
+            }
+        ),
+    }
+    lambda_environment.update(overrides)
+    return lambda_environment
+
+
+def create_subprocess_environment(**overrides) -> dict:
+    """`os.environ` + Lambda environment, with the CDC runtime layer importable
+    the same way it is from `/opt/python` in Lambda"""
+    subprocess_environment = {**os.environ, **create_lambda_environment(**overrides)}
+    subprocess_environment["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(CDC_RUNTIME_LAYER_DIR), os.environ.get("PYTHONPATH")])
+    )
+    return subprocess_environment
+
+
+def add_cdc_runtime_to_path() -> None:
+    if str(CDC_RUNTIME_LAYER_DIR) not in sys.path:
+        sys.path.insert(0, str(CDC_RUNTIME_LAYER_DIR))
+
+
+def load_handler(handler_name: str):
+    """Imports `source/<handler_name>/handler.py` as module `<handler_name>`, so
+    that several handlers (all named `handler`) can be loaded in 1 process.
+    Handlers read their environment variables on import."""
+    if handler_name in sys.modules:
+        return sys.modules[handler_name]
+    spec = importlib.util.spec_from_file_location(
+        handler_name, SOURCE_DIR / handler_name / "handler.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[handler_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_event(event_name: str) -> dict:
+    with open(EVENTS_DIR / f"{event_name}.json") as f:
+        return json.load(f)
+
+
+def scale_dynamodb_stream_event(
+    event: dict, num_records: int, dynamodb_table_name: str
+) -> dict:
+    """Repeats the records of a recorded stream event up to `num_records`, with
+    unique keys and increasing sequence numbers, and points them at
+    `dynamodb_table_name` (real recorded events have CDK generated table names)"""
+    records = []
+    for index in range(num_records):
+        record = copy.deepcopy(event["Records"][index % len(event["Records"])])
+        table_arn, _, stream_label = record["eventSourceARN"].partition("/stream/")
+        record["eventSourceARN"] = (
+            f"{table_arn.rsplit('/', 1)[0]}/{dynamodb_table_name}/stream/{stream_label}"
+        )
+        dynamodb = record["dynamodb"]
+        dynamodb["SequenceNumber"] = f"{index + 1:021d}"
+        repetition = index // len(event["Records"])
+        if repetition:  # keep keys unique across repetitions
+            for key_name, typed_value in dynamodb["Keys"].items():
+                if "S" in typed_value:
+                    typed_value["S"] = f"{typed_value['S']}-{repetition}"
+                    if key_name in dynamodb.get("NewImage", {}):
+                        dynamodb["NewImage"][key_name] = dict(typed_value)
+        records.append(record)
+    return {"Records": records}
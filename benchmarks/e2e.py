@@ -0,0 +1,301 @@
+"""End-to-end throughput and latency of both CDC pipelines at configurable volumes.
+
+For each of `--volumes`, a fresh process seeds scaled copies of the seed data and
+runs the real handlers in the order the deployed stack does, against the
+stand-ins of `benchmarks.stand_ins` (S3, DynamoDB + stream, RDS MySQL, and
+Redshift, which speaks the same Postgres-like dialect the loader uses):
+
+    configure_rds -> load_data_to_rds
+    configure_redshift -> load_data_to_dynamodb -> (stream batches of
+    `--batch-size`) write_dynamodb_stream_to_s3 -> load_s3_files_..._to_redshift
+
+Each stage reports records/sec and the S3 requests/bytes it made, and the
+end-to-end latency is from each record's stream `ApproximateCreationDateTime`
+to the end of the load into Redshift. Results are saved as JSON (with the git
+commit and arguments) so runs can be compared with `--compare`.
+
+    $ python -m benchmarks.e2e --volumes 100,1000,10000 --s3-latency-ms 20
+    $ python -m benchmarks.e2e --compare benchmarks/results/<previous run>.json
+"""
+import argparse
+import copy
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.common import (
+    REPO_DIR,
+    add_cdc_runtime_to_path,
+    create_lambda_environment,
+    create_subprocess_environment,
+    load_cdk_environment,
+    load_event,
+    load_handler,
+)
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def write_scaled_seed_data(environment: dict, seed_data_dir: Path, num_records: int) -> None:
+    """Copies of the seed files with `num_records` rows/items each (DynamoDB items
+    get unique keys), named like the originals"""
+    from cdc_runtime.seed_data import get_seed_data_path
+
+    with open(get_seed_data_path(environment["CSV_FILENAME"])) as f:
+        header, *rows = list(csv.reader(f))
+    with open(seed_data_dir / environment["CSV_FILENAME"], "w", newline="") as f:
+        csv.writer(f).writerows(
+            [header] + [rows[index % len(rows)] for index in range(num_records)]
+        )
+    for cdc_table in environment["DYNAMODB_CDC_TABLES"].values():
+        if "JSON_FILENAME" not in cdc_table:
+            continue
+        with open(get_seed_data_path(cdc_table["JSON_FILENAME"])) as f:
+            items = json.load(f)["data"]
+        scaled_items = []
+        for index in range(num_records):
+            item = copy.deepcopy(items[index % len(items)])
+            repetition = index // len(items)
+            if repetition:
+                item[cdc_table["PARTITION_KEY"]] += f"-{repetition}"
+            scaled_items.append(item)
+        with open(seed_data_dir / cdc_table["JSON_FILENAME"], "w") as f:
+            json.dump({"data": scaled_items}, f)
+
+
+def get_percentiles(values: list) -> dict:
+    if len(values) < 2:
+        return {"p50": values[0], "p95": values[0], "max": values[0]} if values else {}
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": quantiles[49], "p95": quantiles[94], "max": max(values)}
+
+
+class StageTimer:
+    """Measures each stage's duration and the stand-ins' S3 traffic during it"""
+
+    def __init__(self, stand_ins):
+        self.stand_ins = stand_ins
+        self.stages = {}
+
+    def run(self, stage_name: str, num_records: int, invocations) -> None:
+        s3_requests_before = dict(self.stand_ins.s3_client.request_counts)
+        s3_bytes_written_before = self.stand_ins.s3_client.bytes_written
+        start = time.perf_counter()
+        for handler_name, event in invocations:
+            load_handler(handler_name).lambda_handler(event, None)
+        seconds = time.perf_counter() - start
+        self.stages[stage_name] = {
+            "records": num_records,
+            "seconds": seconds,
+            "records_per_second": num_records / seconds if seconds else None,
+            "s3_requests": {
+                operation_name: count - s3_requests_before.get(operation_name, 0)
+                for operation_name, count in self.stand_ins.s3_client.request_counts.items()
+                if count - s3_requests_before.get(operation_name, 0)
+            },
+            "s3_bytes_written": self.stand_ins.s3_client.bytes_written
+            - s3_bytes_written_before,
+        }
+
+
+def run_pipelines(num_records: int, batch_size: int, seed_data_dir: Path, args) -> dict:
+    os.environ.update(create_lambda_environment())
+    add_cdc_runtime_to_path()
+    from cdc_runtime import seed_data
+
+    from benchmarks.stand_ins import StandInServices
+
+    environment = load_cdk_environment()
+    stand_ins = StandInServices(
+        environment,
+        s3_latency_seconds=args.s3_latency_ms / 1000,
+        db_latency_seconds=args.db_latency_ms / 1000,
+        copy_latency_seconds=args.copy_latency_ms / 1000,
+        dynamodb_write_capacity_units_per_second=args.dynamodb_wcu,
+    )
+    stand_ins.install()
+    write_scaled_seed_data(environment, seed_data_dir, num_records)
+    seed_data.SEED_DATA_DIR = seed_data_dir  # handlers look seed files up by name
+    scheduled_event = load_event("scheduled_event")
+    timer = StageTimer(stand_ins)
+
+    # RDS -> (DMS) -> Redshift
+    load_handler("configure_rds_lambda").lambda_handler(scheduled_event, None)
+    timer.run(
+        "load_data_to_rds",
+        num_records,
+        [("load_data_to_rds_lambda", scheduled_event)],
+    )
+
+    # DynamoDB -> stream -> S3 -> Redshift
+    load_handler("configure_redshift_for_dynamodb_cdc_lambda").lambda_handler(
+        scheduled_event, None
+    )
+    num_cdc_tables = sum(
+        "JSON_FILENAME" in cdc_table
+        for cdc_table in environment["DYNAMODB_CDC_TABLES"].values()
+    )
+    timer.run(
+        "load_data_to_dynamodb",
+        num_records * num_cdc_tables,
+        [("load_data_to_dynamodb_lambda", scheduled_event)],
+    )
+    stream_events = [
+        stream_event
+        for table in stand_ins.dynamodb_resource.tables.values()
+        for stream_event in table.pop_stream_events(batch_size)
+    ]
+    approximate_creation_times = [
+        record["dynamodb"]["ApproximateCreationDateTime"]
+        for stream_event in stream_events
+        for record in stream_event["Records"]
+    ]
+    timer.run(
+        "write_dynamodb_stream_to_s3",
+        len(approximate_creation_times),
+        [("write_dynamodb_stream_to_s3_lambda", event) for event in stream_events],
+    )
+    timer.run(
+        "load_s3_files_from_dynamodb_stream_to_redshift",
+        len(approximate_creation_times),
+        [("load_s3_files_from_dynamodb_stream_to_redshift_lambda", scheduled_event)],
+    )
+    loaded_time = time.time()
+
+    num_rows_in_redshift = sum(
+        stand_ins.redshift_database.query(
+            f'SELECT COUNT(*) FROM "{environment["REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"]}".'
+            f'"{cdc_table["REDSHIFT_TABLE_NAME"]}"'
+        )[0][0]
+        for cdc_table in environment["DYNAMODB_CDC_TABLES"].values()
+    )
+    if num_rows_in_redshift != len(approximate_creation_times):
+        raise RuntimeError(
+            f"Expected {len(approximate_creation_times)} rows in Redshift, "
+            f"found {num_rows_in_redshift}"
+        )
+    return {
+        "num_records": num_records,
+        "stages": timer.stages,
+        "e2e_latency_seconds": get_percentiles(
+            [loaded_time - created_time for created_time in approximate_creation_times]
+        ),
+        "counters": stand_ins.get_counters(),
+    }
+
+
+def get_git_commit() -> str:
+    completed_process = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+    )
+    return completed_process.stdout.strip() or None
+
+
+def compare(results: dict, previous_results: dict) -> list:
+    """Lines of records/sec changes per volume and stage vs a previous run"""
+    previous_stages_per_volume = {
+        result["num_records"]: result["stages"] for result in previous_results["results"]
+    }
+    lines = []
+    for result in results["results"]:
+        previous_stages = previous_stages_per_volume.get(result["num_records"], {})
+        for stage_name, stage in result["stages"].items():
+            previous_stage = previous_stages.get(stage_name)
+            if not previous_stage or not previous_stage["records_per_second"]:
+                continue
+            change = stage["records_per_second"] / previous_stage["records_per_second"] - 1
+            lines.append(
+                f"{result['num_records']:>8} {stage_name}: "
+                f"{previous_stage['records_per_second']:.0f} -> "
+                f"{stage['records_per_second']:.0f} records/sec ({change:+.1%})"
+            )
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--volumes", default="100,1000,10000")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=load_cdk_environment()["DYNAMODB_STREAM_EVENT_SOURCE"]["BATCH_SIZE"],
+    )
+    parser.add_argument("--s3-latency-ms", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--copy-latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--dynamodb-wcu",
+        type=float,
+        help="write capacity units per second of a provisioned table (default on-demand)",
+    )
+    parser.add_argument("--output", help=f"defaults to a new file in {RESULTS_DIR}")
+    parser.add_argument("--compare", help="results JSON of a previous run")
+    parser.add_argument("--single-volume", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_volume is not None:  # in a fresh process, see below
+        with tempfile.TemporaryDirectory(prefix="cdc-e2e-") as seed_data_dir:
+            result = run_pipelines(
+                args.single_volume, args.batch_size, Path(seed_data_dir), args
+            )
+        print(json.dumps(result))  # last line of stdout; handlers print above it
+        return
+
+    results = {
+        "git_commit": get_git_commit(),
+        "started_at": datetime.now(tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python_version": platform.python_version(),
+        "args": {key: value for key, value in vars(args).items() if key != "single_volume"},
+        "results": [],
+    }
+    for num_records in map(int, args.volumes.split(",")):
+        completed_process = subprocess.run(  # handlers keep module level state
+            [sys.executable, "-m", "benchmarks.e2e", f"--single-volume={num_records}"]
+            + sys.argv[1:],
+            cwd=REPO_DIR,
+            env=create_subprocess_environment(),
+            capture_output=True,
+            text=True,
+        )
+        if completed_process.returncode:
+            raise RuntimeError(f"{num_records} records failed:\n{completed_process.stderr}")
+        result = json.loads(completed_process.stdout.splitlines()[-1])
+        results["results"].append(result)
+        for stage_name, stage in result["stages"].items():
+            print(
+                f"{num_records:>8} {stage_name}: {stage['records_per_second']:.0f} records/sec, "
+                f"{stage['s3_bytes_written']} S3 bytes written, S3 requests {stage['s3_requests']}"
+            )
+        print(
+            f"{num_records:>8} e2e latency (s): "
+            + ", ".join(
+                f"{name} {seconds:.3f}"
+                for name, seconds in result["e2e_latency_seconds"].items()
+            )
+        )
+
+    output = Path(
+        args.output
+        or RESULTS_DIR
+        / f"e2e__{results['started_at'].replace(':', '')}__{results['git_commit']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=4) + "\n")
+    print(f"Saved {output}")
+    if args.compare:
+        print("\n".join(compare(results, json.loads(Path(args.compare).read_text()))))
+
+
+if __name__ == "__main__":
+    main()
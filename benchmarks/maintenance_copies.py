@@ -0,0 +1,71 @@
+"""Checks that the maintenance Lambda defers its VACUUMs while the pipeline's
+own COPYs run: the DynamoDB loader is invoked in a thread against stand-ins
+whose COPYs take `--copy-latency-ms`, and the maintenance Lambda while its COPY
+(with the loader's actual SQL text) is in flight. Exits with 1 if any table is
+maintained instead of deferred.
+
+    $ python -m benchmarks.maintenance_copies
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.common import (
+    add_cdc_runtime_to_path,
+    create_lambda_environment,
+    load_cdk_environment,
+    load_event,
+    load_handler,
+)
+from benchmarks.run_handler import create_stream_event, prepare
+
+HANDLER_NAME = "maintain_redshift_tables_lambda"
+LOADER_HANDLER_NAME = "load_s3_files_from_dynamodb_stream_to_redshift_lambda"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num-records", type=int, default=100)
+    parser.add_argument("--copy-latency-ms", type=float, default=1000.0)
+    args = parser.parse_args()
+    environment = load_cdk_environment()
+    os.environ.update(create_lambda_environment())
+    add_cdc_runtime_to_path()
+    from benchmarks.stand_ins import StandInServices
+
+    stand_ins = StandInServices(environment)
+    stand_ins.install()
+    redshift_database = stand_ins.redshift_database
+    scheduled_event = load_event("scheduled_event")
+    with contextlib.redirect_stdout(io.StringIO()):  # the handlers' metric logs
+        event = prepare(HANDLER_NAME, environment, stand_ins, args.num_records)
+        load_handler("write_dynamodb_stream_to_s3_lambda").lambda_handler(
+            create_stream_event(environment, args.num_records), None
+        )
+        redshift_database.copy_latency_seconds = args.copy_latency_ms / 1000
+        loader = threading.Thread(
+            target=load_handler(LOADER_HANDLER_NAME).lambda_handler,
+            args=(scheduled_event, None),
+        )
+        loader.start()
+        while not any(  # until the loader's COPY is in flight
+            "COPY" in sql_statement
+            for sql_statement in list(redshift_database.running_sql_statements)
+        ):
+            time.sleep(0.001)
+        summary = load_handler(HANDLER_NAME).lambda_handler(event, None)
+        loader.join()
+    print(json.dumps(summary, indent=4))
+    if summary["maintained"] or not summary["deferred"]:
+        print("Maintained tables while a COPY was running")
+        sys.exit(1)
+    print(f"Deferred {len(summary['deferred'])} tables while the loader's COPY was running")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Parses recorded Kinesis records of DynamoDB changes the way the Redshift
+streaming ingestion materialized view does (`cdc_runtime.kinesis`), prints the
+resulting rows, and checks their typed columns against the items deserialized
+the S3 path's way. Exits with 1 if any differ.
+
+    $ python -m benchmarks.parse_kinesis_records
+    $ python -m benchmarks.parse_kinesis_records --sql  # view's SQL statements
+    $ python -m benchmarks.parse_kinesis_records --record-from \\
+        benchmarks/events/dynamodb_stream_event.json  # Kinesis event of a stream event
+
+Records are in Lambda's Kinesis event format (`{"Records": [{"kinesis": ...}]}`),
+so events logged by a Lambda on the stream (or `GetRecords` output with its
+`Records` key) can be used as recordings.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import sys
+
+from benchmarks.common import (
+    EVENTS_DIR,
+    add_cdc_runtime_to_path,
+    load_cdk_environment,
+)
+
+
+def create_kinesis_record(stream_record: dict, sequence_number: str) -> dict:
+    """The Kinesis record that DynamoDB puts for a change, from its DynamoDB
+    stream record: the same payload except for the millisecond creation time
+    and no stream sequence number"""
+    dynamodb = dict(stream_record["dynamodb"])
+    approximate_creation_time = dynamodb["ApproximateCreationDateTime"]
+    dynamodb["ApproximateCreationDateTime"] = int(approximate_creation_time * 1000)
+    dynamodb["ApproximateCreationDateTimePrecision"] = "MILLISECOND"
+    for key in ["SequenceNumber", "StreamViewType"]:
+        dynamodb.pop(key, None)
+    payload = {
+        "awsRegion": stream_record["awsRegion"],
+        "eventID": stream_record["eventID"],
+        "eventName": stream_record["eventName"],
+        "userIdentity": None,
+        "recordFormat": "application/json",
+        "tableName": stream_record["eventSourceARN"].split(":", 5)[5].split("/")[1],
+        "dynamodb": dynamodb,
+        "eventSource": "aws:dynamodb",
+    }
+    return {
+        "kinesis": {
+            "kinesisSchemaVersion": "1.0",
+            "partitionKey": hashlib.md5(
+                json.dumps(dynamodb["Keys"], sort_keys=True).encode()
+            ).hexdigest().upper(),
+            "sequenceNumber": sequence_number,
+            "data": base64.b64encode(json.dumps(payload).encode()).decode(),
+            "approximateArrivalTimestamp": approximate_creation_time + 0.05,
+        },
+        "eventSource": "aws:kinesis",
+        "eventVersion": "1.0",
+        "eventID": f"shardId-000000000000:{sequence_number}",
+        "eventName": "aws:kinesis:record",
+        "eventSourceARN": (
+            f"arn:aws:kinesis:{stream_record['awsRegion']}:000000000000:stream/"
+            f"{payload['tableName']}"
+        ),
+        "awsRegion": stream_record["awsRegion"],
+    }
+
+
+def check_row(row: dict, kinesis_record: dict, cdc_table: dict) -> list:
+    """Differences of the row's typed (and promoted) columns from the S3 path's
+    deserialization"""
+    from cdc_runtime.kinesis import get_column_extractions
+    from cdc_runtime.promotion import get_promoted_columns, promote_columns
+    from cdc_runtime.serializers import deserialize_dynamodb_image
+
+    payload = json.loads(base64.b64decode(kinesis_record["kinesis"]["data"]))
+    promoted_columns = get_promoted_columns(cdc_table)
+    item = promote_columns(
+        deserialize_dynamodb_image(payload["dynamodb"]["NewImage"]), promoted_columns
+    )
+    column_names = [
+        column_name
+        for column_name, _, dynamodb_type in get_column_extractions(
+            cdc_table["REDSHIFT_COLUMNS"]
+        )
+        if dynamodb_type is not None
+    ] + [column_name for _, column_name, _ in promoted_columns]
+    return [
+        f"`{column_name}`: {row[column_name]!r} != {item.get(column_name)!r}"
+        for column_name in column_names
+        if row[column_name] != item.get(column_name)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "event", nargs="?", default=str(EVENTS_DIR / "kinesis_dynamodb_event.json")
+    )
+    parser.add_argument("--cdc-table-key", help="defaults to the first CDC table")
+    parser.add_argument("--sql", action="store_true")
+    parser.add_argument("--record-from", help="DynamoDB stream event to convert")
+    args = parser.parse_args()
+    add_cdc_runtime_to_path()
+    from cdc_runtime.kinesis import (
+        create_streaming_materialized_view_sql_statements,
+        parse_kinesis_record,
+    )
+    from cdc_runtime.promotion import get_promoted_columns
+
+    environment = load_cdk_environment()
+    cdc_table_key = args.cdc_table_key or next(iter(environment["DYNAMODB_CDC_TABLES"]))
+    cdc_table = environment["DYNAMODB_CDC_TABLES"][cdc_table_key]
+
+    if args.record_from:
+        with open(args.record_from) as f:
+            stream_records = json.load(f)["Records"]
+        kinesis_event = {
+            "Records": [
+                create_kinesis_record(stream_record, sequence_number=f"{index + 1:056d}")
+                for index, stream_record in enumerate(stream_records)
+            ]
+        }
+        with open(args.event, "w") as f:
+            json.dump(kinesis_event, f, indent=4)
+            f.write("\n")
+        print(f"Recorded {len(stream_records)} Kinesis records in {args.event}")
+        return
+    if args.sql:
+        print(
+            "\n\n".join(
+                create_streaming_materialized_view_sql_statements(
+                    redshift_table=(
+                        f'"{environment["REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"]}".'
+                        f'"{cdc_table["REDSHIFT_TABLE_NAME"]}"'
+                    ),
+                    external_schema_name=environment["DYNAMODB_CDC_PIPELINE"]["KINESIS"][
+                        "EXTERNAL_SCHEMA_NAME"
+                    ],
+                    kinesis_stream_name="<Kinesis stream name>",
+                    redshift_columns=cdc_table["REDSHIFT_COLUMNS"],
+                    redshift_role_arn="<Redshift role ARN>",
+                    promoted_columns=get_promoted_columns(cdc_table),
+                )
+            )
+        )
+        return
+
+    with open(args.event) as f:
+        kinesis_records = json.load(f)["Records"]
+    num_rows, differences = 0, []
+    for kinesis_record in kinesis_records:
+        row = parse_kinesis_record(
+            kinesis_record, cdc_table["REDSHIFT_COLUMNS"], get_promoted_columns(cdc_table)
+        )
+        if row is None:
+            continue
+        num_rows += 1
+        print(json.dumps(row))
+        differences += [
+            f"{row['cdc_sequence_number']} {difference}"
+            for difference in check_row(row, kinesis_record, cdc_table)
+        ]
+    print(
+        f"{len(kinesis_records)} Kinesis records -> {num_rows} rows, "
+        f"{len(differences)} differences",
+        file=sys.stderr,
+    )
+    for difference in differences:
+        print(difference, file=sys.stderr)
+    sys.exit(1 if differences else 0)
+
+
+if __name__ == "__main__":
+    main()
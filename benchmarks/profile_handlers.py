@@ -0,0 +1,180 @@
+"""Memory/timeout right-sizing of each Lambda from measured profiles.
+
+Replays the recorded events in `benchmarks/events/` against each real handler
+(with the stand-ins of `benchmarks.stand_ins`), once per `--memory-sizes`
+setting and `--repeat` times each, in a fresh process per run. Lambda allocates
+CPU in proportion to memory (1 vCPU at 1769 MB), so each run is CPU throttled to
+`memory_size / 1769` of 1 core, by alternately stopping and continuing it.
+
+For each handler, the recommended `MEMORY_SIZE` is picked among the settings
+whose peak RSS fits with `--headroom`: with `--strategy cost` it is the cheapest
+one (in GB-seconds), and with `--strategy speed` the cheapest one within
+`--tolerance` of the fastest one. The recommended `TIMEOUT_SECONDS` is
+`--timeout-factor` times its slowest cold invocation (import + duration).
+`--write` saves them to `lambda_settings.json`, which `CDCStack` reads.
+
+    $ python -m benchmarks.profile_handlers --num-records 100 --s3-latency-ms 20
+    $ python -m benchmarks.profile_handlers --write
+"""
+import argparse
+import json
+import math
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import HANDLER_NAMES, REPO_DIR, create_subprocess_environment
+
+LAMBDA_SETTINGS_FILENAME = REPO_DIR / "lambda_settings.json"
+MEMORY_SIZE_FOR_1_VCPU = 1769  # in MB
+THROTTLE_PERIOD_SECONDS = 0.02
+MIN_TIMEOUT_SECONDS = 3
+MAX_TIMEOUT_SECONDS = 900
+
+
+def run_throttled(command: list, cpu_fraction: float) -> str:
+    """Runs `command` with at most `cpu_fraction` of 1 core and returns stdout"""
+    process = subprocess.Popen(
+        command,
+        cwd=REPO_DIR,
+        env=create_subprocess_environment(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if cpu_fraction < 1:
+        running_seconds = THROTTLE_PERIOD_SECONDS * cpu_fraction
+        stopped_seconds = THROTTLE_PERIOD_SECONDS - running_seconds
+        try:
+            while process.poll() is None:
+                time.sleep(running_seconds)
+                os.kill(process.pid, signal.SIGSTOP)
+                time.sleep(stopped_seconds)
+                os.kill(process.pid, signal.SIGCONT)
+        except ProcessLookupError:  # exited in between
+            pass
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{stderr}")
+    return stdout
+
+
+def profile_handler(handler_name: str, memory_size: int, args) -> dict:
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.run_handler",
+        handler_name,
+        f"--num-records={args.num_records}",
+        f"--s3-latency-ms={args.s3_latency_ms}",
+        f"--db-latency-ms={args.db_latency_ms}",
+        f"--copy-latency-ms={args.copy_latency_ms}",
+    ]
+    results = [
+        json.loads(
+            run_throttled(
+                command, cpu_fraction=min(1.0, memory_size / MEMORY_SIZE_FOR_1_VCPU)
+            ).splitlines()[-1]
+        )
+        for _ in range(args.repeat)
+    ]
+    duration_seconds = statistics.median(result["duration_seconds"] for result in results)
+    return {
+        "memory_size": memory_size,
+        "duration_seconds": duration_seconds,
+        "import_seconds": statistics.median(result["import_seconds"] for result in results),
+        "max_cold_seconds": max(
+            result["import_seconds"] + result["duration_seconds"] for result in results
+        ),
+        "max_rss_mb": max(result["max_rss_kb"] for result in results) / 1024,
+        "gb_seconds": duration_seconds * memory_size / 1024,
+    }
+
+
+def recommend(
+    profiles: list, strategy: str, headroom: float, tolerance: float, timeout_factor: float
+) -> dict:
+    fitting_profiles = [
+        profile for profile in profiles if profile["max_rss_mb"] * headroom <= profile["memory_size"]
+    ] or [max(profiles, key=lambda profile: profile["memory_size"])]
+    fastest_seconds = min(profile["duration_seconds"] for profile in fitting_profiles)
+    if strategy == "cost":
+        tolerance = math.inf
+    profile = min(
+        (
+            profile
+            for profile in fitting_profiles
+            if profile["duration_seconds"] <= fastest_seconds * (1 + tolerance)
+        ),
+        key=lambda profile: (profile["gb_seconds"], profile["memory_size"]),
+    )
+    return {
+        "MEMORY_SIZE": profile["memory_size"],
+        "TIMEOUT_SECONDS": min(
+            MAX_TIMEOUT_SECONDS,
+            max(MIN_TIMEOUT_SECONDS, math.ceil(profile["max_cold_seconds"] * timeout_factor)),
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--memory-sizes", default="128,256,512,1024,1769")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--num-records", type=int, default=100)
+    parser.add_argument("--s3-latency-ms", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--copy-latency-ms", type=float, default=0.0)
+    parser.add_argument("--strategy", choices=["cost", "speed"], default="cost")
+    parser.add_argument("--headroom", type=float, default=1.25)
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--timeout-factor", type=float, default=3.0)
+    parser.add_argument("--output", help="also save all profiles to this JSON file")
+    parser.add_argument("--write", action="store_true", help=f"update {LAMBDA_SETTINGS_FILENAME.name}")
+    parser.add_argument("handler_names", nargs="*", default=HANDLER_NAMES)
+    args = parser.parse_args()
+
+    all_profiles, recommendations = {}, {}
+    for handler_name in args.handler_names:
+        all_profiles[handler_name] = []
+        for memory_size in map(int, args.memory_sizes.split(",")):
+            profile = profile_handler(handler_name, memory_size, args)
+            all_profiles[handler_name].append(profile)
+            print(
+                f"{handler_name} @ {memory_size} MB: "
+                f"{profile['duration_seconds'] * 1000:.1f} ms "
+                f"(+ {profile['import_seconds'] * 1000:.1f} ms import), "
+                f"{profile['max_rss_mb']:.1f} MB peak RSS, "
+                f"{profile['gb_seconds'] * 1000:.3f} GB-ms"
+            )
+        recommendations[handler_name] = recommend(
+            all_profiles[handler_name],
+            strategy=args.strategy,
+            headroom=args.headroom,
+            tolerance=args.tolerance,
+            timeout_factor=args.timeout_factor,
+        )
+        print(f"{handler_name} recommendation: {recommendations[handler_name]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"args": vars(args), "profiles": all_profiles, "recommendations": recommendations},
+                f,
+                indent=4,
+            )
+    if args.write:
+        with open(LAMBDA_SETTINGS_FILENAME) as f:
+            lambda_settings = json.load(f)
+        lambda_settings.update(recommendations)
+        with open(LAMBDA_SETTINGS_FILENAME, "w") as f:
+            json.dump(lambda_settings, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print(f"Updated {LAMBDA_SETTINGS_FILENAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""RDS connections opened and invocation latency of the scheduled RDS loader, with
+and without the warm container connection cache.
+
+`--containers` warm Lambda containers of `load_data_to_rds_lambda` (each its own
+copy of the handler module, so its own `rds_connection_pool`) are invoked
+concurrently for `--rounds` rounds against the MySQL stand-in of
+`benchmarks.stand_ins`, whose handshake takes 3 round trips of `--db-latency-ms`.
+In the "fresh" mode each invocation closes its connection, like the handlers did
+before the cache. `--drop-every N` drops the open connections server side every
+N rounds (like MySQL's `wait_timeout` or the RDS Proxy's idle client timeout), so
+that the health checks have to replace them.
+
+    $ python -m benchmarks.rds_connections --containers 8 --rounds 10 --db-latency-ms 5
+    $ python -m benchmarks.rds_connections --drop-every 3
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import (
+    SOURCE_DIR,
+    add_cdc_runtime_to_path,
+    create_lambda_environment,
+    load_cdk_environment,
+    load_event,
+    load_handler,
+)
+
+HANDLER_NAME = "load_data_to_rds_lambda"
+
+
+def load_container(container_index: int):
+    """A copy of the handler module, as a separate warm container has"""
+    spec = importlib.util.spec_from_file_location(
+        f"{HANDLER_NAME}_{container_index}", SOURCE_DIR / HANDLER_NAME / "handler.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def invoke(container, event: dict, cached: bool) -> float:
+    start = time.perf_counter()
+    container.lambda_handler(event, None)
+    if not cached:
+        container.rds_connection_pool.close_all()
+    return time.perf_counter() - start
+
+
+def run(
+    mode: str,
+    num_containers: int,
+    num_rounds: int,
+    db_latency_seconds: float,
+    drop_every: int,
+) -> dict:
+    from benchmarks.stand_ins import StandInServices
+
+    stand_ins = StandInServices(load_cdk_environment(), db_latency_seconds=db_latency_seconds)
+    stand_ins.install()
+    event = load_event("scheduled_event")
+    rds_database = stand_ins.rds_database
+    with contextlib.redirect_stdout(io.StringIO()):  # the handlers' metric logs
+        load_handler("configure_rds_lambda").lambda_handler(event, None)
+        load_handler("configure_rds_lambda").rds_connection_pool.close_all()
+        num_connections_before = rds_database.num_connections
+        containers = [load_container(index) for index in range(num_containers)]
+        seconds, num_dropped = [], 0
+        with ThreadPoolExecutor(max_workers=num_containers) as executor:
+            for round_index in range(num_rounds):
+                if drop_every and round_index and round_index % drop_every == 0:
+                    num_dropped += rds_database.drop_connections()
+                seconds += executor.map(
+                    lambda container: invoke(container, event, cached=mode == "cached"),
+                    containers,
+                )
+        for container in containers:
+            container.rds_connection_pool.close_all()
+    quantiles = statistics.quantiles(seconds, n=20)
+    return {
+        "mode": mode,
+        "invocations": len(seconds),
+        "connections_opened": rds_database.num_connections - num_connections_before,
+        "max_concurrent_connections": rds_database.max_concurrent_connections,
+        "connections_dropped": num_dropped,
+        "p50_ms": statistics.median(seconds) * 1000,
+        "p95_ms": quantiles[18] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--containers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--drop-every", type=int, default=0)
+    parser.add_argument("--output", help="also saves the results as JSON")
+    args = parser.parse_args()
+    os.environ.update(create_lambda_environment())
+    add_cdc_runtime_to_path()
+
+    results = [
+        run(
+            mode,
+            num_containers=args.containers,
+            num_rounds=args.rounds,
+            db_latency_seconds=args.db_latency_ms / 1000,
+            drop_every=args.drop_every,
+        )
+        for mode in ["fresh", "cached"]
+    ]
+    for result in results:
+        print(
+            f"{result['mode']:>6}: {result['invocations']} invocations, "
+            f"{result['connections_opened']} connections opened "
+            f"(max {result['max_concurrent_connections']} concurrent, "
+            f"{result['connections_dropped']} dropped), "
+            f"latency p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"arguments": vars(args), "results": results}, f, indent=4)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
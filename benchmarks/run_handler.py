@@ -0,0 +1,176 @@
+"""Runs 1 cold invocation of 1 real handler against the stand-ins and prints its
+measurements as JSON. Used by `benchmarks.profile_handlers`, which runs it in a
+fresh (CPU throttled) process per measurement.
+
+    $ python -m benchmarks.run_handler write_dynamodb_stream_to_s3_lambda --num-records 100
+"""
+import argparse
+import json
+import os
+import resource
+import time
+
+from benchmarks.common import (
+    add_cdc_runtime_to_path,
+    create_lambda_environment,
+    load_cdk_environment,
+    load_event,
+    load_handler,
+    scale_dynamodb_stream_event,
+)
+
+
+def create_stream_event(environment: dict, num_records: int) -> dict:
+    return scale_dynamodb_stream_event(
+        load_event("dynamodb_stream_event"),
+        num_records=num_records,
+        dynamodb_table_name=next(iter(environment["DYNAMODB_CDC_TABLES"])),
+    )
+
+
+def replicate_rds_to_redshift_like_dms(environment: dict, stand_ins) -> None:
+    schema = environment["RDS_DATABASE_NAME"]
+    table = environment["RDS_TABLE_NAME"]
+    stand_ins.redshift_database.create_schema(schema)
+    column_names = [
+        row[1] for row in stand_ins.rds_database.query(f"PRAGMA `{schema}`.table_info(`{table}`)")
+    ]
+    stand_ins.redshift_database.query(
+        f'CREATE TABLE "{schema}"."{table}" ({", ".join(column_names)})'
+    )
+    for row in stand_ins.rds_database.query(f"SELECT * FROM `{schema}`.`{table}`"):
+        stand_ins.redshift_database.query(
+            f'INSERT INTO "{schema}"."{table}" VALUES ({", ".join(["?"] * len(row))})',
+            row,
+        )
+
+
+def prepare(handler_name: str, environment: dict, stand_ins, num_records: int) -> dict:
+    """Puts the stand-ins in the state the handler expects (by running the real
+    upstream handlers) and returns the event to invoke the handler with"""
+    from cdc_runtime.serializers import deserialize_dynamodb_image
+
+    scheduled_event = load_event("scheduled_event")
+    if handler_name == "write_dynamodb_stream_to_s3_lambda":
+        return create_stream_event(environment, num_records)
+    if handler_name == "load_s3_files_from_dynamodb_stream_to_redshift_lambda":
+        load_handler("configure_redshift_for_dynamodb_cdc_lambda").lambda_handler(
+            scheduled_event, None
+        )
+        load_handler("write_dynamodb_stream_to_s3_lambda").lambda_handler(
+            create_stream_event(environment, num_records), None
+        )
+    elif handler_name == "audit_dynamodb_against_redshift_lambda":
+        load_handler("configure_redshift_for_dynamodb_cdc_lambda").lambda_handler(
+            scheduled_event, None
+        )
+        table = stand_ins.dynamodb_resource.Table(next(iter(environment["DYNAMODB_CDC_TABLES"])))
+        for record in create_stream_event(environment, num_records)["Records"]:
+            if "NewImage" in record["dynamodb"]:
+                table.put_item(Item=deserialize_dynamodb_image(record["dynamodb"]["NewImage"]))
+        for stream_event in table.pop_stream_events(batch_size=100):
+            load_handler("write_dynamodb_stream_to_s3_lambda").lambda_handler(stream_event, None)
+        load_handler("load_s3_files_from_dynamodb_stream_to_redshift_lambda").lambda_handler(
+            scheduled_event, None
+        )
+        for key in list(table.items)[:2]:  # deletes, which the stream writer drops
+            table.delete_item(Key={table.partition_key: key})
+    elif handler_name == "bootstrap_dynamodb_to_redshift_lambda":
+        load_handler("configure_redshift_for_dynamodb_cdc_lambda").lambda_handler(
+            scheduled_event, None
+        )
+        table = stand_ins.dynamodb_resource.Table(next(iter(environment["DYNAMODB_CDC_TABLES"])))
+        for record in create_stream_event(environment, num_records)["Records"]:
+            if "NewImage" in record["dynamodb"]:
+                table.put_item(Item=deserialize_dynamodb_image(record["dynamodb"]["NewImage"]))
+        load_handler(handler_name).lambda_handler(scheduled_event, None)  # starts the export
+    elif handler_name == "maintain_redshift_tables_lambda":  # both CDC targets
+        for upstream_handler_name in [
+            "configure_redshift_for_dynamodb_cdc_lambda",
+            "configure_rds_lambda",
+            "load_data_to_rds_lambda",
+        ]:
+            load_handler(upstream_handler_name).lambda_handler(scheduled_event, None)
+        load_handler("write_dynamodb_stream_to_s3_lambda").lambda_handler(
+            create_stream_event(environment, num_records), None
+        )
+        load_handler("load_s3_files_from_dynamodb_stream_to_redshift_lambda").lambda_handler(
+            scheduled_event, None
+        )
+        replicate_rds_to_redshift_like_dms(environment, stand_ins)
+    elif handler_name == "load_data_to_rds_lambda":
+        load_handler("configure_rds_lambda").lambda_handler(scheduled_event, None)
+    elif handler_name == "start_dms_replication_task_lambda":
+        load_handler("configure_rds_lambda").lambda_handler(scheduled_event, None)
+        load_handler("load_data_to_rds_lambda").lambda_handler(scheduled_event, None)
+        replicate_rds_to_redshift_like_dms(environment, stand_ins)
+    return scheduled_event
+
+
+def run_handler(
+    handler_name: str,
+    num_records: int,
+    s3_latency_seconds: float,
+    db_latency_seconds: float,
+    copy_latency_seconds: float,
+    dynamodb_write_capacity_units_per_second: float = None,
+) -> dict:
+    os.environ.update(create_lambda_environment())
+    add_cdc_runtime_to_path()
+    from benchmarks.stand_ins import StandInServices
+
+    environment = load_cdk_environment()
+    stand_ins = StandInServices(
+        environment,
+        s3_latency_seconds=s3_latency_seconds,
+        db_latency_seconds=db_latency_seconds,
+        copy_latency_seconds=copy_latency_seconds,
+        dynamodb_write_capacity_units_per_second=dynamodb_write_capacity_units_per_second,
+    )
+    stand_ins.install()
+
+    start = time.perf_counter()
+    handler = load_handler(handler_name)
+    import_seconds = time.perf_counter() - start
+    event = prepare(handler_name, environment, stand_ins, num_records=num_records)
+    counters_before = stand_ins.get_counters()
+
+    start = time.perf_counter()
+    handler.lambda_handler(event, None)
+    duration_seconds = time.perf_counter() - start
+    return {
+        "handler_name": handler_name,
+        "import_seconds": import_seconds,
+        "duration_seconds": duration_seconds,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "counters_before": counters_before,
+        "counters": stand_ins.get_counters(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("handler_name")
+    parser.add_argument("--num-records", type=int, default=100)
+    parser.add_argument("--s3-latency-ms", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--copy-latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--dynamodb-wcu",
+        type=float,
+        help="write capacity units per second of a provisioned table (default on-demand)",
+    )
+    args = parser.parse_args()
+    result = run_handler(
+        args.handler_name,
+        num_records=args.num_records,
+        s3_latency_seconds=args.s3_latency_ms / 1000,
+        db_latency_seconds=args.db_latency_ms / 1000,
+        copy_latency_seconds=args.copy_latency_ms / 1000,
+        dynamodb_write_capacity_units_per_second=args.dynamodb_wcu,
+    )
+    print(json.dumps(result))  # last line of stdout; handlers print above it
+
+
+if __name__ == "__main__":
+    main()
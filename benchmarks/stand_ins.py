@@ -0,0 +1,1073 @@
+"""In-process stand-ins for the AWS services and databases used by the handlers.
+
+The handlers create AWS clients through `cdc_runtime.clients` and import
+`pymysql`/`redshift_connector` lazily, so `StandInServices.install()` only has to
+fill the client cache and `sys.modules` to make the real handler code run
+against the stand-ins. Each stand-in counts requests and can add latency per
+request, so that runs are comparable to the deployed stack in shape (if not in
+absolute numbers)."""
+import gzip
+import hashlib
+import io
+import json
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+import types
+import uuid
+import weakref
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from cdc_runtime.serializers import deserialize_dynamodb_image, serialize_dynamodb_item
+
+ACCOUNT_ID = "000000000000"
+
+# parameters the way PyMySQL and redshift_connector send them
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+
+
+class StandInClientError(Exception):
+    """Mimics `botocore.exceptions.ClientError`"""
+
+    def __init__(self, code: str, operation_name: str):
+        super().__init__(f"An error occurred ({code}) when calling {operation_name}")
+        self.response = {"Error": {"Code": code, "Message": str(self)}}
+        self.operation_name = operation_name
+
+
+class StandInS3Client:
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.buckets = defaultdict(dict)  # bucket -> key -> bytes
+        self.request_counts = Counter()
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def _request(self, operation_name: str) -> None:
+        with self._lock:
+            self.request_counts[operation_name] += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def put_object(self, Bucket: str, Key: str, Body=b"", **kwargs) -> dict:
+        self._request("PutObject")
+        if isinstance(Body, str):
+            Body = Body.encode()
+        with self._lock:
+            self.buckets[Bucket][Key] = bytes(Body)
+            self.bytes_written += len(Body)
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self._request("GetObject")
+        try:
+            body = self.buckets[Bucket][Key]
+        except KeyError:
+            raise StandInClientError("NoSuchKey", "GetObject")
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: dict, **kwargs) -> dict:
+        self._request("CopyObject")
+        try:
+            body = self.buckets[CopySource["Bucket"]][CopySource["Key"]]
+        except KeyError:
+            raise StandInClientError("NoSuchKey", "CopyObject")
+        with self._lock:
+            self.buckets[Bucket][Key] = body
+        return {}
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self._request("DeleteObject")
+        with self._lock:
+            self.buckets[Bucket].pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs) -> dict:
+        self._request("DeleteObjects")
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.buckets[Bucket].pop(obj["Key"], None)
+        return {"Deleted": Delete["Objects"]}
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        Prefix: str = "",
+        Delimiter: str = None,
+        ContinuationToken: str = None,
+        MaxKeys: int = 1000,
+        **kwargs,
+    ) -> dict:
+        self._request("ListObjectsV2")
+        with self._lock:
+            keys = sorted(key for key in self.buckets[Bucket] if key.startswith(Prefix))
+        contents, common_prefixes = [], []
+        for key in keys:
+            if Delimiter and Delimiter in key[len(Prefix) :]:
+                common_prefix = key[: key.index(Delimiter, len(Prefix)) + 1]
+                if common_prefix not in common_prefixes:
+                    common_prefixes.append(common_prefix)
+            else:
+                contents.append(key)
+        start = int(ContinuationToken or 0)
+        page = contents[start : start + MaxKeys]
+        response = {
+            "KeyCount": len(page),
+            "Contents": [
+                {"Key": key, "Size": len(self.buckets[Bucket].get(key, b""))}
+                for key in page
+            ],
+            "CommonPrefixes": [{"Prefix": prefix} for prefix in common_prefixes],
+            "IsTruncated": start + MaxKeys < len(contents),
+        }
+        if not page:
+            del response["Contents"]
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation_name: str):
+        assert operation_name == "list_objects_v2", operation_name
+        return StandInListObjectsV2Paginator(self)
+
+
+class StandInListObjectsV2Paginator:
+    def __init__(self, s3_client: StandInS3Client):
+        self.s3_client = s3_client
+
+    def paginate(self, **kwargs):
+        continuation_token = None
+        while True:
+            response = self.s3_client.list_objects_v2(
+                ContinuationToken=continuation_token, **kwargs
+            )
+            yield response
+            if not response["IsTruncated"]:
+                return
+            continuation_token = response["NextContinuationToken"]
+
+
+def deserialize_dynamodb_key(typed_value: dict):
+    ((dynamodb_type, value),) = typed_value.items()
+    return int(value) if dynamodb_type == "N" else value
+
+
+class StandInDynamoDBTable:
+    """Keeps a NEW_IMAGE stream of every write, like the CDC DynamoDB tables"""
+
+    def __init__(self, name: str, partition_key: str, region: str):
+        self.name = name
+        self.table_name = name
+        self.partition_key = partition_key
+        self.table_arn = f"arn:aws:dynamodb:{region}:{ACCOUNT_ID}:table/{name}"
+        self.stream_label = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+        self.stream_arn = f"{self.table_arn}/stream/{self.stream_label}"
+        self.items = {}
+        self.write_times = {}  # key -> time of its last put/delete, for exports
+        self.stream_records = []
+        self.request_counts = Counter()
+        self._sequence_number = 0
+        self._lock = threading.Lock()
+
+    def _append_stream_record(self, event_name: str, key, new_image) -> None:
+        self._sequence_number += 1
+        self.write_times[key] = time.time()
+        dynamodb = {
+            "ApproximateCreationDateTime": time.time(),
+            "Keys": serialize_dynamodb_item({self.partition_key: key}),
+            "SequenceNumber": f"{self._sequence_number:021d}",
+            "StreamViewType": "NEW_IMAGE",
+        }
+        if new_image is not None:
+            dynamodb["NewImage"] = serialize_dynamodb_item(new_image)
+            dynamodb["SizeBytes"] = len(json.dumps(dynamodb["NewImage"]))
+        self.stream_records.append(
+            {
+                "eventID": uuid.uuid4().hex,
+                "eventName": event_name,
+                "eventVersion": "1.1",
+                "eventSource": "aws:dynamodb",
+                "awsRegion": self.table_arn.split(":")[3],
+                "dynamodb": dynamodb,
+                "eventSourceARN": self.stream_arn,
+            }
+        )
+
+    def put_item(self, Item: dict, **kwargs) -> dict:
+        with self._lock:
+            self.request_counts["PutItem"] += 1
+            key = Item[self.partition_key]
+            event_name = "MODIFY" if key in self.items else "INSERT"
+            self.items[key] = Item
+            self._append_stream_record(event_name, key, Item)
+        return {}
+
+    def delete_item(self, Key: dict, **kwargs) -> dict:
+        with self._lock:
+            self.request_counts["DeleteItem"] += 1
+            key = Key[self.partition_key]
+            if self.items.pop(key, None) is not None:
+                self._append_stream_record("REMOVE", key, None)
+        return {}
+
+    def batch_writer(self, **kwargs):
+        return StandInBatchWriter(self)
+
+    def pop_stream_events(self, batch_size: int) -> list:
+        """Stream records in events of at most `batch_size` records, in order"""
+        with self._lock:
+            stream_records, self.stream_records = self.stream_records, []
+        return [
+            {"Records": stream_records[start : start + batch_size]}
+            for start in range(0, len(stream_records), batch_size)
+        ]
+
+
+class StandInBatchWriter:
+    def __init__(self, table: StandInDynamoDBTable):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item: dict) -> None:
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key: dict) -> None:
+        self.table.delete_item(Key=Key)
+
+
+class StandInDynamoDBResource:
+    def __init__(self, region: str, partition_keys: dict = None):
+        self.region = region
+        self.partition_keys = partition_keys or {}  # table name -> partition key
+        self.tables = {}
+
+    def Table(self, name: str) -> StandInDynamoDBTable:
+        if name not in self.tables:
+            self.tables[name] = StandInDynamoDBTable(
+                name, self.partition_keys.get(name, "id"), region=self.region
+            )
+        return self.tables[name]
+
+
+class StandInDynamoDBClient:
+    """Low level client of the stand-in tables. Writes are on-demand, or with
+    `write_capacity_units_per_second`, throttled like a provisioned table (with
+    1 second of burst): `BatchWriteItem` writes what fits and returns the rest
+    as `UnprocessedItems`, or raises if nothing fits. Point in time exports are
+    written in the layout of DynamoDB JSON exports (manifest summary, manifest
+    files, gzipped data files of 1 JSON object per line) to the S3 stand-in,
+    and completed on start."""
+
+    ITEMS_PER_DATA_FILE = 1000
+
+    def __init__(
+        self,
+        dynamodb_resource: StandInDynamoDBResource,
+        s3_client: StandInS3Client,
+        write_capacity_units_per_second: float = None,
+    ):
+        self.dynamodb_resource = dynamodb_resource
+        self.s3_client = s3_client
+        self.write_capacity_units_per_second = write_capacity_units_per_second
+        self.exports = {}  # export ARN -> description
+        self.request_counts = Counter()
+        self._write_capacity_units = write_capacity_units_per_second
+        self._write_capacity_updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_write_capacity_units(self, write_capacity_units: list) -> int:
+        """Number of the writes (of the given costs) that fit in the capacity left"""
+        if self.write_capacity_units_per_second is None:
+            return len(write_capacity_units)
+        with self._lock:
+            now = time.monotonic()
+            self._write_capacity_units = min(
+                self.write_capacity_units_per_second,
+                self._write_capacity_units
+                + (now - self._write_capacity_updated_at) * self.write_capacity_units_per_second,
+            )
+            self._write_capacity_updated_at = now
+            num_writes = 0
+            for cost in write_capacity_units:
+                if cost > self._write_capacity_units:
+                    break
+                self._write_capacity_units -= cost
+                num_writes += 1
+            return num_writes
+
+    def batch_write_item(self, RequestItems: dict, **kwargs) -> dict:
+        self.request_counts["BatchWriteItem"] += 1
+        unprocessed_items, consumed_capacities = {}, []
+        for table_name, write_requests in RequestItems.items():
+            assert len(write_requests) <= 25, len(write_requests)
+            write_capacity_units = [  # 1 per KB
+                math.ceil(len(json.dumps(write_request)) / 1024)
+                for write_request in write_requests
+            ]
+            num_writes = self._take_write_capacity_units(write_capacity_units)
+            if not num_writes and write_requests:
+                raise StandInClientError(
+                    "ProvisionedThroughputExceededException", "BatchWriteItem"
+                )
+            table = self.dynamodb_resource.Table(table_name)
+            for write_request in write_requests[:num_writes]:
+                if "PutRequest" in write_request:
+                    table.put_item(
+                        Item=deserialize_dynamodb_image(write_request["PutRequest"]["Item"])
+                    )
+                else:
+                    table.delete_item(
+                        Key=deserialize_dynamodb_image(write_request["DeleteRequest"]["Key"])
+                    )
+            if write_requests[num_writes:]:
+                unprocessed_items[table_name] = write_requests[num_writes:]
+            consumed_capacities.append(
+                {
+                    "TableName": table_name,
+                    "CapacityUnits": float(sum(write_capacity_units[:num_writes])),
+                }
+            )
+        return {"UnprocessedItems": unprocessed_items, "ConsumedCapacity": consumed_capacities}
+
+    def export_table_to_point_in_time(
+        self,
+        TableArn: str,
+        S3Bucket: str,
+        S3Prefix: str,
+        ExportFormat: str = "DYNAMODB_JSON",
+        ExportType: str = "FULL_EXPORT",
+        ExportTime: datetime = None,
+        IncrementalExportSpecification: dict = None,
+        **kwargs,
+    ) -> dict:
+        self.request_counts["ExportTableToPointInTime"] += 1
+        assert ExportFormat == "DYNAMODB_JSON", ExportFormat
+        table = self.dynamodb_resource.Table(TableArn.rsplit("/", 1)[1])
+        with table._lock:
+            items = dict(table.items)
+            write_times = dict(table.write_times)
+        if ExportType == "FULL_EXPORT":
+            export_records = [
+                {"Item": serialize_dynamodb_item(item)} for item in items.values()
+            ]
+        else:  # items written in the window, with the latest image (if any)
+            export_from_time = IncrementalExportSpecification["ExportFromTime"].timestamp()
+            export_to_time = IncrementalExportSpecification["ExportToTime"].timestamp()
+            export_records = []
+            for key, write_time in write_times.items():
+                if not export_from_time <= write_time < export_to_time:
+                    continue
+                export_record = {
+                    "Keys": serialize_dynamodb_item({table.partition_key: key})
+                }
+                if key in items:
+                    export_record["NewImage"] = serialize_dynamodb_item(items[key])
+                export_records.append(export_record)
+        export_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        export_arn = f"{TableArn}/export/{export_id}"
+        export_folder = f"{S3Prefix}/AWSDynamoDB/{export_id}"
+        manifest_files = []
+        for start in range(0, len(export_records), self.ITEMS_PER_DATA_FILE):
+            data_file_key = f"{export_folder}/data/{uuid.uuid4().hex}.json.gz"
+            data_file_records = export_records[start : start + self.ITEMS_PER_DATA_FILE]
+            self.s3_client.put_object(
+                Bucket=S3Bucket,
+                Key=data_file_key,
+                Body=gzip.compress(
+                    "\n".join(map(json.dumps, data_file_records)).encode()
+                ),
+            )
+            manifest_files.append(
+                {"itemCount": len(data_file_records), "dataFileS3Key": data_file_key}
+            )
+        self.s3_client.put_object(
+            Bucket=S3Bucket,
+            Key=f"{export_folder}/manifest-files.json",
+            Body="\n".join(map(json.dumps, manifest_files)),
+        )
+        self.s3_client.put_object(
+            Bucket=S3Bucket,
+            Key=f"{export_folder}/manifest-summary.json",
+            Body=json.dumps(
+                {
+                    "exportArn": export_arn,
+                    "itemCount": len(export_records),
+                    "manifestFilesS3Key": f"{export_folder}/manifest-files.json",
+                }
+            ),
+        )
+        self.exports[export_arn] = {
+            "ExportArn": export_arn,
+            "ExportStatus": "COMPLETED",
+            "ExportType": ExportType,
+            "ExportManifest": f"{export_folder}/manifest-summary.json",
+            "ItemCount": len(export_records),
+            "TableArn": TableArn,
+        }
+        return {"ExportDescription": {**self.exports[export_arn], "ExportStatus": "IN_PROGRESS"}}
+
+    def describe_table(self, TableName: str, **kwargs) -> dict:
+        self.request_counts["DescribeTable"] += 1
+        table = self.dynamodb_resource.Table(TableName.rsplit("/", 1)[-1])
+        return {
+            "Table": {
+                "TableName": table.name,
+                "TableArn": table.table_arn,
+                "LatestStreamArn": table.stream_arn,
+                "LatestStreamLabel": table.stream_label,
+            }
+        }
+
+    def describe_export(self, ExportArn: str, **kwargs) -> dict:
+        self.request_counts["DescribeExport"] += 1
+        return {"ExportDescription": self.exports[ExportArn]}
+
+    SCAN_PAGE_BYTES = 1024 * 1024  # like DynamoDB's 1 MB pages
+
+    def scan(
+        self,
+        TableName: str,
+        Segment: int = 0,
+        TotalSegments: int = 1,
+        ExclusiveStartKey: dict = None,
+        Limit: int = None,
+        **kwargs,
+    ) -> dict:
+        """Eventually consistent (parallel) scan, where the items of a segment
+        are those whose key hashes to it"""
+        self.request_counts["Scan"] += 1
+        table = self.dynamodb_resource.Table(TableName)
+        with table._lock:
+            items = dict(table.items)
+        keys = sorted(
+            key
+            for key in items
+            if int(hashlib.md5(str(key).encode()).hexdigest(), 16) % TotalSegments == Segment
+        )
+        if ExclusiveStartKey is not None:
+            start_key = deserialize_dynamodb_key(ExclusiveStartKey[table.partition_key])
+            keys = [key for key in keys if key > start_key]
+        page, page_bytes = [], 0
+        for key in keys:
+            typed_item = serialize_dynamodb_item(items[key])
+            page_bytes += len(json.dumps(typed_item))
+            page.append(typed_item)
+            if page_bytes >= self.SCAN_PAGE_BYTES or len(page) == Limit:
+                break
+        response = {
+            "Items": page,
+            "Count": len(page),
+            "ConsumedCapacity": {  # 0.5 per 4 KB, read eventually consistent
+                "TableName": TableName,
+                "CapacityUnits": math.ceil(page_bytes / 4096) * 0.5,
+            },
+        }
+        if page and key != keys[-1]:
+            response["LastEvaluatedKey"] = serialize_dynamodb_item({table.partition_key: key})
+        return response
+
+
+class StandInDMSClient:
+    def __init__(self, status: str = "running"):
+        self.statuses = defaultdict(lambda: status)
+        self.request_counts = Counter()
+
+    def describe_replication_tasks(self, Filters: list, **kwargs) -> dict:
+        self.request_counts["DescribeReplicationTasks"] += 1
+        (replication_task_arns,) = [
+            dct["Values"] for dct in Filters if dct["Name"] == "replication-task-arn"
+        ]
+        return {
+            "ReplicationTasks": [
+                {"ReplicationTaskArn": arn, "Status": self.statuses[arn]}
+                for arn in replication_task_arns
+            ]
+        }
+
+    def start_replication_task(self, ReplicationTaskArn: str, **kwargs) -> dict:
+        self.request_counts["StartReplicationTask"] += 1
+        self.statuses[ReplicationTaskArn] = "running"
+        return {
+            "ReplicationTask": {
+                "ReplicationTaskArn": ReplicationTaskArn,
+                "Status": "starting",
+            }
+        }
+
+
+def _md5(text):
+    return None if text is None else hashlib.md5(str(text).encode()).hexdigest()
+
+
+def _strtol(text, base):
+    return None if text is None else int(text, base)
+
+
+def _mod(dividend, divisor):  # SQLite's `mod` returns floats
+    return None if dividend is None or divisor is None else dividend % divisor
+
+
+def _like_to_regex(like_pattern: str) -> re.Pattern:
+    return re.compile(
+        "^"
+        + "".join(
+            ".*" if char == "%" else "." if char == "_" else re.escape(char)
+            for char in like_pattern
+        )
+        + "$",
+        re.IGNORECASE,
+    )
+
+
+class _PercentileCont:
+    """SQLite aggregate for `PERCENTILE_CONT(fraction) WITHIN GROUP (ORDER BY x)`"""
+
+    def __init__(self):
+        self.values = []
+        self.fraction = None
+
+    def step(self, value, fraction):
+        self.fraction = fraction
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        if not self.values:
+            return None
+        values = sorted(self.values)
+        position = (len(values) - 1) * self.fraction
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _str_to_date(text, date_format):
+    """MySQL's, whose common specifiers are Python's"""
+    try:
+        return None if text is None else datetime.strptime(text, date_format).date().isoformat()
+    except ValueError:
+        return None
+
+
+def _lpad(text, length, fill):
+    return None if text is None else text.rjust(length, fill)
+
+
+def _datediff(date_part: str, start: str, end: str):
+    if start is None or end is None:
+        return None
+    seconds_per_unit = {"ms": 0.001, "s": 1, "second": 1, "minute": 60}[date_part.lower()]
+    return int(
+        (
+            datetime.fromisoformat(end) - datetime.fromisoformat(start)
+        ).total_seconds()
+        / seconds_per_unit
+    )
+
+
+class StandInSQLDatabase:
+    """SQLite stand-in for RDS MySQL (`dialect="mysql"`) or Redshift
+    (`dialect="redshift"`), where every MySQL database/Redshift schema is an
+    attached in-memory SQLite database. Only the statements the handlers run are
+    translated (eg Redshift's `COPY` reads JSON lines from the S3 stand-in).
+    Statements are serialized by a lock, while latency is added outside of it,
+    so that concurrent connections still overlap like on a real server."""
+
+    def __init__(
+        self,
+        dialect: str,
+        schemas: list = (),
+        database_name: str = None,
+        s3_client: StandInS3Client = None,
+        latency_seconds: float = 0.0,
+        copy_latency_seconds: float = 0.0,
+    ):
+        self.dialect = dialect
+        self.database_name = database_name
+        self.s3_client = s3_client
+        self.latency_seconds = latency_seconds
+        self.copy_latency_seconds = copy_latency_seconds
+        self.statement_counts = Counter()
+        self.num_connections = 0
+        self.max_concurrent_connections = 0
+        self.num_open_connections = 0
+        self.configuration = {"binlog retention hours": None}
+        self.running_sql_statements = []  # as sent, for `stv_recents`
+        self.maintained_num_rows = defaultdict(dict)  # at the last VACUUM SORT/ANALYZE
+        self._connections = weakref.WeakSet()
+        self.materialized_views = {}  # "schema.name" -> its query, refreshed on demand
+        self._sqlite = sqlite3.connect(
+            ":memory:", check_same_thread=False, isolation_level=None
+        )
+        self._sqlite.create_aggregate("percentile_cont", 2, _PercentileCont)
+        self._sqlite.create_function("datediff", 3, _datediff)
+        self._sqlite.create_function("md5", 1, _md5)
+        self._sqlite.create_function("strtol", 2, _strtol)
+        self._sqlite.create_function("mod", 2, _mod)
+        self._sqlite.create_function("lpad", 3, _lpad)
+        self._sqlite.create_function("len", 1, len)
+        self._sqlite.create_function("str_to_date", 2, _str_to_date)
+        self.column_types = {}  # "schema.table.column" -> type, as altered
+        self._schemas = set()
+        self._lock = threading.RLock()
+        for schema in schemas:
+            self.create_schema(schema)
+
+    def create_schema(self, schema: str) -> None:
+        with self._lock:
+            if schema not in self._schemas:
+                self._sqlite.execute(f"ATTACH DATABASE ':memory:' AS \"{schema}\"")
+                self._schemas.add(schema)
+
+    def connect(self, **kwargs) -> "StandInConnection":
+        with self._lock:
+            self.num_connections += 1
+            self.num_open_connections += 1
+            self.max_concurrent_connections = max(
+                self.max_concurrent_connections, self.num_open_connections
+            )
+        if self.latency_seconds:  # handshake is a few round trips
+            time.sleep(3 * self.latency_seconds)
+        conn = StandInConnection(self)
+        self._connections.add(conn)
+        return conn
+
+    def drop_connections(self) -> int:
+        """Drops the open connections server side, like MySQL's `wait_timeout` or
+        RDS Proxy's idle client timeout does to connections of idle containers"""
+        with self._lock:
+            connections = [conn for conn in self._connections if conn.open]
+        for conn in connections:
+            conn.dropped = True
+        return len(connections)
+
+    def _on_close(self) -> None:
+        with self._lock:
+            self.num_open_connections -= 1
+
+    def query(self, sql_statement: str, params=()) -> list:
+        """For inspecting the stand-in's state directly (eg in setup/reports)"""
+        with self._lock:
+            return self._sqlite.execute(
+                self._translate(sql_statement), params
+            ).fetchall()
+
+    def _translate(self, sql_statement: str, has_params: bool = False) -> str:
+        sql_statement = sql_statement.strip().rstrip(";")
+        if self.dialect == "mysql" or has_params:  # `format` paramstyle of both
+            sql_statement = sql_statement.replace("%s", "?")
+        if self.dialect == "redshift" and sql_statement.upper().startswith("ALTER TABLE"):
+            sql_statement = re.sub(  # SQLite only adds columns with constant defaults
+                r"\bdefault sysdate\b", "", sql_statement, flags=re.I
+            )
+        if self.dialect == "redshift" and sql_statement.upper().startswith("CREATE TABLE"):
+            sql_statement = re.sub(  # Redshift does not enforce these constraints
+                r"\b(UNIQUE|PRIMARY KEY)\b", "", sql_statement, flags=re.I
+            )
+            sql_statement = re.sub(  # UTC like Redshift's `sysdate`
+                r"\bdefault sysdate\b",
+                "DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+                sql_statement,
+                flags=re.I,
+            )
+        if self.dialect == "redshift":
+            sql_statement = re.sub(
+                r"PERCENTILE_CONT\(([\d.]+)\)\s+WITHIN GROUP\s*\(\s*ORDER BY\s+(\w+)\s*\)",
+                r"percentile_cont(\2, \1)",
+                sql_statement,
+                flags=re.I,
+            )
+            sql_statement = re.sub(
+                r"\bDATEDIFF\(\s*(\w+)\s*,", r"DATEDIFF('\1',", sql_statement, flags=re.I
+            )
+            sql_statement = re.sub(  # numbers as text with a fixed scale
+                r"CAST\(CAST\(([\"\w]+) AS DECIMAL\(\d+, (\d+)\)\) AS VARCHAR\(\d+\)\)",
+                r"iif(\1 IS NULL, NULL, printf('%.\2f', \1))",
+                sql_statement,
+                flags=re.I,
+            )
+        if self.database_name:  # `database.schema.table` is not valid in SQLite
+            sql_statement = re.sub(
+                rf'\b"?{re.escape(self.database_name)}"?\.(?=["\w]+\.["\w]+)',
+                "",
+                sql_statement,
+            )
+        return sql_statement
+
+    def execute(self, sql_statement: str, params=None) -> tuple:
+        """Returns (rows, rowcount)"""
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        first_word = sql_statement.split(None, 1)[0].upper()
+        with self._lock:
+            self.statement_counts[first_word] += 1
+        with self._lock:
+            self.running_sql_statements.append(sql_statement)
+        try:
+            handled = self._execute_special(sql_statement, params)
+            if handled is not None:
+                return handled
+            with self._lock:
+                cursor = self._sqlite.execute(
+                    self._translate(sql_statement, has_params=bool(params)), params or ()
+                )
+                return cursor.fetchall(), cursor.rowcount
+        finally:
+            with self._lock:
+                self.running_sql_statements.remove(sql_statement)
+
+    def executemany(self, sql_statement: str, seq_of_params) -> tuple:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        with self._lock:
+            self.statement_counts[sql_statement.split(None, 1)[0].upper()] += 1
+            cursor = self._sqlite.executemany(
+                self._translate(sql_statement, has_params=True), seq_of_params
+            )
+            return [], cursor.rowcount
+
+    def _execute_special(self, sql_statement: str, params):
+        """Statements without a SQLite equivalent, or None if not special"""
+        statement = sql_statement.strip().rstrip(";").strip()
+        if match := re.match(
+            r"call mysql\.rds_set_configuration\('(.+?)',\s*(\w+)\)", statement, re.I
+        ):
+            self.configuration[match[1]] = match[2]
+            return [], 0
+        if re.match(r"call mysql\.rds_show_configuration", statement, re.I):
+            rows = [(name, value, "") for name, value in self.configuration.items()]
+            return rows, len(rows)
+        if match := re.match(
+            r'CREATE SCHEMA IF NOT EXISTS "?(\w+)"?', statement, re.I
+        ):
+            self.create_schema(match[1])
+            return [], 0
+        if "information_schema.tables" in statement.lower():
+            schema_pattern, table_pattern = (_like_to_regex(p) for p in params)
+            with self._lock:
+                rows = [
+                    (schema, table_name)
+                    for schema in sorted(self._schemas)
+                    if schema_pattern.match(schema)
+                    for (table_name,) in self._sqlite.execute(
+                        f"SELECT name FROM \"{schema}\".sqlite_master WHERE type = 'table'"
+                    )
+                    if table_pattern.match(table_name)
+                ]
+            return rows, len(rows)
+        if "from svv_table_info" in statement.lower():
+            return self._table_info(params)
+        if "from stv_recents" in statement.lower():  # its `query ~* '...'` predicate
+            pattern = re.search(r"query ~\* '([^']*)'", statement)[1]
+            pattern = re.compile(pattern.replace("[[:space:]]", r"\s"), re.I)
+            with self._lock:
+                num_copies = sum(
+                    bool(pattern.search(sql_statement))
+                    for sql_statement in self.running_sql_statements
+                )
+            return [(num_copies,)], 1
+        if match := re.match(
+            r'(VACUUM (SORT|DELETE) ONLY|ANALYZE) "(\w+)"\."(\w+)"', statement, re.I
+        ):
+            kind = "analyzed" if match[1].upper() == "ANALYZE" else match[2].lower()
+            with self._lock:
+                (num_rows,) = self._sqlite.execute(
+                    f'SELECT COUNT(*) FROM "{match[3]}"."{match[4]}"'
+                ).fetchone()
+                self.maintained_num_rows[f"{match[3]}.{match[4]}"][kind] = num_rows
+            return [], 0
+        if "information_schema.columns" in statement.lower():
+            schema, table_name = params
+            with self._lock:
+                rows = []
+                for row in self._sqlite.execute(f'PRAGMA "{schema}".table_info("{table_name}")'):
+                    column_type = self.column_types.get(f"{schema}.{table_name}.{row[1]}", row[2])
+                    if "data_type" in statement.lower():  # MySQL's, where BOOLEAN is TINYINT
+                        data_type = re.match(r"\w+", column_type)[0].lower()
+                        rows.append((row[1], {"boolean": "tinyint"}.get(data_type, data_type)))
+                        continue
+                    length = re.match(r"(?:varchar|char)\((\d+)\)", column_type, re.I)
+                    rows.append((row[1], int(length[1]) if length else None))
+            return rows, len(rows)
+        if match := re.match(r"ALTER TABLE `(\w+)`\.`(\w+)` MODIFY `(\w+)` (.+)", statement, re.I):
+            self.column_types[f"{match[1]}.{match[2]}.{match[3]}"] = match[4]
+            return [], 0
+        if match := re.match(
+            r'ALTER TABLE "(\w+)"\."(\w+)" ALTER COLUMN (\w+) TYPE (.+)', statement, re.I
+        ):  # SQLite neither alters nor enforces column types
+            self.column_types[f"{match[1]}.{match[2]}.{match[3]}"] = match[4]
+            return [], 0
+        if statement.upper().startswith("COPY "):
+            return self._copy(statement)
+        if "from stv_mv_info" in statement.lower():
+            rows = [(1,)] if ".".join(params) in self.materialized_views else []
+            return rows, len(rows)
+        if match := re.match(
+            r'CREATE MATERIALIZED VIEW "(\w+)"\."(\w+)"\s+AUTO REFRESH \w+\s+AS\s+(SELECT\s.*)',
+            statement,
+            re.I | re.S,
+        ):  # a table of the query's rows as of the last refresh
+            query = self._translate(match[3])
+            with self._lock:
+                self._sqlite.execute(f'CREATE TABLE "{match[1]}"."{match[2]}" AS {query}')
+                self.materialized_views[f"{match[1]}.{match[2]}"] = query
+            return [], 0
+        if match := re.match(r'REFRESH MATERIALIZED VIEW "(\w+)"\."(\w+)"', statement, re.I):
+            with self._lock:
+                query = self.materialized_views[f"{match[1]}.{match[2]}"]
+                self._sqlite.execute(f'DELETE FROM "{match[1]}"."{match[2]}"')
+                self._sqlite.execute(f'INSERT INTO "{match[1]}"."{match[2]}" {query}')
+            return [], 0
+        if match := re.match(
+            r'CREATE OR REPLACE VIEW "(\w+)"\."(\w+)" AS (SELECT\s.*)', statement, re.I | re.S
+        ):  # SQLite views only reference (unqualified) tables of their own schema
+            query = re.sub(rf'"{match[1]}"\.', "", match[3])
+            with self._lock:
+                self._sqlite.execute(f'DROP VIEW IF EXISTS "{match[1]}"."{match[2]}"')
+                self._sqlite.execute(f'CREATE VIEW "{match[1]}"."{match[2]}" AS {query}')
+            return [], 0
+        return None
+
+    def _table_info(self, schema_names) -> tuple:
+        """`SVV_TABLE_INFO`, where rows appended since the last `VACUUM SORT` are
+        unsorted and `stats_off` is the change in rows since the last `ANALYZE`"""
+        rows = []
+        with self._lock:
+            for schema in schema_names:
+                if schema not in self._schemas:
+                    continue
+                for (table_name,) in self._sqlite.execute(
+                    f"SELECT name FROM \"{schema}\".sqlite_master WHERE type = 'table'"
+                ).fetchall():
+                    (num_rows,) = self._sqlite.execute(
+                        f'SELECT COUNT(*) FROM "{schema}"."{table_name}"'
+                    ).fetchone()
+                    if not num_rows:
+                        continue
+                    maintained = self.maintained_num_rows[f"{schema}.{table_name}"]
+                    unsorted = 100 * (num_rows - min(maintained.get("sort", 0), num_rows))
+                    stats_off = 100 * abs(num_rows - maintained.get("analyzed", 0))
+                    rows.append(
+                        (
+                            schema,
+                            table_name,
+                            unsorted / num_rows,
+                            min(100, stats_off / num_rows),
+                            num_rows,
+                            num_rows,
+                        )
+                    )
+        rows.sort(key=lambda row: -row[2])
+        return rows, len(rows)
+
+    def _copy(self, statement: str) -> tuple:
+        """Redshift `COPY ... FROM 's3://...' [manifest] ... format as json 'auto'`"""
+        match = re.match(
+            r"COPY\s+(?P<table>[\w\".]+)\s+(?:\((?P<columns>[^)]*)\)\s+)?"
+            r"FROM\s+'s3://(?P<bucket>[^/]+)/(?P<key>[^']+)'",
+            statement,
+            re.I,
+        )
+        table = self._translate(match["table"])
+        body = self.s3_client.get_object(Bucket=match["bucket"], Key=match["key"])[
+            "Body"
+        ].read()
+        if re.search(r"^\s*manifest\s*$", statement, re.I | re.M):
+            bodies = [
+                self.s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+                for bucket, key in (
+                    entry["url"][len("s3://") :].split("/", 1)
+                    for entry in json.loads(body)["entries"]
+                )
+            ]
+        else:
+            bodies = [body]
+        if self.copy_latency_seconds:
+            time.sleep(self.copy_latency_seconds)
+        records = [
+            json.loads(line)
+            for body in bodies
+            for line in body.decode().splitlines()
+            if line
+        ]
+        with self._lock:
+            column_names = [  # the other columns get their default
+                column_name.strip().strip('"')
+                for column_name in match["columns"].split(",")
+            ] if match["columns"] else [
+                row[1]
+                for row in self._sqlite.execute(
+                    "PRAGMA {}.table_info({})".format(*table.split(".", 1))
+                )
+            ]
+            rows = [
+                tuple(
+                    json.dumps(value) if isinstance(value, (dict, list)) else value
+                    for value in (record.get(name) for name in column_names)
+                )
+                for record in records
+            ]
+            self._sqlite.executemany(
+                f"INSERT INTO {table} ({', '.join(column_names)}) "
+                f"VALUES ({', '.join(['?'] * len(column_names))})",
+                rows,
+            )
+        return [], len(rows)
+
+
+class StandInCursor:
+    def __init__(self, database: StandInSQLDatabase):
+        self.database = database
+        self._rows = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql_statement: str, params=None):
+        self._rows, self.rowcount = self.database.execute(sql_statement, params)
+        return self.rowcount
+
+    def executemany(self, sql_statement: str, seq_of_params):
+        self._rows, self.rowcount = self.database.executemany(
+            sql_statement, seq_of_params
+        )
+        return self.rowcount
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self) -> None:
+        pass
+
+
+class StandInConnection:
+    """Autocommit, like each statement of the handlers is followed by a commit"""
+
+    def __init__(self, database: StandInSQLDatabase):
+        self.database = database
+        self.open = True
+        self.dropped = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def cursor(self) -> StandInCursor:
+        return StandInCursor(self.database)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def ping(self, reconnect: bool = False) -> None:
+        """Fails once the server dropped the connection (`drop_connections`)"""
+        if self.database.latency_seconds:
+            time.sleep(self.database.latency_seconds)
+        if not self.open or self.dropped:
+            raise StandInClientError("ConnectionDropped", "ping")
+
+    def close(self) -> None:
+        if self.open:
+            self.open = False
+            self.database._on_close()
+
+
+class StandInServices:
+    """All stand-ins of 1 local run, configured from the `cdk.json` environment"""
+
+    def __init__(
+        self,
+        environment: dict,
+        s3_latency_seconds: float = 0.0,
+        db_latency_seconds: float = 0.0,
+        copy_latency_seconds: float = 0.0,
+        dynamodb_write_capacity_units_per_second: float = None,
+    ):
+        self.environment = environment
+        self.s3_client = StandInS3Client(latency_seconds=s3_latency_seconds)
+        self.dynamodb_resource = StandInDynamoDBResource(  # tables are named
+            region=environment["AWS_REGION"],  # after their registry key
+            partition_keys={
+                cdc_table_key: cdc_table["PARTITION_KEY"]
+                for cdc_table_key, cdc_table in environment["DYNAMODB_CDC_TABLES"].items()
+            },
+        )
+        self.dynamodb_client = StandInDynamoDBClient(
+            self.dynamodb_resource,
+            self.s3_client,
+            write_capacity_units_per_second=dynamodb_write_capacity_units_per_second,
+        )
+        self.dms_client = StandInDMSClient()
+        self.rds_database = StandInSQLDatabase(
+            "mysql",
+            schemas=[environment["RDS_DATABASE_NAME"]],
+            latency_seconds=db_latency_seconds,
+        )
+        self.redshift_database = StandInSQLDatabase(
+            "redshift",
+            database_name=environment["REDSHIFT_DATABASE_NAME"],
+            s3_client=self.s3_client,
+            latency_seconds=db_latency_seconds,
+            copy_latency_seconds=copy_latency_seconds,
+        )
+
+    def install(self) -> None:
+        """Must run before the handlers' first use of clients/connections"""
+        from cdc_runtime import clients
+
+        clients._boto3_clients.update(
+            {
+                "s3": self.s3_client,
+                "dynamodb": self.dynamodb_client,
+                "dms": self.dms_client,
+            }
+        )
+        clients._boto3_resources.update({"dynamodb": self.dynamodb_resource})
+        for module_name, database in [
+            ("pymysql", self.rds_database),
+            ("redshift_connector", self.redshift_database),
+        ]:
+            module = types.ModuleType(module_name)
+            module.connect = database.connect
+            sys.modules[module_name] = module
+
+    def get_counters(self) -> dict:
+        return {
+            "s3_requests": dict(self.s3_client.request_counts),
+            "s3_bytes_written": self.s3_client.bytes_written,
+            "dynamodb_requests": dict(
+                sum(
+                    (table.request_counts for table in self.dynamodb_resource.tables.values()),
+                    Counter(self.dynamodb_client.request_counts),
+                )
+            ),
+            "dms_requests": dict(self.dms_client.request_counts),
+            "rds_statements": dict(self.rds_database.statement_counts),
+            "rds_connections": self.rds_database.num_connections,
+            "redshift_statements": dict(self.redshift_database.statement_counts),
+            "redshift_connections": self.redshift_database.num_connections,
+        }
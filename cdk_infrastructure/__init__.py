@@ -1,7 +1,12 @@
 import json
+import shutil
+import subprocess
+import sys
 
+import jsii
 from aws_cdk import (
     BundlingOptions,
+    ILocalBundling,
     CfnOutput,
     Duration,
     RemovalPolicy,
@@ -13,16 +18,97 @@ from aws_cdk import (
     aws_events as events,
     aws_events_targets as events_targets,
     aws_iam as iam,
+    aws_kinesis as kinesis,
     aws_lambda as _lambda,
     aws_lambda_event_sources as event_sources,
     aws_rds as rds,
     aws_redshift as redshift,
     aws_s3 as s3,
+    aws_secretsmanager as secretsmanager,
+    aws_sqs as sqs,
     triggers,
 )
 from constructs import Construct
 
 
+@jsii.implements(ILocalBundling)
+class LocalLayerBundling:
+    """Bundles the `cdc_runtime` layer without Docker, with pip installing the
+    wheels of Lambda's platform. Returns False (so CDK bundles in Docker) if
+    pip cannot, eg without network access."""
+
+    def try_bundle(self, output_dir: str, *args, **kwargs) -> bool:
+        try:
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "pip",
+                    "install",
+                    "--no-deps",
+                    "-r",
+                    "source/cdc_runtime_layer/requirements.txt",
+                    "--platform",
+                    "manylinux2014_x86_64",
+                    "--implementation",
+                    "cp",
+                    "--python-version",
+                    "3.9",
+                    "--only-binary=:all:",
+                    "-t",
+                    f"{output_dir}/python",
+                ],
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return False
+        shutil.copytree(
+            "source/cdc_runtime_layer/python/cdc_runtime",
+            f"{output_dir}/python/cdc_runtime",
+            ignore=shutil.ignore_patterns("__pycache__"),
+        )
+        return True
+
+
+def get_lambda_sizing(environment: dict, handler_name: str) -> dict:
+    """`timeout` and `memory_size` of a Lambda, as measured and written to
+    `lambda_settings.json` by `python -m benchmarks.profile_handlers --write`"""
+    lambda_settings = environment["LAMBDA_SETTINGS"][handler_name]
+    return {
+        "timeout": Duration.seconds(lambda_settings["TIMEOUT_SECONDS"]),
+        "memory_size": lambda_settings["MEMORY_SIZE"],  # in MB
+    }
+
+
+def create_dms_selection_rules(
+    table_patterns: list, excluded_table_patterns: list = ()
+) -> list:
+    """Each pattern is `table` or `schema.table`, where `%` is a wildcard
+    (eg `rds_cdc_table`, `txns_%`, `rds_to_redshift_database.%`). DMS excludes
+    the tables matched by `excluded_table_patterns` even if others include them."""
+    rules = []
+    for rule_index, (table_pattern, rule_action) in enumerate(
+        [(table_pattern, "include") for table_pattern in table_patterns]
+        + [(table_pattern, "exclude") for table_pattern in excluded_table_patterns],
+        start=1,
+    ):
+        schema_name, _, table_name = table_pattern.rpartition(".")
+        rules.append(
+            {
+                "rule-type": "selection",
+                "rule-id": str(rule_index),
+                "rule-name": str(rule_index),
+                "object-locator": {
+                    "schema-name": schema_name or "%",
+                    "table-name": table_name,
+                },
+                "rule-action": rule_action,
+                "filters": [],
+            }
+        )
+    return rules
+
+
 class RedshiftService(Construct):
     def __init__(
         self,
@@ -30,7 +116,9 @@ class RedshiftService(Construct):
         construct_id: str,
         environment: dict,
         vpc: ec2.Vpc,
+        vpc_subnets: ec2.SubnetSelection,
         security_group: ec2.SecurityGroup,
+        cdc_runtime_layer: _lambda.LayerVersion,
     ) -> None:
         super().__init__(scope, construct_id)  # required
         self.redshift_full_commands_full_access_role = iam.Role(
@@ -65,6 +153,32 @@ class RedshiftService(Construct):
             vpc_security_group_ids=[security_group.security_group_id],
             publicly_accessible=False,
         )
+        self.maintain_redshift_tables_lambda = _lambda.Function(
+            self,  # VACUUM/ANALYZE of the CDC target tables that need it
+            "MaintainRedshiftTablesLambda",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                "source/maintain_redshift_tables_lambda"
+            ),
+            handler="handler.lambda_handler",
+            **get_lambda_sizing(environment, "maintain_redshift_tables_lambda"),
+            layers=[cdc_runtime_layer],
+            environment={
+                "REDSHIFT_ENDPOINT_ADDRESS": self.redshift_cluster.attr_endpoint_address,
+                "REDSHIFT_USER": environment["REDSHIFT_USER"],
+                "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
+                "REDSHIFT_DATABASE_NAME": environment["REDSHIFT_DATABASE_NAME"],
+                "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC": environment[
+                    "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
+                ],
+                "RDS_DATABASE_NAME": environment["RDS_DATABASE_NAME"],
+                "DYNAMODB_CDC_PIPELINE": json.dumps(environment["DYNAMODB_CDC_PIPELINE"]),
+                "REDSHIFT_MAINTENANCE": json.dumps(environment["REDSHIFT_MAINTENANCE"]),
+            },
+            vpc=vpc,
+            vpc_subnets=vpc_subnets,
+            security_groups=[security_group],
+        )
 
 
 class RDSService(Construct):
@@ -76,6 +190,7 @@ class RDSService(Construct):
         vpc: ec2.Vpc,
         vpc_subnets: ec2.SubnetSelection,
         security_group: ec2.SecurityGroup,
+        cdc_runtime_layer: _lambda.LayerVersion,
     ) -> None:
         super().__init__(scope, construct_id)  # required
         rds_subnet_group = rds.SubnetGroup(
@@ -112,37 +227,56 @@ class RDSService(Construct):
             removal_policy=RemovalPolicy.DESTROY,
             delete_automated_backups=True,
         )
+        self.rds_proxy = None
+        self.rds_host = self.rds_instance.db_instance_endpoint_address  # of the Lambdas
+        if environment["RDS_PROXY"]["ENABLED"]:  # DMS still reads the instance's binlog
+            rds_proxy_secret = secretsmanager.Secret(  # RDS Proxy only reads credentials
+                self,  # from Secrets Manager
+                "RDSProxySecret",
+                secret_object_value={
+                    "username": SecretValue.unsafe_plain_text(environment["RDS_USER"]),
+                    "password": SecretValue.unsafe_plain_text(environment["RDS_PASSWORD"]),
+                },
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            self.secrets_manager_endpoint = vpc.add_interface_endpoint(  # VPC endpoint
+                "SecretsManagerEndpoint",  # needed by the proxy to read its secret from
+                service=ec2.InterfaceVpcEndpointAwsService.SECRETS_MANAGER,  # the
+                subnets=vpc_subnets,  # isolated subnets, over HTTPS, which
+                security_groups=[security_group],  # `security_group` allows from itself
+            )
+            self.rds_proxy = self.rds_instance.add_proxy(
+                "RDSProxy",
+                secrets=[rds_proxy_secret],
+                vpc=vpc,
+                vpc_subnets=vpc_subnets,
+                security_groups=[security_group],
+                require_tls=False,  # the handlers connect without TLS, as to the instance
+                max_connections_percent=environment["RDS_PROXY"]["MAX_CONNECTIONS_PERCENT"],
+                idle_client_timeout=Duration.minutes(
+                    environment["RDS_PROXY"]["IDLE_CLIENT_TIMEOUT_MINUTES"]
+                ),
+            )
+            self.rds_proxy.node.add_dependency(self.secrets_manager_endpoint)
+            self.rds_host = self.rds_proxy.endpoint
 
         self.configure_rds_lambda = _lambda.Function(  # will be used once in Trigger defined below
             self,  # purpose is to set MySQL binlog retention hours to 24
             "ConfigureRDSLambda",  # and create `RDS_TABLE_NAME` in the database
             runtime=_lambda.Runtime.PYTHON_3_9,
-            code=_lambda.Code.from_asset(
-                "source/configure_rds_lambda",
-                # exclude=[".venv/*"],  # seems to no longer do anything if use BundlingOptions
-                bundling=BundlingOptions(
-                    image=_lambda.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        " && ".join(
-                            [
-                                "pip install -r requirements.txt -t /asset-output",
-                                "cp handler.py txns.csv /asset-output",  # need to cp instead of mv
-                            ]
-                        ),
-                    ],
-                ),
+            code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                "source/configure_rds_lambda"
             ),
             handler="handler.lambda_handler",
-            timeout=Duration.seconds(3),  # should be fairly quick
-            memory_size=128,  # in MB
+            **get_lambda_sizing(environment, "configure_rds_lambda"),
+            layers=[cdc_runtime_layer],
             environment={
                 "CSV_FILENAME": environment["CSV_FILENAME"],
                 "RDS_USER": environment["RDS_USER"],
                 "RDS_PASSWORD": environment["RDS_PASSWORD"],
                 "RDS_DATABASE_NAME": environment["RDS_DATABASE_NAME"],
                 "RDS_TABLE_NAME": environment["RDS_TABLE_NAME"],
+                "RDS_CSV_NORMALIZATION": json.dumps(environment["RDS_CSV_NORMALIZATION"]),
             },
             vpc=vpc,
             vpc_subnets=vpc_subnets,
@@ -152,32 +286,19 @@ class RDSService(Construct):
             self,
             "LoadDataToRDSLambda",
             runtime=_lambda.Runtime.PYTHON_3_9,
-            code=_lambda.Code.from_asset(
-                "source/load_data_to_rds_lambda",
-                # exclude=[".venv/*"],  # seems to no longer do anything if use BundlingOptions
-                bundling=BundlingOptions(
-                    image=_lambda.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        " && ".join(
-                            [
-                                "pip install -r requirements.txt -t /asset-output",
-                                "cp handler.py txns.csv /asset-output",  # need to cp instead of mv
-                            ]
-                        ),
-                    ],
-                ),
+            code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                "source/load_data_to_rds_lambda"
             ),
             handler="handler.lambda_handler",
-            timeout=Duration.seconds(3),  # should be fairly quick
-            memory_size=128,  # in MB
+            **get_lambda_sizing(environment, "load_data_to_rds_lambda"),
+            layers=[cdc_runtime_layer],
             environment={
                 "CSV_FILENAME": environment["CSV_FILENAME"],
                 "RDS_USER": environment["RDS_USER"],
                 "RDS_PASSWORD": environment["RDS_PASSWORD"],
                 "RDS_DATABASE_NAME": environment["RDS_DATABASE_NAME"],
                 "RDS_TABLE_NAME": environment["RDS_TABLE_NAME"],
+                "RDS_CSV_NORMALIZATION": json.dumps(environment["RDS_CSV_NORMALIZATION"]),
             },
             vpc=vpc,
             vpc_subnets=vpc_subnets,
@@ -189,19 +310,17 @@ class RDSService(Construct):
             self,
             "TriggerConfigureRDSLambda",
             handler=self.configure_rds_lambda,  # this is underlying Lambda
-            execute_after=[self.rds_instance],  # runs once after RDS creation
+            execute_after=list(  # runs once after RDS (and its proxy) creation
+                filter(None, [self.rds_instance, self.rds_proxy])
+            ),
             execute_before=[  # before data is loaded to RDS
                 self.load_data_to_rds_lambda
             ],
             # invocation_type=triggers.InvocationType.REQUEST_RESPONSE,
             # timeout=self.configure_rds_lambda.timeout,
         )
-        self.configure_rds_lambda.add_environment(
-            key="RDS_HOST", value=self.rds_instance.db_instance_endpoint_address
-        )
-        self.load_data_to_rds_lambda.add_environment(
-            key="RDS_HOST", value=self.rds_instance.db_instance_endpoint_address
-        )
+        self.configure_rds_lambda.add_environment(key="RDS_HOST", value=self.rds_host)
+        self.load_data_to_rds_lambda.add_environment(key="RDS_HOST", value=self.rds_host)
 
 
 class CDCFromRDSToRedshiftService(Construct):
@@ -211,10 +330,12 @@ class CDCFromRDSToRedshiftService(Construct):
         construct_id: str,
         environment: dict,
         rds_endpoint_address: str,
+        rds_host: str,  # of the Lambdas, ie the RDS Proxy's endpoint if enabled
         redshift_endpoint_address: str,
         vpc: ec2.Vpc,
         vpc_subnets: ec2.SubnetSelection,
         security_group: ec2.SecurityGroup,
+        cdc_runtime_layer: _lambda.LayerVersion,
     ) -> None:
         super().__init__(scope, construct_id)  # required
         self.dms_rds_source_endpoint = dms.CfnEndpoint(
@@ -254,46 +375,68 @@ class CDCFromRDSToRedshiftService(Construct):
             vpc_security_group_ids=[security_group.security_group_id],
             publicly_accessible=False,
         )
-        self.dms_replication_task = dms.CfnReplicationTask(
-            self,
-            "DMSReplicationTask",
-            migration_type="full-load-and-cdc",
-            replication_instance_arn=self.dms_replication_instance.ref,  # appears that
-            source_endpoint_arn=self.dms_rds_source_endpoint.ref,  # `ref` means
-            target_endpoint_arn=self.dms_redshift_target_endpoint.ref,  # arn
-            table_mappings=json.dumps(
-                {
-                    "rules": [
-                        {
-                            "rule-type": "selection",
-                            "rule-id": "1",
-                            "rule-name": "1",
-                            "object-locator": {
-                                "schema-name": "%",
-                                "table-name": environment["RDS_TABLE_NAME"],
-                            },
-                            "rule-action": "include",
-                            "filters": [],
-                        }
-                    ]
-                }
-            ),
-            replication_task_settings=json.dumps({"Logging": {"EnableLogging": True}}),
-        )
+        self.dms_replication_tasks = [  # 1 task per group, so large tables can
+            dms.CfnReplicationTask(  # replicate in parallel on separate apply threads
+                self,
+                # the 1st keeps the ID of the single task of earlier versions, as a
+                # replaced task would full load (and so duplicate) the target tables
+                f"DMSReplicationTask-{task_index}" if task_index else "DMSReplicationTask",
+                migration_type="full-load-and-cdc",
+                replication_instance_arn=self.dms_replication_instance.ref,  # appears that
+                source_endpoint_arn=self.dms_rds_source_endpoint.ref,  # `ref` means
+                target_endpoint_arn=self.dms_redshift_target_endpoint.ref,  # arn
+                # a table matched by several groups is only replicated by the 1st,
+                # instead of twice into the same target table
+                table_mappings=json.dumps(
+                    {
+                        "rules": create_dms_selection_rules(
+                            table_patterns,
+                            excluded_table_patterns=[
+                                table_pattern
+                                for earlier_table_patterns in environment[
+                                    "DMS_REPLICATION_TASK_TABLE_GROUPS"
+                                ][:task_index]
+                                for table_pattern in earlier_table_patterns
+                            ],
+                        )
+                    }
+                ),
+                replication_task_settings=json.dumps({"Logging": {"EnableLogging": True}}),
+            )
+            for task_index, table_patterns in enumerate(
+                environment["DMS_REPLICATION_TASK_TABLE_GROUPS"]
+            )
+        ]
 
         env_vars = {
             "PRINT_RDS_AND_REDSHIFT_NUM_ROWS": json.dumps(
                 environment["PRINT_RDS_AND_REDSHIFT_NUM_ROWS"]
-            )
+            ),
+            "REDSHIFT_ROLLUPS": json.dumps(environment["REDSHIFT_ROLLUPS"]),
         }
+        if any(  # rollups of the DMS target tables are refreshed by this Lambda
+            "RDS_TABLE" in rollup
+            for rollup in environment["REDSHIFT_ROLLUPS"]["ROLLUPS"].values()
+        ):
+            env_vars.update(
+                {
+                    "RDS_DATABASE_NAME": environment["RDS_DATABASE_NAME"],
+                    "REDSHIFT_ENDPOINT_ADDRESS": redshift_endpoint_address,
+                    "REDSHIFT_USER": environment["REDSHIFT_USER"],
+                    "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
+                    "REDSHIFT_DATABASE_NAME": environment["REDSHIFT_DATABASE_NAME"],
+                }
+            )
         if environment["PRINT_RDS_AND_REDSHIFT_NUM_ROWS"]:
             env_vars.update(
                 {
-                    "RDS_HOST": rds_endpoint_address,
+                    "RDS_HOST": rds_host,
                     "RDS_USER": environment["RDS_USER"],
                     "RDS_PASSWORD": environment["RDS_PASSWORD"],
                     "RDS_DATABASE_NAME": environment["RDS_DATABASE_NAME"],
-                    "RDS_TABLE_NAME": environment["RDS_TABLE_NAME"],
+                    "DMS_REPLICATION_TASK_TABLE_GROUPS": json.dumps(
+                        environment["DMS_REPLICATION_TASK_TABLE_GROUPS"]
+                    ),
                     "REDSHIFT_ENDPOINT_ADDRESS": redshift_endpoint_address,
                     "REDSHIFT_USER": environment["REDSHIFT_USER"],
                     "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
@@ -304,26 +447,12 @@ class CDCFromRDSToRedshiftService(Construct):
             self,
             "StartDMSReplicationTaskLambda",
             runtime=_lambda.Runtime.PYTHON_3_9,
-            code=_lambda.Code.from_asset(
-                "source/start_dms_replication_task_lambda",
-                # exclude=[".venv/*"],  # seems to no longer do anything if use BundlingOptions
-                bundling=BundlingOptions(
-                    image=_lambda.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        " && ".join(
-                            [
-                                "pip install -r requirements.txt -t /asset-output",
-                                "cp handler.py /asset-output",  # need to cp instead of mv
-                            ]
-                        ),
-                    ],
-                ),
+            code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                "source/start_dms_replication_task_lambda"
             ),
             handler="handler.lambda_handler",
-            timeout=Duration.seconds(3),  # should be fairly quick
-            memory_size=128,  # in MB
+            **get_lambda_sizing(environment, "start_dms_replication_task_lambda"),
+            layers=[cdc_runtime_layer],
             environment=env_vars,
             vpc=vpc,
             vpc_subnets=vpc_subnets,
@@ -338,8 +467,13 @@ class CDCFromRDSToRedshiftService(Construct):
 
         # connect the AWS resources
         self.start_dms_replication_task_lambda.add_environment(
-            key="DMS_REPLICATION_TASK_ARN",
-            value=self.dms_replication_task.ref,  # appears `ref` means arn
+            key="DMS_REPLICATION_TASK_ARNS",
+            value=Stack.of(self).to_json_string(
+                [  # appears `ref` means arn
+                    dms_replication_task.ref
+                    for dms_replication_task in self.dms_replication_tasks
+                ]
+            ),
         )
         self.dms_endpoint = vpc.add_interface_endpoint(  # VPC endpoint needed
             "DmsEndpoint",  # by start_dms_replication_task_lambda
@@ -350,6 +484,21 @@ class CDCFromRDSToRedshiftService(Construct):
         )
 
 
+def get_dynamodb_capacity_settings(environment: dict) -> dict:
+    """`billing_mode` (and the minimum capacity of a provisioned table, which
+    autoscaling raises) of the CDC DynamoDB tables"""
+    capacity = environment["DYNAMODB_CAPACITY"]
+    if capacity["BILLING_MODE"] == "PAY_PER_REQUEST":
+        return {"billing_mode": dynamodb.BillingMode.PAY_PER_REQUEST}
+    if capacity["BILLING_MODE"] == "PROVISIONED":
+        return {
+            "billing_mode": dynamodb.BillingMode.PROVISIONED,
+            "read_capacity": capacity["PROVISIONED"]["READ"]["MIN_CAPACITY"],
+            "write_capacity": capacity["PROVISIONED"]["WRITE"]["MIN_CAPACITY"],
+        }
+    raise ValueError(f'Did not expect `BILLING_MODE` "{capacity["BILLING_MODE"]}"')
+
+
 class DynamoDBService(Construct):
     def __init__(
         self,
@@ -359,19 +508,69 @@ class DynamoDBService(Construct):
         vpc: ec2.Vpc,
         vpc_subnets: ec2.SubnetSelection,
         security_group: ec2.SecurityGroup,
+        cdc_runtime_layer: _lambda.LayerVersion,
     ) -> None:
         super().__init__(scope, construct_id)  # required
-        self.dynamodb_table = dynamodb.Table(
-            self,
-            "DynamoDBTableForCDCToRedshift",
-            partition_key=dynamodb.Attribute(
-                name="id", type=dynamodb.AttributeType.STRING
-            ),
-            stream=dynamodb.StreamViewType.NEW_IMAGE,
-            # CDK wil not automatically deleted DynamoDB during `cdk destroy`
-            # (as DynamoDB is a stateful resource) unless explicitly specified by the following line
-            removal_policy=RemovalPolicy.DESTROY,
-        )
+        pipeline_mode = environment["DYNAMODB_CDC_PIPELINE"]["MODE"]
+        self.kinesis_streams = {}  # for Redshift streaming ingestion, in "KINESIS" mode
+        if pipeline_mode == "KINESIS":
+            kinesis_settings = environment["DYNAMODB_CDC_PIPELINE"]["KINESIS"]
+            on_demand = kinesis_settings["STREAM_MODE"] == "ON_DEMAND"
+            self.kinesis_streams = {
+                cdc_table_key: kinesis.Stream(
+                    self,
+                    f"KinesisStreamForCDCToRedshift-{cdc_table_key}",
+                    stream_mode=(
+                        kinesis.StreamMode.ON_DEMAND
+                        if on_demand
+                        else kinesis.StreamMode.PROVISIONED
+                    ),
+                    shard_count=None if on_demand else kinesis_settings["SHARD_COUNT"],
+                    retention_period=Duration.hours(kinesis_settings["RETENTION_HOURS"]),
+                )
+                for cdc_table_key in environment["DYNAMODB_CDC_TABLES"]
+            }
+        elif pipeline_mode != "S3":
+            raise ValueError(f'Did not expect `DYNAMODB_CDC_PIPELINE` "MODE" "{pipeline_mode}"')
+        default_cdc_table_key = next(iter(environment["DYNAMODB_CDC_TABLES"]))
+        self.dynamodb_tables = {  # 1 table per entry in `DYNAMODB_CDC_TABLES` registry
+            cdc_table_key: dynamodb.Table(
+                self,
+                # the 1st keeps the ID of the single table of earlier versions, so
+                # that CloudFormation updates it instead of replacing (emptying) it
+                "DynamoDBTableForCDCToRedshift"
+                if cdc_table_key == default_cdc_table_key
+                else f"DynamoDBTableForCDCToRedshift-{cdc_table_key}",
+                partition_key=dynamodb.Attribute(
+                    name=cdc_table["PARTITION_KEY"], type=dynamodb.AttributeType.STRING
+                ),
+                # changes go to a DynamoDB stream, or to a Kinesis stream
+                stream=dynamodb.StreamViewType.NEW_IMAGE if pipeline_mode == "S3" else None,
+                kinesis_stream=self.kinesis_streams.get(cdc_table_key),
+                **get_dynamodb_capacity_settings(environment),
+                # exports to S3 (which bootstrap Redshift) need point in time recovery
+                point_in_time_recovery=environment["DYNAMODB_EXPORT_BOOTSTRAP"]["ENABLED"],
+                # CDK wil not automatically deleted DynamoDB during `cdk destroy`
+                # (as DynamoDB is a stateful resource) unless explicitly specified by the following line
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            for cdc_table_key, cdc_table in environment["DYNAMODB_CDC_TABLES"].items()
+        }
+        if environment["DYNAMODB_CAPACITY"]["BILLING_MODE"] == "PROVISIONED":
+            provisioned = environment["DYNAMODB_CAPACITY"]["PROVISIONED"]
+            for dynamodb_table in self.dynamodb_tables.values():  # target tracking
+                dynamodb_table.auto_scale_read_capacity(
+                    min_capacity=provisioned["READ"]["MIN_CAPACITY"],
+                    max_capacity=provisioned["READ"]["MAX_CAPACITY"],
+                ).scale_on_utilization(
+                    target_utilization_percent=provisioned["READ"]["TARGET_UTILIZATION_PERCENT"]
+                )
+                dynamodb_table.auto_scale_write_capacity(
+                    min_capacity=provisioned["WRITE"]["MIN_CAPACITY"],
+                    max_capacity=provisioned["WRITE"]["MAX_CAPACITY"],
+                ).scale_on_utilization(
+                    target_utilization_percent=provisioned["WRITE"]["TARGET_UTILIZATION_PERCENT"]
+                )
         self.s3_bucket_for_cdc_from_dynamodb_to_redshift = s3.Bucket(
             self,
             "DynamoDBStreamToRedshiftS3Bucket",
@@ -386,66 +585,112 @@ class DynamoDBService(Construct):
                 ),
             ],
         )
-
         self.load_data_to_dynamodb_lambda = _lambda.Function(
             self,
             "LoadDataToDynamoDBLambda",
             runtime=_lambda.Runtime.PYTHON_3_9,
-            code=_lambda.Code.from_asset(
-                "source/load_data_to_dynamodb_lambda",
-                exclude=[".venv/*"],
+            code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                "source/load_data_to_dynamodb_lambda"
             ),
             handler="handler.lambda_handler",
-            timeout=Duration.seconds(3),  # should be fairly quick
-            memory_size=128,  # in MB
-            environment={"JSON_FILENAME": environment["JSON_FILENAME"]},
-            vpc=vpc,
-            vpc_subnets=vpc_subnets,
-            security_groups=[security_group],
-        )
-        self.write_dynamodb_stream_to_s3_lambda = _lambda.Function(
-            self,
-            "WriteDynamoDBStreamToS3Lambda",
-            runtime=_lambda.Runtime.PYTHON_3_9,
-            code=_lambda.Code.from_asset(
-                "source/write_dynamodb_stream_to_s3_lambda",
-                exclude=[".venv/*"],
-            ),
-            handler="handler.lambda_handler",
-            timeout=Duration.seconds(3),  # should be fairly quick
-            memory_size=128,  # in MB
-            environment={  # apparently "AWS_REGION" is not allowed as a Lambda env variable
-                "AWSREGION": environment["AWS_REGION"],
-                "UNPROCESSED_DYNAMODB_STREAM_FOLDER": environment[
-                    "UNPROCESSED_DYNAMODB_STREAM_FOLDER"
-                ],
+            **get_lambda_sizing(environment, "load_data_to_dynamodb_lambda"),
+            layers=[cdc_runtime_layer],
+            environment={  # adaptive rate limits of the seed writes
+                "DYNAMODB_SEEDING": json.dumps(environment["DYNAMODB_SEEDING"]),
             },
             vpc=vpc,
             vpc_subnets=vpc_subnets,
             security_groups=[security_group],
         )
 
-        # connect the AWS resources
-        self.load_data_to_dynamodb_lambda.add_environment(
-            key="DYNAMODB_TABLE_NAME", value=self.dynamodb_table.table_name
-        )
-        self.dynamodb_table.grant_write_data(self.load_data_to_dynamodb_lambda)
-        self.write_dynamodb_stream_to_s3_lambda.add_environment(
-            key="S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT",
-            value=self.s3_bucket_for_cdc_from_dynamodb_to_redshift.bucket_name,
-        )
-        self.write_dynamodb_stream_to_s3_lambda.add_event_source(
-            event_sources.DynamoEventSource(
-                self.dynamodb_table,
-                starting_position=_lambda.StartingPosition.LATEST,
-                batch_size=100,  # hard coded
-                max_batching_window=Duration.seconds(5),  # hard coded
-                # filters=[{"event_name": _lambda.FilterRule.is_equal("INSERT")}]
+        self.dynamodb_stream_failure_queue = None
+        self.write_dynamodb_stream_to_s3_lambda = None
+        if pipeline_mode == "S3":  # else tables put changes on Kinesis streams
+            self.dynamodb_stream_failure_queue = sqs.Queue(  # metadata of stream batches
+                self,  # that still failed after all retries
+                "DynamoDBStreamFailureQueue",
+                retention_period=Duration.days(14),
+                removal_policy=RemovalPolicy.DESTROY,
             )
+            self.write_dynamodb_stream_to_s3_lambda = _lambda.Function(
+                self,
+                "WriteDynamoDBStreamToS3Lambda",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                    "source/write_dynamodb_stream_to_s3_lambda"
+                ),
+                handler="handler.lambda_handler",
+                **get_lambda_sizing(environment, "write_dynamodb_stream_to_s3_lambda"),
+                layers=[cdc_runtime_layer],
+                environment={  # apparently "AWS_REGION" is not allowed as a Lambda env variable
+                    "AWSREGION": environment["AWS_REGION"],
+                    "UNPROCESSED_DYNAMODB_STREAM_FOLDER": environment[
+                        "UNPROCESSED_DYNAMODB_STREAM_FOLDER"
+                    ],
+                    # `PROMOTED_COLUMNS` are extracted while staging the rows
+                    "DYNAMODB_CDC_TABLES": json.dumps(environment["DYNAMODB_CDC_TABLES"]),
+                },
+                vpc=vpc,
+                vpc_subnets=vpc_subnets,
+                security_groups=[security_group],
+            )
+
+        # connect the AWS resources
+        self.load_data_to_dynamodb_lambda.add_environment(  # table names are tokens,
+            key="DYNAMODB_TABLE_NAME_TO_JSON_FILENAME",  # so need `to_json_string`
+            value=Stack.of(self).to_json_string(
+                {
+                    self.dynamodb_tables[cdc_table_key].table_name: cdc_table[
+                        "JSON_FILENAME"
+                    ]
+                    for cdc_table_key, cdc_table in environment[
+                        "DYNAMODB_CDC_TABLES"
+                    ].items()
+                    if "JSON_FILENAME" in cdc_table  # seeding is optional per table
+                }
+            ),
         )
-        self.s3_bucket_for_cdc_from_dynamodb_to_redshift.grant_write(
-            self.write_dynamodb_stream_to_s3_lambda
-        )
+        for dynamodb_table in self.dynamodb_tables.values():
+            dynamodb_table.grant_write_data(self.load_data_to_dynamodb_lambda)
+        if pipeline_mode == "S3":
+            self.write_dynamodb_stream_to_s3_lambda.add_environment(
+                key="S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT",
+                value=self.s3_bucket_for_cdc_from_dynamodb_to_redshift.bucket_name,
+            )
+            self.write_dynamodb_stream_to_s3_lambda.add_environment(  # to route records
+                key="DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY",  # by `eventSourceARN`
+                value=Stack.of(self).to_json_string(
+                    {
+                        dynamodb_table.table_name: cdc_table_key
+                        for cdc_table_key, dynamodb_table in self.dynamodb_tables.items()
+                    }
+                ),
+            )
+            stream_settings = environment["DYNAMODB_STREAM_EVENT_SOURCE"]
+            for dynamodb_table in self.dynamodb_tables.values():
+                self.write_dynamodb_stream_to_s3_lambda.add_event_source(
+                    event_sources.DynamoEventSource(
+                        dynamodb_table,
+                        starting_position=_lambda.StartingPosition.LATEST,
+                        batch_size=stream_settings["BATCH_SIZE"],
+                        max_batching_window=Duration.seconds(
+                            stream_settings["MAX_BATCHING_WINDOW_SECONDS"]
+                        ),
+                        # up to 10 concurrent batches per shard, still in order per item key
+                        parallelization_factor=stream_settings["PARALLELIZATION_FACTOR"],
+                        report_batch_item_failures=True,  # handler returns `batchItemFailures`
+                        bisect_batch_on_error=True,  # to isolate bad records faster
+                        retry_attempts=stream_settings["RETRY_ATTEMPTS"],
+                        max_record_age=Duration.seconds(
+                            stream_settings["MAX_RECORD_AGE_SECONDS"]
+                        ),
+                        on_failure=event_sources.SqsDlq(self.dynamodb_stream_failure_queue),
+                        # filters=[{"event_name": _lambda.FilterRule.is_equal("INSERT")}]
+                    )
+                )
+            self.s3_bucket_for_cdc_from_dynamodb_to_redshift.grant_write(
+                self.write_dynamodb_stream_to_s3_lambda
+            )
         self.dynamodb_endpoint = vpc.add_gateway_endpoint(  # VPC endpoint needed
             "DynamodbEndpoint",  # by load_data_to_dynamodb_lambda
             service=ec2.GatewayVpcEndpointAwsService.DYNAMODB,
@@ -460,37 +705,27 @@ class CDCFromDynamoDBToRedshiftService(Construct):
         construct_id: str,
         environment: dict,
         s3_bucket_for_cdc_from_dynamodb_to_redshift: s3.Bucket,
+        dynamodb_tables: dict,
+        kinesis_streams: dict,
         redshift_endpoint_address: str,
         redshift_role_arn: str,
         vpc: ec2.Vpc,
         vpc_subnets: ec2.SubnetSelection,
         security_group: ec2.SecurityGroup,
+        cdc_runtime_layer: _lambda.LayerVersion,
     ) -> None:
         super().__init__(scope, construct_id)  # required
+        pipeline_mode = environment["DYNAMODB_CDC_PIPELINE"]["MODE"]
         self.configure_redshift_for_dynamodb_cdc_lambda = _lambda.Function(  # will be used once in Trigger defined below
             self,  # create the schema and table in Redshift for DynamoDB CDC
             "ConfigureRedshiftForDynamodbCDCLambda",
             runtime=_lambda.Runtime.PYTHON_3_9,
-            code=_lambda.Code.from_asset(
-                "source/configure_redshift_for_dynamodb_cdc_lambda",
-                # exclude=[".venv/*"],  # seems to no longer do anything if use BundlingOptions
-                bundling=BundlingOptions(
-                    image=_lambda.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        " && ".join(
-                            [
-                                "pip install -r requirements.txt -t /asset-output",
-                                "cp handler.py /asset-output",  # need to cp instead of mv
-                            ]
-                        ),
-                    ],
-                ),
+            code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                "source/configure_redshift_for_dynamodb_cdc_lambda"
             ),
             handler="handler.lambda_handler",
-            timeout=Duration.seconds(10),  # may take some time
-            memory_size=128,  # in MB
+            **get_lambda_sizing(environment, "configure_redshift_for_dynamodb_cdc_lambda"),
+            layers=[cdc_runtime_layer],
             environment={
                 "REDSHIFT_USER": environment["REDSHIFT_USER"],
                 "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
@@ -498,38 +733,103 @@ class CDCFromDynamoDBToRedshiftService(Construct):
                 "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC": environment[
                     "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
                 ],
-                "REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC": environment[
-                    "REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC"
-                ],
+                "DYNAMODB_CDC_TABLES": json.dumps(environment["DYNAMODB_CDC_TABLES"]),
+                "DYNAMODB_CDC_PIPELINE": json.dumps(environment["DYNAMODB_CDC_PIPELINE"]),
+                "REDSHIFT_ROLLUPS": json.dumps(environment["REDSHIFT_ROLLUPS"]),
             },
             vpc=vpc,
             vpc_subnets=vpc_subnets,
             security_groups=[security_group],
         )
-        self.load_s3_files_from_dynamodb_stream_to_redshift_lambda = _lambda.Function(
-            self,
-            "LoadS3FilesFromDynamoDBStreamToRedshiftLambda",
-            runtime=_lambda.Runtime.PYTHON_3_9,
-            code=_lambda.Code.from_asset(
-                "source/load_s3_files_from_dynamodb_stream_to_redshift_lambda",
-                # exclude=[".venv/*"],  # seems to no longer do anything if use BundlingOptions
-                bundling=BundlingOptions(
-                    image=_lambda.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        " && ".join(
-                            [
-                                "pip install -r requirements.txt -t /asset-output",
-                                "cp handler.py /asset-output",  # need to cp instead of mv
-                            ]
-                        ),
+        self.load_s3_files_from_dynamodb_stream_to_redshift_lambda = None
+        if pipeline_mode == "S3":  # else the streaming ingestion view loads itself
+            self.load_s3_files_from_dynamodb_stream_to_redshift_lambda = _lambda.Function(
+                self,
+                "LoadS3FilesFromDynamoDBStreamToRedshiftLambda",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                    "source/load_s3_files_from_dynamodb_stream_to_redshift_lambda"
+                ),
+                handler="handler.lambda_handler",
+                **get_lambda_sizing(environment, "load_s3_files_from_dynamodb_stream_to_redshift_lambda"),
+                layers=[cdc_runtime_layer],
+                environment={
+                    "REDSHIFT_USER": environment["REDSHIFT_USER"],
+                    "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
+                    "REDSHIFT_DATABASE_NAME": environment["REDSHIFT_DATABASE_NAME"],
+                    "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC": environment[
+                        "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
+                    ],
+                    "DYNAMODB_CDC_TABLES": json.dumps(environment["DYNAMODB_CDC_TABLES"]),
+                    "AWSREGION": environment[
+                        "AWS_REGION"
+                    ],  # apparently "AWS_REGION" is not allowed as a Lambda env variable
+                    "UNPROCESSED_DYNAMODB_STREAM_FOLDER": environment[
+                        "UNPROCESSED_DYNAMODB_STREAM_FOLDER"
                     ],
+                    "PROCESSED_DYNAMODB_STREAM_FOLDER": environment[
+                        "PROCESSED_DYNAMODB_STREAM_FOLDER"
+                    ],
+                    "MAX_CONCURRENT_REDSHIFT_COPIES": json.dumps(
+                        environment["MAX_CONCURRENT_REDSHIFT_COPIES"]
+                    ),
+                    "REDSHIFT_ROLLUPS": json.dumps(environment["REDSHIFT_ROLLUPS"]),
+                },
+                vpc=vpc,
+                vpc_subnets=vpc_subnets,
+                security_groups=[security_group],
+            )
+        self.bootstrap_dynamodb_to_redshift_lambda = None
+        if environment["DYNAMODB_EXPORT_BOOTSTRAP"]["ENABLED"]:
+            self.bootstrap_dynamodb_to_redshift_lambda = _lambda.Function(
+                self,  # full, then incremental DynamoDB exports to S3 -> Redshift
+                "BootstrapDynamoDBToRedshiftLambda",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                    "source/bootstrap_dynamodb_to_redshift_lambda"
                 ),
+                handler="handler.lambda_handler",
+                **get_lambda_sizing(environment, "bootstrap_dynamodb_to_redshift_lambda"),
+                layers=[cdc_runtime_layer],
+                environment={
+                    "REDSHIFT_USER": environment["REDSHIFT_USER"],
+                    "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
+                    "REDSHIFT_DATABASE_NAME": environment["REDSHIFT_DATABASE_NAME"],
+                    "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC": environment[
+                        "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
+                    ],
+                    "DYNAMODB_CDC_TABLES": json.dumps(environment["DYNAMODB_CDC_TABLES"]),
+                    "DYNAMODB_CDC_TABLE_KEY_TO_TABLE_ARN": Stack.of(self).to_json_string(
+                        {
+                            cdc_table_key: dynamodb_table.table_arn
+                            for cdc_table_key, dynamodb_table in dynamodb_tables.items()
+                        }
+                    ),
+                    "AWSREGION": environment["AWS_REGION"],
+                    "DYNAMODB_EXPORT_FOLDER": environment["DYNAMODB_EXPORT_BOOTSTRAP"][
+                        "S3_FOLDER"
+                    ],
+                    "INCREMENTAL_EXPORT_INTERVAL_MINUTES": json.dumps(
+                        environment["DYNAMODB_EXPORT_BOOTSTRAP"][
+                            "INCREMENTAL_EXPORT_INTERVAL_MINUTES"
+                        ]
+                    ),
+                },
+                vpc=vpc,
+                vpc_subnets=vpc_subnets,
+                security_groups=[security_group],
+            )
+
+        self.audit_dynamodb_against_redshift_lambda = _lambda.Function(
+            self,  # parallel scan of DynamoDB vs latest versions in Redshift
+            "AuditDynamoDBAgainstRedshiftLambda",
+            runtime=_lambda.Runtime.PYTHON_3_9,
+            code=_lambda.Code.from_asset(  # dependencies are in `cdc_runtime_layer`
+                "source/audit_dynamodb_against_redshift_lambda"
             ),
             handler="handler.lambda_handler",
-            timeout=Duration.seconds(20),  # may take some time if many files
-            memory_size=128,  # in MB
+            **get_lambda_sizing(environment, "audit_dynamodb_against_redshift_lambda"),
+            layers=[cdc_runtime_layer],
             environment={
                 "REDSHIFT_USER": environment["REDSHIFT_USER"],
                 "REDSHIFT_PASSWORD": environment["REDSHIFT_PASSWORD"],
@@ -537,18 +837,14 @@ class CDCFromDynamoDBToRedshiftService(Construct):
                 "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC": environment[
                     "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
                 ],
-                "REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC": environment[
-                    "REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC"
-                ],
-                "AWSREGION": environment[
-                    "AWS_REGION"
-                ],  # apparently "AWS_REGION" is not allowed as a Lambda env variable
-                "UNPROCESSED_DYNAMODB_STREAM_FOLDER": environment[
-                    "UNPROCESSED_DYNAMODB_STREAM_FOLDER"
-                ],
-                "PROCESSED_DYNAMODB_STREAM_FOLDER": environment[
-                    "PROCESSED_DYNAMODB_STREAM_FOLDER"
-                ],
+                "DYNAMODB_CDC_TABLES": json.dumps(environment["DYNAMODB_CDC_TABLES"]),
+                "DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY": Stack.of(self).to_json_string(
+                    {
+                        dynamodb_table.table_name: cdc_table_key
+                        for cdc_table_key, dynamodb_table in dynamodb_tables.items()
+                    }
+                ),
+                "DYNAMODB_AUDIT": json.dumps(environment["DYNAMODB_AUDIT"]),
             },
             vpc=vpc,
             vpc_subnets=vpc_subnets,
@@ -561,25 +857,89 @@ class CDCFromDynamoDBToRedshiftService(Construct):
             "TriggerConfigureRedshiftForDynamodbCDCLambda",
             handler=self.configure_redshift_for_dynamodb_cdc_lambda,  # this is underlying Lambda
             # runs once after Redshift cluster created and before data loaded into Redshift
-            execute_before=[self.load_s3_files_from_dynamodb_stream_to_redshift_lambda],
+            execute_before=list(
+                filter(
+                    None,
+                    [
+                        self.load_s3_files_from_dynamodb_stream_to_redshift_lambda,
+                        self.bootstrap_dynamodb_to_redshift_lambda,
+                    ],
+                )
+            ),
             # invocation_type=triggers.InvocationType.REQUEST_RESPONSE,
             # timeout=self.configure_redshift_for_dynamodb_cdc_lambda.timeout,
         )
         self.configure_redshift_for_dynamodb_cdc_lambda.add_environment(
             key="REDSHIFT_ENDPOINT_ADDRESS", value=redshift_endpoint_address
         )
+        if pipeline_mode == "KINESIS":  # to create the streaming ingestion views
+            self.configure_redshift_for_dynamodb_cdc_lambda.add_environment(
+                key="REDSHIFT_ROLE_ARN", value=redshift_role_arn
+            )
+            self.configure_redshift_for_dynamodb_cdc_lambda.add_environment(
+                key="DYNAMODB_CDC_TABLE_KEY_TO_KINESIS_STREAM_NAME",
+                value=Stack.of(self).to_json_string(
+                    {
+                        cdc_table_key: kinesis_stream.stream_name
+                        for cdc_table_key, kinesis_stream in kinesis_streams.items()
+                    }
+                ),
+            )
+        for key, value in {
+            "S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT": s3_bucket_for_cdc_from_dynamodb_to_redshift.bucket_name,
+            "REDSHIFT_ENDPOINT_ADDRESS": redshift_endpoint_address,
+        }.items():
+            self.audit_dynamodb_against_redshift_lambda.add_environment(key=key, value=value)
+        for dynamodb_table in dynamodb_tables.values():
+            dynamodb_table.grant(self.audit_dynamodb_against_redshift_lambda, "dynamodb:Scan")
+        s3_bucket_for_cdc_from_dynamodb_to_redshift.grant_read_write(  # audit reports
+            self.audit_dynamodb_against_redshift_lambda  # and scan checkpoints
+        )
         lambda_environment_variables = {
             "S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT": s3_bucket_for_cdc_from_dynamodb_to_redshift.bucket_name,
             "REDSHIFT_ENDPOINT_ADDRESS": redshift_endpoint_address,
             "REDSHIFT_ROLE_ARN": redshift_role_arn,
         }
-        for key, value in lambda_environment_variables.items():
-            self.load_s3_files_from_dynamodb_stream_to_redshift_lambda.add_environment(
-                key=key, value=value
+        if self.load_s3_files_from_dynamodb_stream_to_redshift_lambda is not None:
+            for key, value in lambda_environment_variables.items():
+                self.load_s3_files_from_dynamodb_stream_to_redshift_lambda.add_environment(
+                    key=key, value=value
+                )
+            s3_bucket_for_cdc_from_dynamodb_to_redshift.grant_read_write(
+                self.load_s3_files_from_dynamodb_stream_to_redshift_lambda
+            )
+        if self.bootstrap_dynamodb_to_redshift_lambda is not None:
+            for key, value in lambda_environment_variables.items():
+                self.bootstrap_dynamodb_to_redshift_lambda.add_environment(
+                    key=key, value=value
+                )
+            # DynamoDB writes the export to S3 with the caller's permissions
+            s3_bucket_for_cdc_from_dynamodb_to_redshift.grant_read_write(
+                self.bootstrap_dynamodb_to_redshift_lambda
+            )
+            s3_bucket_for_cdc_from_dynamodb_to_redshift.grant_put_acl(
+                self.bootstrap_dynamodb_to_redshift_lambda
+            )
+            self.bootstrap_dynamodb_to_redshift_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=[  # and the stream's attach point
+                        "dynamodb:ExportTableToPointInTime",
+                        "dynamodb:DescribeTable",
+                    ],
+                    resources=[
+                        dynamodb_table.table_arn for dynamodb_table in dynamodb_tables.values()
+                    ],
+                )
+            )
+            self.bootstrap_dynamodb_to_redshift_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["dynamodb:DescribeExport"],
+                    resources=[
+                        f"{dynamodb_table.table_arn}/export/*"
+                        for dynamodb_table in dynamodb_tables.values()
+                    ],
+                )
             )
-        s3_bucket_for_cdc_from_dynamodb_to_redshift.grant_read_write(
-            self.load_s3_files_from_dynamodb_stream_to_redshift_lambda
-        )
         self.s3_endpoint = vpc.add_gateway_endpoint(  # VPC endpoint needed
             "S3Endpoint",  # by load_s3_files_from_dynamodb_stream_to_redshift_lambda
             service=ec2.GatewayVpcEndpointAwsService.S3,
@@ -632,12 +992,44 @@ class CDCStack(Stack):
             connection=ec2.Port.tcp(443),  # HTTPS for DMS endpoint for boto3
         )
 
+        self.cdc_runtime_layer = _lambda.LayerVersion(  # shared by all Lambdas
+            self,
+            "CDCRuntimeLayer",
+            code=_lambda.Code.from_asset(
+                "source/cdc_runtime_layer",
+                bundling=BundlingOptions(
+                    local=LocalLayerBundling(),  # else in Docker, with:
+                    image=_lambda.Runtime.PYTHON_3_9.bundling_image,
+                    command=[
+                        "bash",
+                        "-c",
+                        " && ".join(
+                            [  # layers are extracted to /opt, and /opt/python is on sys.path
+                                # `requirements.txt` is fully pinned and leaves out boto3 and
+                                # its dependencies (botocore, s3transfer, jmespath,
+                                # python-dateutil, six), which the Lambda runtime has, so
+                                # `--no-deps` keeps redshift-connector from pulling them back in
+                                "pip install --no-deps -r requirements.txt -t /asset-output/python",
+                                "cp -r python/cdc_runtime /asset-output/python",
+                            ]
+                        ),
+                    ],
+                ),
+            ),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_9],
+            description="Shared runtime (config, clients, connections, serializers, etc) for the CDC Lambdas",
+        )
+
         self.redshift_service = RedshiftService(
             self,
             "RedshiftService",
             environment=environment,
             vpc=self.vpc,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PRIVATE_ISOLATED
+            ),
             security_group=self.security_group_for_rds_redshift_dms,
+            cdc_runtime_layer=self.cdc_runtime_layer,
         )
         self.rds_service = RDSService(
             self,
@@ -648,19 +1040,30 @@ class CDCStack(Stack):
                 subnet_type=ec2.SubnetType.PRIVATE_ISOLATED
             ),
             security_group=self.security_group_for_rds_redshift_dms,
+            cdc_runtime_layer=self.cdc_runtime_layer,
         )
         self.cdc_from_rds_to_redshift_service = CDCFromRDSToRedshiftService(
             self,
             "CDCFromRDSToRedshiftService",
             environment=environment,
             rds_endpoint_address=self.rds_service.rds_instance.db_instance_endpoint_address,
+            rds_host=self.rds_service.rds_host,
             redshift_endpoint_address=self.redshift_service.redshift_cluster.attr_endpoint_address,
             vpc=self.vpc,
             vpc_subnets=ec2.SubnetSelection(
                 subnet_type=ec2.SubnetType.PRIVATE_ISOLATED
             ),
             security_group=self.security_group_for_rds_redshift_dms,
+            cdc_runtime_layer=self.cdc_runtime_layer,
         )
+        if (
+            environment["DYNAMODB_CDC_PIPELINE"]["MODE"] == "KINESIS"
+            and environment["DYNAMODB_EXPORT_BOOTSTRAP"]["ENABLED"]
+        ):  # exports are loaded into the S3 path's tables, not into the views
+            raise ValueError(
+                'Set `DYNAMODB_EXPORT_BOOTSTRAP` "ENABLED" to false for the "KINESIS" '
+                "`DYNAMODB_CDC_PIPELINE`"
+            )
         self.dynamodb_service = DynamoDBService(
             self,
             "DynamoDBService",
@@ -670,12 +1073,15 @@ class CDCStack(Stack):
                 subnet_type=ec2.SubnetType.PRIVATE_ISOLATED
             ),
             security_group=self.security_group_for_rds_redshift_dms,
+            cdc_runtime_layer=self.cdc_runtime_layer,
         )
         self.cdc_from_dynamodb_to_redshift_service = CDCFromDynamoDBToRedshiftService(
             self,
             "CDCFromDynamoDBToRedshiftService",
             environment=environment,
             s3_bucket_for_cdc_from_dynamodb_to_redshift=self.dynamodb_service.s3_bucket_for_cdc_from_dynamodb_to_redshift,
+            dynamodb_tables=self.dynamodb_service.dynamodb_tables,
+            kinesis_streams=self.dynamodb_service.kinesis_streams,
             redshift_endpoint_address=self.redshift_service.redshift_cluster.attr_endpoint_address,
             redshift_role_arn=self.redshift_service.redshift_full_commands_full_access_role.role_arn,
             vpc=self.vpc,
@@ -683,7 +1089,12 @@ class CDCStack(Stack):
                 subnet_type=ec2.SubnetType.PRIVATE_ISOLATED
             ),
             security_group=self.security_group_for_rds_redshift_dms,
+            cdc_runtime_layer=self.cdc_runtime_layer,
         )
+        for kinesis_stream in self.dynamodb_service.kinesis_streams.values():
+            kinesis_stream.grant_read(  # streaming ingestion reads as the cluster's role
+                self.redshift_service.redshift_full_commands_full_access_role
+            )
 
         # schedule Lambdas to run
         self.scheduled_eventbridge_event = events.Rule(
@@ -697,8 +1108,9 @@ class CDCStack(Stack):
             self.cdc_from_rds_to_redshift_service.start_dms_replication_task_lambda,
             self.dynamodb_service.load_data_to_dynamodb_lambda,
             self.cdc_from_dynamodb_to_redshift_service.load_s3_files_from_dynamodb_stream_to_redshift_lambda,
+            self.cdc_from_dynamodb_to_redshift_service.bootstrap_dynamodb_to_redshift_lambda,
         ]
-        for lambda_function in lambda_functions:
+        for lambda_function in filter(None, lambda_functions):  # None if disabled
             self.scheduled_eventbridge_event.add_target(
                 target=events_targets.LambdaFunction(
                     handler=lambda_function,
@@ -706,6 +1118,35 @@ class CDCStack(Stack):
                     ### then put in DLQ
                 ),
             )
+        self.scheduled_audit_eventbridge_event = events.Rule(
+            self,
+            "RunDynamoDBAudit",
+            event_bus=None,  # scheduled events must be on "default" bus
+            schedule=events.Schedule.rate(
+                Duration.hours(environment["DYNAMODB_AUDIT"]["SCHEDULE_HOURS"])
+            ),
+        )
+        self.scheduled_audit_eventbridge_event.add_target(
+            target=events_targets.LambdaFunction(
+                handler=self.cdc_from_dynamodb_to_redshift_service.audit_dynamodb_against_redshift_lambda,
+                retry_attempts=0,  # a full scan is expensive, so wait for the next run
+            ),
+        )
+
+        self.scheduled_maintenance_eventbridge_event = events.Rule(
+            self,
+            "RunRedshiftMaintenance",
+            event_bus=None,  # scheduled events must be on "default" bus
+            schedule=events.Schedule.rate(
+                Duration.minutes(environment["REDSHIFT_MAINTENANCE"]["SCHEDULE_MINUTES"])
+            ),
+        )
+        self.scheduled_maintenance_eventbridge_event.add_target(
+            target=events_targets.LambdaFunction(
+                handler=self.redshift_service.maintain_redshift_tables_lambda,
+                retry_attempts=0,  # deferred tables are picked up by the next run
+            ),
+        )
 
         # write Cloudformation Outputs
         self.output_redshift_endpoint_address = CfnOutput(
@@ -718,21 +1159,44 @@ class CDCStack(Stack):
             "RdsEndpointAddress",  # Output omits underscores and hyphens
             value=self.rds_service.rds_instance.db_instance_endpoint_address,
         )
+        if self.rds_service.rds_proxy is not None:
+            self.output_rds_proxy_endpoint = CfnOutput(
+                self,
+                "RdsProxyEndpoint",  # Output omits underscores and hyphens
+                value=self.rds_service.rds_proxy.endpoint,
+            )
         self.output_dms_vpc_endpoint_id = CfnOutput(
             self,
             "DmsVpcEndpointId",  # Output omits underscores and hyphens
             value=self.cdc_from_rds_to_redshift_service.dms_endpoint.vpc_endpoint_id,
         )
-        self.output_dynamodb_table_name = CfnOutput(
-            self,
-            "DynamodbTableName",  # Output omits underscores and hyphens
-            value=self.dynamodb_service.dynamodb_table.table_name,
-        )
+        self.output_dynamodb_table_names = {
+            cdc_table_key: CfnOutput(
+                self,
+                f"DynamodbTableName-{cdc_table_key}",  # Output omits underscores and hyphens
+                value=dynamodb_table.table_name,
+            )
+            for cdc_table_key, dynamodb_table in self.dynamodb_service.dynamodb_tables.items()
+        }
         self.output_s3_bucket_for_dynamodb_stream_to_redshift = CfnOutput(
             self,
             "S3BucketForDynamodbStreamToRedshift",  # Output omits underscores and hyphens
             value=self.dynamodb_service.s3_bucket_for_cdc_from_dynamodb_to_redshift.bucket_name,
         )
+        if self.dynamodb_service.dynamodb_stream_failure_queue is not None:
+            self.output_dynamodb_stream_failure_queue_url = CfnOutput(
+                self,
+                "DynamodbStreamFailureQueueUrl",  # Output omits underscores and hyphens
+                value=self.dynamodb_service.dynamodb_stream_failure_queue.queue_url,
+            )
+        self.output_kinesis_stream_names = {
+            cdc_table_key: CfnOutput(
+                self,
+                f"KinesisStreamName-{cdc_table_key}",  # Output omits underscores and hyphens
+                value=kinesis_stream.stream_name,
+            )
+            for cdc_table_key, kinesis_stream in self.dynamodb_service.kinesis_streams.items()
+        }
         self.output_dynamodb_vpc_endpoint_id = CfnOutput(
             self,
             "DynamodbVpcEndpointId",  # Output omits underscores and hyphens
@@ -0,0 +1,489 @@
+import hashlib
+import json
+import math
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal
+
+from cdc_runtime.clients import get_boto3_client
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import connect_to_redshift
+from cdc_runtime.freshness import APPROXIMATE_CREATION_TIME_COLUMN, format_timestamp
+from cdc_runtime.instrumentation import count, instrumented, time_stage
+from cdc_runtime.metrics import put_metrics
+from cdc_runtime.serializers import SEQUENCE_NUMBER_COLUMN, deserialize_dynamodb_image
+from cdc_runtime.throttling import RateLimiter
+
+S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT = get_env(
+    "S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT"
+)
+REDSHIFT_DATABASE_NAME = get_env("REDSHIFT_DATABASE_NAME")
+REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC = get_env("REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC")
+DYNAMODB_CDC_TABLES = get_json_env("DYNAMODB_CDC_TABLES")
+DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY = get_json_env(
+    "DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY"
+)
+DYNAMODB_AUDIT = get_json_env("DYNAMODB_AUDIT")
+
+NUMERIC_TYPES = re.compile(
+    r"^(smallint|integer|int|int2|int4|int8|bigint|decimal|numeric|real|float|float4|float8|double)\b",
+    re.I,
+)
+TEXT_TYPES = re.compile(r"^(varchar|char|character|text|nvarchar|nchar|bpchar)\b", re.I)
+NUMERIC_SCALE = 6  # numbers are compared as DECIMAL(38, 6)
+MAX_PRINTED_IDS = 20
+
+
+def get_audit_columns(cdc_table: dict) -> list:
+    """[(column name, is numeric)] of the columns hashed per item: `AUDIT_COLUMNS`
+    of the CDC table, or else all its number and text columns (SUPER values have
+    no canonical text form to hash on both sides)"""
+    column_types = {
+        column_name_and_type.split()[0]: column_name_and_type.split()[1]
+        for column_name_and_type in cdc_table["REDSHIFT_COLUMNS"]
+    }
+    audit_columns = []
+    for column_name in cdc_table.get("AUDIT_COLUMNS", column_types):
+        column_type = column_types[column_name]
+        if NUMERIC_TYPES.match(column_type):
+            audit_columns.append((column_name, True))
+        elif TEXT_TYPES.match(column_type):
+            audit_columns.append((column_name, False))
+        elif "AUDIT_COLUMNS" in cdc_table:
+            raise ValueError(f"Cannot audit `{column_name}` of type {column_type}")
+    return audit_columns
+
+
+def hash_to_int(text: str) -> int:
+    """First 32 bits of the MD5, ie `STRTOL(SUBSTRING(MD5(text), 1, 8), 16)`"""
+    return int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+
+
+def canonicalize(value, is_numeric: bool) -> str:
+    """Same text as `create_canonical_sql_expression` gives in Redshift"""
+    if value is None:
+        return ""
+    if is_numeric:
+        return str(
+            Decimal(str(value)).quantize(Decimal(1).scaleb(-NUMERIC_SCALE), ROUND_HALF_UP)
+        )
+    return str(value)
+
+
+def create_canonical_sql_expression(audit_columns: list) -> str:
+    return " || '|' || ".join(
+        f'COALESCE(CAST(CAST("{column_name}" AS DECIMAL(38, {NUMERIC_SCALE})) AS VARCHAR(64)), \'\')'
+        if is_numeric
+        else f'COALESCE("{column_name}", \'\')'
+        for column_name, is_numeric in audit_columns
+    )
+
+
+def get_checkpoint_s3_file(cdc_table_key: str, segment: int) -> str:
+    return f"{DYNAMODB_AUDIT['S3_FOLDER']}/{cdc_table_key}/checkpoints/segment_{segment}.json"
+
+
+def has_checkpoints(cdc_table_key: str) -> bool:
+    response = get_boto3_client("s3").list_objects_v2(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        Prefix=f"{DYNAMODB_AUDIT['S3_FOLDER']}/{cdc_table_key}/checkpoints/",
+        MaxKeys=1,
+    )
+    count("S3Requests")
+    return response["KeyCount"] > 0
+
+
+def read_checkpoint(cdc_table_key: str, segment: int) -> dict:
+    """{} if the segment was not left unfinished by an earlier run (or with
+    other `TOTAL_SEGMENTS`/`NUM_ID_BUCKETS`), else the `first_pass` result (None
+    while in the first pass), the segment's `hashes` so far (see `scan_segment`)
+    and the `exclusive_start_key` to continue from ({} before the first page,
+    None once scanned)"""
+    try:
+        response = get_boto3_client("s3").get_object(
+            Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+            Key=get_checkpoint_s3_file(cdc_table_key, segment),
+        )
+    except Exception as exception:
+        if getattr(exception, "response", {}).get("Error", {}).get("Code") == "NoSuchKey":
+            return {}
+        raise
+    finally:
+        count("S3Requests")
+    checkpoint = json.loads(response["Body"].read())
+    if (checkpoint["total_segments"], checkpoint["num_id_buckets"]) != (
+        DYNAMODB_AUDIT["TOTAL_SEGMENTS"],
+        DYNAMODB_AUDIT["NUM_ID_BUCKETS"],
+    ):
+        return {}
+    hashes = checkpoint["hashes"]
+    if checkpoint["first_pass"] is None:  # JSON keys are strings
+        hashes = {int(bucket): aggregates for bucket, aggregates in hashes.items()}
+    return {
+        "first_pass": checkpoint["first_pass"],
+        "hashes": hashes,
+        "exclusive_start_key": checkpoint["exclusive_start_key"],
+    }
+
+
+def write_checkpoint(
+    cdc_table_key: str, segment: int, first_pass, hashes: dict, exclusive_start_key
+) -> None:
+    get_boto3_client("s3").put_object(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        Key=get_checkpoint_s3_file(cdc_table_key, segment),
+        Body=json.dumps(
+            {
+                "total_segments": DYNAMODB_AUDIT["TOTAL_SEGMENTS"],
+                "num_id_buckets": DYNAMODB_AUDIT["NUM_ID_BUCKETS"],
+                "first_pass": first_pass,
+                "hashes": hashes,
+                "exclusive_start_key": exclusive_start_key,
+            }
+        ).encode(),
+    )
+    count("S3Requests")
+
+
+def delete_checkpoints(cdc_table_key: str) -> None:
+    get_boto3_client("s3").delete_objects(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        Delete={
+            "Objects": [
+                {"Key": get_checkpoint_s3_file(cdc_table_key, segment)}
+                for segment in range(DYNAMODB_AUDIT["TOTAL_SEGMENTS"])
+            ],
+            "Quiet": True,
+        },
+    )
+    count("S3Requests")
+
+
+def scan_segment(
+    dynamodb_table_name: str,
+    cdc_table: dict,
+    audit_columns: list,
+    segment: int,
+    rate_limiter: RateLimiter,
+    checkpoint: dict,
+    deadline: float,
+    mismatched_buckets: set = None,
+) -> tuple:
+    """(the hashes of 1 segment of a parallel scan, and the key to continue
+    from if it stopped at the `deadline` (`time.monotonic()`), or None once
+    scanned), continued from the segment's `checkpoint`. The hashes are
+    {bucket: [number of ids, sum of item hashes]} in the first pass, and
+    {id: item hash} of the ids of the `mismatched_buckets` in the second, so
+    that neither pass holds the hash of every id in memory or in checkpoints."""
+    dynamodb_client = get_boto3_client("dynamodb")
+    partition_key = cdc_table["PARTITION_KEY"]
+    if mismatched_buckets is None:
+        hashes = defaultdict(lambda: [0, 0], checkpoint.get("hashes", {}))
+    else:
+        hashes = dict(checkpoint.get("hashes", {}))
+    scan_kwargs = {
+        "TableName": dynamodb_table_name,
+        "Segment": segment,
+        "TotalSegments": DYNAMODB_AUDIT["TOTAL_SEGMENTS"],
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if checkpoint:
+        if checkpoint["exclusive_start_key"] is None:  # scanned by an earlier run
+            return hashes, None
+        if checkpoint["exclusive_start_key"]:
+            scan_kwargs["ExclusiveStartKey"] = checkpoint["exclusive_start_key"]
+    while True:
+        if time.monotonic() > deadline:
+            return hashes, scan_kwargs.get("ExclusiveStartKey", {})
+        response = dynamodb_client.scan(**scan_kwargs)
+        count("DynamoDBRequests")
+        count("ReadCapacityUnits", response["ConsumedCapacity"]["CapacityUnits"])
+        with time_stage("Throttle"):
+            rate_limiter.acquire(response["ConsumedCapacity"]["CapacityUnits"])
+        for typed_item in response["Items"]:
+            item = deserialize_dynamodb_image(typed_item)
+            item_id = str(item[partition_key])
+            bucket = hash_to_int(item_id) % DYNAMODB_AUDIT["NUM_ID_BUCKETS"]
+            if mismatched_buckets is not None and bucket not in mismatched_buckets:
+                continue
+            item_hash = hash_to_int(
+                "|".join(
+                    canonicalize(item.get(column_name), is_numeric)
+                    for column_name, is_numeric in audit_columns
+                )
+            )
+            if mismatched_buckets is None:
+                hashes[bucket][0] += 1
+                hashes[bucket][1] += item_hash
+            else:
+                hashes[item_id] = item_hash
+        count("Records", len(response["Items"]))
+        if "LastEvaluatedKey" not in response:
+            return hashes, None
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def read_checkpoints(cdc_table_key: str) -> list:
+    segments = range(DYNAMODB_AUDIT["TOTAL_SEGMENTS"])
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        return list(
+            executor.map(lambda segment: read_checkpoint(cdc_table_key, segment), segments)
+        )
+
+
+def scan_dynamodb_table(
+    dynamodb_table_name: str,
+    cdc_table_key: str,
+    cdc_table: dict,
+    audit_columns: list,
+    checkpoints: list,
+    deadline: float,
+    first_pass: dict = None,
+):
+    """The hashes of the whole table (see `scan_segment`): of the first pass,
+    or of the second if given the `first_pass` result. It is a parallel scan
+    whose segments share 1 budget of read capacity units per second. None if it
+    did not finish by the `deadline`, after saving each segment's progress in S3
+    for the next run to continue from."""
+    rate_limiter = RateLimiter(DYNAMODB_AUDIT["MAX_READ_CAPACITY_UNITS_PER_SECOND"])
+    segments = range(DYNAMODB_AUDIT["TOTAL_SEGMENTS"])
+    mismatched_buckets = None if first_pass is None else set(first_pass["mismatched_buckets"])
+    with time_stage("Scan"), ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        scanned_segments = list(
+            executor.map(
+                lambda segment: scan_segment(
+                    dynamodb_table_name,
+                    cdc_table,
+                    audit_columns,
+                    segment,
+                    rate_limiter,
+                    checkpoints[segment],
+                    deadline,
+                    mismatched_buckets,
+                ),
+                segments,
+            )
+        )
+        num_unfinished_segments = sum(
+            exclusive_start_key is not None for _, exclusive_start_key in scanned_segments
+        )
+        if num_unfinished_segments:
+            list(
+                executor.map(
+                    lambda segment: write_checkpoint(
+                        cdc_table_key, segment, first_pass, *scanned_segments[segment]
+                    ),
+                    segments,
+                )
+            )
+            print(
+                f"Audit of `{cdc_table_key}` continues on the next run, "
+                f"{num_unfinished_segments} of {len(segments)} segments of its "
+                f"{'first' if first_pass is None else 'second'} pass are unfinished"
+            )
+            return None
+    if first_pass is not None:
+        item_hashes = {}
+        for segment_item_hashes, _ in scanned_segments:
+            item_hashes.update(segment_item_hashes)
+        return item_hashes
+    aggregates_per_bucket = defaultdict(lambda: (0, 0))
+    for segment_aggregates_per_bucket, _ in scanned_segments:
+        for bucket, (num_ids, hash_sum) in segment_aggregates_per_bucket.items():
+            aggregates_per_bucket[bucket] = (
+                aggregates_per_bucket[bucket][0] + num_ids,
+                aggregates_per_bucket[bucket][1] + hash_sum,
+            )
+    return dict(aggregates_per_bucket)
+
+
+def create_hashed_sql_statement(cdc_table: dict, audit_columns: list) -> str:
+    """Bucket and hash of the latest version of each id in Redshift, computed
+    the same way as `scan_segment` does in Python"""
+    partition_key = cdc_table["PARTITION_KEY"]
+    column_names = ", ".join(
+        f'"{column_name}"'
+        for column_name in dict.fromkeys([partition_key] + [name for name, _ in audit_columns])
+    )
+    return f"""
+        WITH latest AS (
+            SELECT
+                {column_names},
+                ROW_NUMBER() OVER (
+                    PARTITION BY "{partition_key}"
+                    ORDER BY {APPROXIMATE_CREATION_TIME_COLUMN} DESC NULLS LAST,
+                    {SEQUENCE_NUMBER_COLUMN} DESC NULLS LAST
+                ) AS version_rank
+            FROM {REDSHIFT_DATABASE_NAME}.{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}.{cdc_table["REDSHIFT_TABLE_NAME"]}
+        ), hashed AS (
+            SELECT
+                "{partition_key}" AS item_id,
+                MOD(STRTOL(SUBSTRING(MD5("{partition_key}"), 1, 8), 16), {DYNAMODB_AUDIT["NUM_ID_BUCKETS"]}) AS bucket,
+                STRTOL(SUBSTRING(MD5({create_canonical_sql_expression(audit_columns)}), 1, 8), 16) AS item_hash
+            FROM latest
+            WHERE version_rank = 1
+        )"""
+
+
+def get_redshift_aggregates(cdc_table: dict, audit_columns: list) -> dict:
+    """{bucket: (number of ids, sum of item hashes)} in Redshift"""
+    conn = connect_to_redshift()
+    with time_stage("Query"), conn, conn.cursor() as cursor:
+        cursor.execute(
+            f"""{create_hashed_sql_statement(cdc_table, audit_columns)}
+            SELECT bucket, COUNT(*), SUM(item_hash) FROM hashed GROUP BY bucket;"""
+        )
+        aggregates_per_bucket = {
+            bucket: (num_ids, int(hash_sum)) for bucket, num_ids, hash_sum in cursor.fetchall()
+        }
+    count("RedshiftStatements")
+    return aggregates_per_bucket
+
+
+def get_redshift_item_hashes(cdc_table: dict, audit_columns: list, buckets: list) -> dict:
+    """{id: item hash} of the ids of some buckets in Redshift"""
+    conn = connect_to_redshift()
+    with time_stage("Query"), conn, conn.cursor() as cursor:
+        cursor.execute(
+            f"""{create_hashed_sql_statement(cdc_table, audit_columns)}
+            SELECT item_id, item_hash FROM hashed
+            WHERE bucket IN ({", ".join(map(str, buckets))});"""
+        )
+        item_hashes = dict(cursor.fetchall())
+    count("RedshiftStatements")
+    return item_hashes
+
+
+def audit_cdc_table(dynamodb_table_name: str, cdc_table_key: str, deadline: float):
+    """The report of the CDC table, or None if its scan continues on the next
+    run. The first pass compares the number of ids and the sum of their hashes
+    per bucket, and the second pass (only if some buckets differ) scans the
+    table again for the ids of those buckets, to compare them id by id."""
+    cdc_table = DYNAMODB_CDC_TABLES[cdc_table_key]
+    audit_columns = get_audit_columns(cdc_table)
+    checkpoints = read_checkpoints(cdc_table_key)
+    first_pass = next(
+        (checkpoint["first_pass"] for checkpoint in checkpoints if checkpoint), None
+    )
+    second_pass_checkpoints = checkpoints
+    if first_pass is None:
+        aggregates_per_bucket = scan_dynamodb_table(
+            dynamodb_table_name, cdc_table_key, cdc_table, audit_columns, checkpoints, deadline
+        )
+        if aggregates_per_bucket is None:
+            return None
+        redshift_aggregates_per_bucket = get_redshift_aggregates(cdc_table, audit_columns)
+        first_pass = {
+            "num_dynamodb_items": sum(
+                num_ids for num_ids, _ in aggregates_per_bucket.values()
+            ),
+            "num_redshift_ids": sum(
+                num_ids for num_ids, _ in redshift_aggregates_per_bucket.values()
+            ),
+            "mismatched_buckets": sorted(
+                bucket
+                for bucket in aggregates_per_bucket.keys() | redshift_aggregates_per_bucket.keys()
+                if aggregates_per_bucket.get(bucket) != redshift_aggregates_per_bucket.get(bucket)
+            ),
+        }
+        second_pass_checkpoints = [{} for _ in checkpoints]
+    dynamodb_item_hashes = redshift_item_hashes = {}
+    if first_pass["mismatched_buckets"]:
+        dynamodb_item_hashes = scan_dynamodb_table(
+            dynamodb_table_name,
+            cdc_table_key,
+            cdc_table,
+            audit_columns,
+            second_pass_checkpoints,
+            deadline,
+            first_pass,
+        )
+        if dynamodb_item_hashes is None:
+            return None
+        redshift_item_hashes = get_redshift_item_hashes(
+            cdc_table, audit_columns, first_pass["mismatched_buckets"]
+        )
+    if any(checkpoints):  # the audit is complete
+        delete_checkpoints(cdc_table_key)
+    return {
+        "cdc_table_key": cdc_table_key,
+        "audited_at": format_timestamp(time.time()),
+        "audit_columns": [column_name for column_name, _ in audit_columns],
+        "num_dynamodb_items": first_pass["num_dynamodb_items"],
+        "num_redshift_ids": first_pass["num_redshift_ids"],
+        "num_buckets": DYNAMODB_AUDIT["NUM_ID_BUCKETS"],
+        "mismatched_buckets": first_pass["mismatched_buckets"],
+        "missing_in_redshift": sorted(dynamodb_item_hashes.keys() - redshift_item_hashes.keys()),
+        "missing_in_dynamodb": sorted(redshift_item_hashes.keys() - dynamodb_item_hashes.keys()),
+        "different": sorted(
+            item_id
+            for item_id in dynamodb_item_hashes.keys() & redshift_item_hashes.keys()
+            if dynamodb_item_hashes[item_id] != redshift_item_hashes[item_id]
+        ),
+    }
+
+
+def write_report(report: dict) -> str:
+    s3_file = (
+        f"{DYNAMODB_AUDIT['S3_FOLDER']}/{report['cdc_table_key']}/"
+        f"{report['audited_at'].replace(' ', 'T')}Z.json"
+    )
+    get_boto3_client("s3").put_object(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        Key=s3_file,
+        Body=json.dumps(report, indent=4).encode(),
+    )
+    count("S3Requests")
+    return s3_file
+
+
+@instrumented
+def lambda_handler(event, context) -> list:
+    """Compares the items of each DynamoDB CDC table with the latest version of
+    each id in Redshift, bucketed by id, and reports the ids that differ. Scans
+    stop `MIN_REMAINING_SECONDS` before the Lambda times out, and the next
+    scheduled run continues them."""
+    deadline = math.inf
+    if context is not None:
+        deadline = time.monotonic() + (
+            context.get_remaining_time_in_millis() / 1000
+            - DYNAMODB_AUDIT["MIN_REMAINING_SECONDS"]
+        )
+    summaries = []
+    for dynamodb_table_name, cdc_table_key in sorted(  # unfinished scans first
+        DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY.items(),
+        key=lambda table_name_and_key: not has_checkpoints(table_name_and_key[1]),
+    ):
+        report = audit_cdc_table(dynamodb_table_name, cdc_table_key, deadline)
+        if report is None:  # and the next tables wait for the next run too
+            summaries.append({"cdc_table_key": cdc_table_key, "report": None})
+            break
+        s3_file = write_report(report)
+        mismatch_kinds = ["missing_in_redshift", "missing_in_dynamodb", "different"]
+        metrics = {  # eg `MissingInRedshift`
+            "".join(map(str.capitalize, kind.split("_"))): len(report[kind])
+            for kind in mismatch_kinds
+        }
+        metrics["MismatchedBuckets"] = len(report["mismatched_buckets"])
+        put_metrics(
+            metrics,
+            units={name: "Count" for name in metrics},
+            dimensions={"CDCTable": cdc_table_key},
+        )
+        for kind in mismatch_kinds:
+            if report[kind]:
+                print(
+                    f"{len(report[kind])} ids of `{cdc_table_key}` {kind.replace('_', ' ')}, "
+                    f"eg {report[kind][:MAX_PRINTED_IDS]}"
+                )
+        summaries.append(
+            {
+                "cdc_table_key": cdc_table_key,
+                "report": f"s3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/{s3_file}",
+                **{kind: len(report[kind]) for kind in mismatch_kinds},
+            }
+        )
+    print(f"Audit reports: {summaries}")
+    return summaries
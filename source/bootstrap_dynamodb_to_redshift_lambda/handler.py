@@ -0,0 +1,364 @@
+import gzip
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from cdc_runtime.clients import get_boto3_client
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import connect_to_redshift
+from cdc_runtime.freshness import (
+    APPROXIMATE_CREATION_TIME_COLUMN,
+    STAMPED_COLUMN_NAMES,
+    WRITTEN_AT_COLUMN,
+    format_timestamp,
+)
+from cdc_runtime.instrumentation import count, instrumented, time_stage
+from cdc_runtime.promotion import get_promoted_columns, promote_columns
+from cdc_runtime.serializers import (
+    SEQUENCE_NUMBER_COLUMN,
+    deserialize_dynamodb_image,
+    format_sequence_number,
+    to_json_lines,
+)
+
+AWS_REGION = get_env("AWSREGION")
+S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT = get_env(
+    "S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT"
+)
+DYNAMODB_EXPORT_FOLDER = get_env("DYNAMODB_EXPORT_FOLDER")
+INCREMENTAL_EXPORT_INTERVAL_MINUTES = get_json_env(  # null for no incremental exports
+    "INCREMENTAL_EXPORT_INTERVAL_MINUTES"
+)
+DYNAMODB_CDC_TABLE_KEY_TO_TABLE_ARN = get_json_env("DYNAMODB_CDC_TABLE_KEY_TO_TABLE_ARN")
+DYNAMODB_CDC_TABLES = get_json_env("DYNAMODB_CDC_TABLES")
+
+REDSHIFT_ROLE_ARN = get_env("REDSHIFT_ROLE_ARN")
+REDSHIFT_DATABASE_NAME = get_env("REDSHIFT_DATABASE_NAME")
+REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC = get_env("REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC")
+
+MAX_INCREMENTAL_EXPORT_SECONDS = 24 * 60 * 60  # limits of DynamoDB
+MIN_INCREMENTAL_EXPORT_SECONDS = 15 * 60  # incremental exports
+MAX_CONCURRENT_EXPORT_FILE_CONVERSIONS = 8
+EXPORT_SEQUENCE_NUMBER = format_sequence_number("0")  # before any stream record
+EXPORT_LOADS_TABLE_NAME = "dynamodb_export_loads"  # loaded export ARNs
+
+
+def get_s3_folder(cdc_table_key: str) -> str:
+    return f"{DYNAMODB_EXPORT_FOLDER}/{cdc_table_key}"
+
+
+def read_state(cdc_table_key: str) -> dict:
+    """{} before the full export, then `exported_to_time` (epoch seconds) of the
+    last loaded export, `export_arn` while an export is running, and
+    `stream_attached_time`, from when the DynamoDB stream has the changes"""
+    try:
+        response = get_boto3_client("s3").get_object(
+            Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+            Key=f"{get_s3_folder(cdc_table_key)}/state.json",
+        )
+    except Exception as exception:
+        if getattr(exception, "response", {}).get("Error", {}).get("Code") == "NoSuchKey":
+            return {}
+        raise
+    return json.loads(response["Body"].read())
+
+
+def write_state(cdc_table_key: str, state: dict) -> None:
+    get_boto3_client("s3").put_object(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        Key=f"{get_s3_folder(cdc_table_key)}/state.json",
+        Body=json.dumps(state).encode(),
+    )
+    print(f"Bootstrap state of `{cdc_table_key}`: {state}")
+
+
+def get_stream_attached_time(cdc_table_key: str) -> float:
+    """Creation time of the table's current DynamoDB stream (its label), from
+    when the stream writer has every change. Now if the table has no stream."""
+    table = get_boto3_client("dynamodb").describe_table(
+        TableName=DYNAMODB_CDC_TABLE_KEY_TO_TABLE_ARN[cdc_table_key]
+    )["Table"]
+    count("DynamoDBRequests")
+    if "LatestStreamLabel" not in table:
+        return time.time()
+    return (
+        datetime.fromisoformat(table["LatestStreamLabel"])
+        .replace(tzinfo=timezone.utc)
+        .timestamp()
+    )
+
+
+def start_export(cdc_table_key: str, state: dict) -> dict:
+    """Full export of the table as of now, or, once that is loaded, incremental
+    exports of the changes the stream missed, ie up to the time it was attached.
+    Exports stop there and hand off to the stream, which loads every later
+    change itself. A stream attached later (eg recreated) starts a new catch-up."""
+    now = time.time()
+    state = {**state, "stream_attached_time": get_stream_attached_time(cdc_table_key)}
+    if "exported_to_time" not in state:
+        export_to_time = now
+        export_settings = {
+            "ExportType": "FULL_EXPORT",
+            "ExportTime": datetime.fromtimestamp(export_to_time, timezone.utc),
+        }
+    else:
+        export_from_time = state["exported_to_time"]
+        if export_from_time >= state["stream_attached_time"]:
+            if not state.get("handed_off"):
+                print(f"Handed `{cdc_table_key}` off to its DynamoDB stream")
+            return {**state, "handed_off": True}
+        if INCREMENTAL_EXPORT_INTERVAL_MINUTES is None or now - export_from_time < max(
+            INCREMENTAL_EXPORT_INTERVAL_MINUTES * 60, MIN_INCREMENTAL_EXPORT_SECONDS
+        ):
+            return {**state, "handed_off": False}
+        export_to_time = min(
+            state["stream_attached_time"], export_from_time + MAX_INCREMENTAL_EXPORT_SECONDS
+        )
+        export_from_time = min(  # the shortest window DynamoDB exports; the overlap
+            export_from_time,  # is loaded twice, as versions of the same items
+            export_to_time - MIN_INCREMENTAL_EXPORT_SECONDS,
+        )
+        export_settings = {
+            "ExportType": "INCREMENTAL_EXPORT",
+            "IncrementalExportSpecification": {
+                "ExportFromTime": datetime.fromtimestamp(export_from_time, timezone.utc),
+                "ExportToTime": datetime.fromtimestamp(export_to_time, timezone.utc),
+                "ExportViewType": "NEW_IMAGE",
+            },
+        }
+    response = get_boto3_client("dynamodb").export_table_to_point_in_time(
+        TableArn=DYNAMODB_CDC_TABLE_KEY_TO_TABLE_ARN[cdc_table_key],
+        S3Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        S3Prefix=f"{get_s3_folder(cdc_table_key)}/exports",
+        ExportFormat="DYNAMODB_JSON",
+        ClientToken=f"{cdc_table_key}-{int(export_to_time)}",  # idempotent retries
+        **export_settings,
+    )
+    count("DynamoDBRequests")
+    print(f"Started {export_settings['ExportType']} of `{cdc_table_key}`")
+    return {
+        **state,
+        "export_arn": response["ExportDescription"]["ExportArn"],
+        "export_to_time": export_to_time,
+        "handed_off": False,
+    }
+
+
+def convert_export_data_file(
+    data_file_key: str,
+    rows_s3_file: str,
+    exported_to: str,
+    written_at: str,
+    promoted_columns: list,
+) -> int:
+    """DynamoDB JSON lines (`Item` in full exports, `NewImage` in incremental
+    ones) to the same rows as the stream writer's. The export time stands in for
+    `ApproximateCreationDateTime`, with a sequence number that sorts before any
+    stream record's, so ordering the versions of an item by both puts the export
+    after the stream records it already includes, and before later ones."""
+    s3_client = get_boto3_client("s3")
+    body = s3_client.get_object(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT, Key=data_file_key
+    )["Body"].read()
+    rows = []
+    for line in gzip.decompress(body).splitlines():
+        if not line:
+            continue
+        export_record = json.loads(line)
+        image = export_record.get("Item") or export_record.get("NewImage")
+        if image is None:  # deleted during an incremental export's window
+            continue
+        row = promote_columns(deserialize_dynamodb_image(image), promoted_columns)
+        row[APPROXIMATE_CREATION_TIME_COLUMN] = exported_to
+        row[WRITTEN_AT_COLUMN] = written_at
+        row[SEQUENCE_NUMBER_COLUMN] = EXPORT_SEQUENCE_NUMBER
+        rows.append(row)
+    if rows:
+        s3_client.put_object(
+            Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+            Key=rows_s3_file,
+            Body=to_json_lines(rows),
+        )
+    count("S3Requests", 1 + bool(rows))
+    return len(rows)
+
+
+def get_export_data_file_keys(export_manifest_key: str) -> list:
+    s3_client = get_boto3_client("s3")
+    manifest_summary = json.loads(
+        s3_client.get_object(
+            Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT, Key=export_manifest_key
+        )["Body"].read()
+    )
+    manifest_files = s3_client.get_object(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        Key=manifest_summary["manifestFilesS3Key"],
+    )["Body"].read()
+    count("S3Requests", 2)
+    return [
+        json.loads(line)["dataFileS3Key"] for line in manifest_files.splitlines() if line
+    ]
+
+
+def create_export_loads_table_sql_statement() -> str:
+    return f"""CREATE TABLE IF NOT EXISTS
+            "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}"."{EXPORT_LOADS_TABLE_NAME}" (
+                export_arn varchar(256) NOT NULL,
+                loaded_at timestamp default sysdate
+            );"""
+
+
+def export_loaded(cursor, export_arn: str) -> bool:
+    """Whether the export was loaded by a run whose state was not saved after"""
+    cursor.execute(create_export_loads_table_sql_statement())
+    cursor.execute(
+        f'SELECT 1 FROM "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}"."{EXPORT_LOADS_TABLE_NAME}" '
+        "WHERE export_arn = %s;",
+        (export_arn,),
+    )
+    count("RedshiftStatements", 2)
+    return cursor.fetchone() is not None
+
+
+def copy_rows_s3_files_to_redshift_table(
+    cursor, cdc_table: dict, rows_s3_files: list
+) -> None:
+    """1 COPY of all files through a manifest, which Redshift splits over its slices"""
+    manifest_s3_file = f"{rows_s3_files[0].rsplit('/', 1)[0]}.manifest"
+    get_boto3_client("s3").put_object(
+        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        Key=manifest_s3_file,
+        Body=json.dumps(
+            {
+                "entries": [
+                    {
+                        "url": f"s3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/{s3_file}",
+                        "mandatory": True,
+                    }
+                    for s3_file in rows_s3_files
+                ]
+            }
+        ).encode(),
+    )
+    count("S3Requests")
+    column_names = [
+        column_name_and_type.split()[0]
+        for column_name_and_type in cdc_table["REDSHIFT_COLUMNS"]
+    ] + [
+        column_name for _, column_name, _ in get_promoted_columns(cdc_table)
+    ] + STAMPED_COLUMN_NAMES + [SEQUENCE_NUMBER_COLUMN]
+    sql_statement = f"""
+        COPY {REDSHIFT_DATABASE_NAME}.{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}.{cdc_table["REDSHIFT_TABLE_NAME"]}
+        ({", ".join(f'"{column_name}"' for column_name in column_names)})
+        FROM 's3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/{manifest_s3_file}'
+        REGION '{AWS_REGION}'
+        iam_role '{REDSHIFT_ROLE_ARN}'
+        manifest
+        format as json 'auto';
+    """
+    with time_stage("Copy"):
+        cursor.execute(sql_statement)
+    count("RedshiftStatements")
+
+
+def load_export(cdc_table_key: str, cdc_table: dict, state: dict) -> dict:
+    """Converts and COPYs the export once it completed"""
+    export_description = get_boto3_client("dynamodb").describe_export(
+        ExportArn=state["export_arn"]
+    )["ExportDescription"]
+    count("DynamoDBRequests")
+    if export_description["ExportStatus"] == "IN_PROGRESS":
+        print(f"Export of `{cdc_table_key}` is in progress")
+        return state
+    if export_description["ExportStatus"] != "COMPLETED":
+        raise RuntimeError(
+            f"Export of `{cdc_table_key}` {export_description['ExportStatus']}: "
+            f"{export_description.get('FailureMessage')}"
+        )
+    new_state = {
+        key: value
+        for key, value in state.items()
+        if key not in ["export_arn", "export_to_time"]
+    }
+    new_state["exported_to_time"] = state["export_to_time"]
+    conn = connect_to_redshift()
+    with conn, conn.cursor() as cursor:
+        if export_loaded(cursor, state["export_arn"]):
+            print(f"Export {state['export_arn']} was already loaded")
+            return new_state
+        conn.commit()
+        load_export_rows(cursor, cdc_table_key, cdc_table, state, export_description)
+        cursor.execute(  # in the COPY's transaction, so the export loads exactly once
+            f'INSERT INTO "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}".'
+            f'"{EXPORT_LOADS_TABLE_NAME}" (export_arn) VALUES (%s);',
+            (state["export_arn"],),
+        )
+        conn.commit()
+        count("RedshiftStatements")
+    return new_state
+
+
+def load_export_rows(
+    cursor, cdc_table_key: str, cdc_table: dict, state: dict, export_description: dict
+) -> None:
+    """Converts the export's data files to rows files and COPYs them"""
+    export_id = state["export_arn"].rsplit("/", 1)[1]
+    with time_stage("List"):
+        data_file_keys = get_export_data_file_keys(export_description["ExportManifest"])
+    exported_to = format_timestamp(state["export_to_time"])
+    written_at = format_timestamp(time.time())
+    rows_s3_files = [
+        f"{get_s3_folder(cdc_table_key)}/rows/{export_id}/{index}.json"
+        for index in range(len(data_file_keys))
+    ]
+    with time_stage("Convert"), ThreadPoolExecutor(
+        max_workers=MAX_CONCURRENT_EXPORT_FILE_CONVERSIONS
+    ) as executor:
+        num_rows_per_file = list(
+            executor.map(
+                lambda data_file_key, rows_s3_file: convert_export_data_file(
+                    data_file_key,
+                    rows_s3_file,
+                    exported_to=exported_to,
+                    written_at=written_at,
+                    promoted_columns=get_promoted_columns(cdc_table),
+                ),
+                data_file_keys,
+                rows_s3_files,
+            )
+        )
+    count("Records", sum(num_rows_per_file))
+    rows_s3_files = [
+        rows_s3_file
+        for rows_s3_file, num_rows in zip(rows_s3_files, num_rows_per_file)
+        if num_rows
+    ]
+    if rows_s3_files:
+        copy_rows_s3_files_to_redshift_table(cursor, cdc_table, rows_s3_files)
+    print(
+        f"Loaded {sum(num_rows_per_file)} rows of `{cdc_table_key}` "
+        f"exported as of {exported_to}"
+    )
+
+
+@instrumented
+def lambda_handler(event, context) -> None:
+    """Runs on a schedule, and moves each CDC table 1 step further: start the
+    full export, load it when done, then likewise for incremental exports until
+    the stream's attach point"""
+    failed_cdc_table_keys = []
+    for cdc_table_key, cdc_table in DYNAMODB_CDC_TABLES.items():
+        try:  # 1 failing table should not stop the other tables
+            state = read_state(cdc_table_key)
+            if "export_arn" in state:
+                new_state = load_export(cdc_table_key, cdc_table, state)
+            else:
+                new_state = start_export(cdc_table_key, state)
+            if new_state != state:
+                write_state(cdc_table_key, new_state)
+        except Exception as exception:
+            print(f"Failed to bootstrap `{cdc_table_key}`: {exception!r}")
+            failed_cdc_table_keys.append(cdc_table_key)
+    if failed_cdc_table_keys:
+        raise RuntimeError(f"Failed to bootstrap CDC tables: {failed_cdc_table_keys}")
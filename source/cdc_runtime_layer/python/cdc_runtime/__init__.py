@@ -0,0 +1,3 @@
+"""Shared runtime for the CDC Lambdas, deployed as a Lambda layer (extracted to
+`/opt/python`, which is on the Lambda `sys.path`), so that fixes to config,
+connections, serialization, metrics and retries are made once for all handlers."""
@@ -0,0 +1,31 @@
+"""Lazily created AWS clients, cached per Lambda container.
+
+Nothing heavy is imported when a handler module is loaded: `boto3` is only
+imported (and each client only built) on first use, then reused by every later
+invocation of the warm container. Prefer `get_boto3_client` over
+`get_boto3_resource`, since resources load the much larger resource models."""
+import threading
+
+_boto3_clients = {}
+_boto3_resources = {}
+_lock = threading.Lock()  # boto3's default session is not thread safe
+
+
+def get_boto3_client(service_name: str):
+    if service_name not in _boto3_clients:
+        with _lock:
+            if service_name not in _boto3_clients:
+                import boto3
+
+                _boto3_clients[service_name] = boto3.client(service_name)
+    return _boto3_clients[service_name]
+
+
+def get_boto3_resource(service_name: str):
+    if service_name not in _boto3_resources:
+        with _lock:
+            if service_name not in _boto3_resources:
+                import boto3
+
+                _boto3_resources[service_name] = boto3.resource(service_name)
+    return _boto3_resources[service_name]
@@ -0,0 +1,17 @@
+"""Environment variables set by CDK, parsed the same way by every handler"""
+import json
+import os
+
+
+def get_env(key: str) -> str:
+    return os.environ[key]
+
+
+def get_json_env(key: str):
+    """CDK passes non-string values (bools, ints, lists, dicts) as JSON strings"""
+    return json.loads(os.environ[key])
+
+
+def get_redshift_host() -> str:
+    # aws_redshift.CfnCluster(...).attr_id (for cluster name) is broken, so using endpoint address instead
+    return os.environ["REDSHIFT_ENDPOINT_ADDRESS"].split(":")[0]
@@ -0,0 +1,136 @@
+"""Connections to RDS (MySQL variant) and Redshift.
+
+`pymysql` and `redshift_connector` are only imported on first connect. A
+`ConnectionPool` keeps connections of a warm Lambda container open for later
+invocations, instead of paying for a new handshake on every invocation. With
+`RDS_PROXY` enabled in `cdk.json`, `RDS_HOST` is the proxy's endpoint, which
+multiplexes the connections of all the containers onto fewer to the instance."""
+import threading
+import time
+from contextlib import contextmanager
+
+from cdc_runtime import config
+from cdc_runtime.instrumentation import count, time_stage
+from cdc_runtime.retry import retry
+
+
+@retry(attempts=3)
+def connect_to_rds(**kwargs):
+    """Currently only works with MySQL variant of RDS"""
+    import pymysql
+
+    connection_settings = {
+        "host": config.get_env("RDS_HOST"),
+        "user": config.get_env("RDS_USER"),
+        "passwd": config.get_env("RDS_PASSWORD"),
+        "db": config.get_env("RDS_DATABASE_NAME"),
+        "connect_timeout": 5,
+    }
+    connection_settings.update(kwargs)
+    with time_stage("Connect"):
+        return pymysql.connect(**connection_settings)
+
+
+def ping_rds(conn) -> None:
+    """Health check of a pooled RDS connection (1 round trip), which raises if
+    the server (or the proxy, after its idle client timeout) dropped it"""
+    conn.ping(reconnect=False)
+
+
+@retry(attempts=3)
+def connect_to_redshift(**kwargs):
+    import redshift_connector
+
+    connection_settings = {
+        "host": config.get_redshift_host(),
+        "database": config.get_env("REDSHIFT_DATABASE_NAME"),
+        "user": config.get_env("REDSHIFT_USER"),
+        "password": config.get_env("REDSHIFT_PASSWORD"),
+    }
+    connection_settings.update(kwargs)
+    with time_stage("Connect"):
+        return redshift_connector.connect(**connection_settings)
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """Per container pool of at most `max_idle` idle connections. Connections
+    idle for longer than `max_idle_seconds` are closed instead of reused, as the
+    server may have dropped them in the meantime, and so are connections that
+    fail `health_check` (if any, eg `ping_rds`) before being reused. Thread
+    safe."""
+
+    def __init__(
+        self,
+        connect,
+        max_idle: int = 1,
+        max_idle_seconds: float = 300,
+        health_check=None,
+    ):
+        self._connect = connect
+        self.max_idle = max_idle
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check = health_check
+        self._idle_connections = []  # (connection, time released) pairs
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Do not use the connection itself as a context manager, since both
+        `pymysql` and `redshift_connector` close the connection on exit"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            _close_quietly(conn)  # may be left in a broken state
+            raise
+        else:
+            self._release(conn)
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle_connections:
+                    break
+                conn, released_at = self._idle_connections.pop()
+            is_fresh = time.monotonic() - released_at <= self.max_idle_seconds
+            if is_fresh and self._is_healthy(conn):
+                count("ReusedConnections")
+                return conn
+            _close_quietly(conn)
+        return self._connect()
+
+    def _is_healthy(self, conn) -> bool:
+        if self.health_check is None:
+            return True
+        try:
+            with time_stage("HealthCheck"):
+                self.health_check(conn)
+        except Exception:
+            count("UnhealthyConnections")
+            return False
+        return True
+
+    def _release(self, conn) -> None:
+        try:  # do not keep a transaction (and its snapshot) open between invocations
+            conn.rollback()
+        except Exception:
+            _close_quietly(conn)
+            return
+        with self._lock:
+            if len(self._idle_connections) < self.max_idle:
+                self._idle_connections.append((conn, time.monotonic()))
+                return
+        _close_quietly(conn)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle_connections, self._idle_connections = self._idle_connections, []
+        for conn, _ in idle_connections:
+            _close_quietly(conn)
@@ -0,0 +1,45 @@
+"""Freshness of the DynamoDB CDC tables in Redshift, ie how long after a DynamoDB
+write its row is visible in Redshift.
+
+The stream writer stamps each record with its stream `ApproximateCreationDateTime`
+and the S3 write time, and Redshift stamps the load time as the column default
+(COPY leaves it out of its column list). Lag percentiles are then 1 query away."""
+from datetime import datetime, timezone
+from functools import lru_cache
+
+APPROXIMATE_CREATION_TIME_COLUMN = "cdc_approximate_creation_time"
+WRITTEN_AT_COLUMN = "cdc_written_at"
+LOADED_AT_COLUMN = "cdc_loaded_at"
+FRESHNESS_COLUMNS = [  # appended to the `REDSHIFT_COLUMNS` of every CDC table
+    f"{APPROXIMATE_CREATION_TIME_COLUMN} timestamp",
+    f"{WRITTEN_AT_COLUMN} timestamp",
+    f"{LOADED_AT_COLUMN} timestamp default sysdate",  # start of the COPY's transaction
+]
+STAMPED_COLUMN_NAMES = [APPROXIMATE_CREATION_TIME_COLUMN, WRITTEN_AT_COLUMN]
+PERCENTILES = [50, 95, 99]
+
+
+@lru_cache(maxsize=1024)  # records of 1 batch mostly share their second
+def format_timestamp(epoch_seconds: float) -> str:
+    """In Redshift's default `timeformat` (UTC)"""
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def create_freshness_sql_statement(redshift_table: str, loaded_since: datetime) -> str:
+    """Number of rows loaded since `loaded_since` (UTC) and the percentiles of
+    their lag from DynamoDB write to Redshift load, in milliseconds"""
+    percentiles = ",\n            ".join(
+        f"PERCENTILE_CONT({percentile / 100}) WITHIN GROUP (ORDER BY lag_ms)"
+        for percentile in PERCENTILES
+    )
+    return f"""
+        SELECT
+            COUNT(*),
+            {percentiles}
+        FROM (
+            SELECT DATEDIFF(ms, {APPROXIMATE_CREATION_TIME_COLUMN}, {LOADED_AT_COLUMN}) AS lag_ms
+            FROM {redshift_table}
+            WHERE {LOADED_AT_COLUMN} >= '{loaded_since.strftime("%Y-%m-%d %H:%M:%S.%f")}'
+            AND {APPROXIMATE_CREATION_TIME_COLUMN} IS NOT NULL
+        ) AS loaded;
+    """
@@ -0,0 +1,92 @@
+"""Per invocation timings of each stage and counters, logged as 1 EMF line.
+
+    @instrumented
+    def lambda_handler(event, context):
+        with time_stage("Upload"):
+            ...
+        count("Records", len(records))
+
+Stages are timed in milliseconds as `<stage>Time` (summed over threads and
+repeats, with `<stage>Calls` counting the repeats), next to `InvocationTime` and
+the counters, with the Lambda function name as the only dimension. Stages and
+counters outside of an instrumented invocation (eg on import) are ignored."""
+import functools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from cdc_runtime.metrics import put_metrics
+
+
+class InvocationMetrics:
+    def __init__(self):
+        self.metrics = defaultdict(float)
+        self.units = {}
+        self._lock = threading.Lock()  # stages may run in threads
+
+    def add(self, name: str, value: float, unit: str) -> None:
+        with self._lock:
+            self.metrics[name] += value
+            self.units[name] = unit
+
+
+_current_invocation = None
+
+
+@contextmanager
+def time_stage(stage_name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        invocation = _current_invocation
+        if invocation is not None:
+            invocation.add(
+                f"{stage_name}Time", (time.perf_counter() - start) * 1000, "Milliseconds"
+            )
+            invocation.add(f"{stage_name}Calls", 1, "Count")
+
+
+def count(name: str, value: float = 1, unit: str = "Count") -> None:
+    invocation = _current_invocation
+    if invocation is not None:
+        invocation.add(name, value, unit)
+
+
+def instrumented(lambda_handler):
+    """Emits the metrics of each invocation when it ends, even if it failed"""
+
+    @functools.wraps(lambda_handler)
+    def wrapper(event, context):
+        global _current_invocation
+        invocation = _current_invocation = InvocationMetrics()
+        start = time.perf_counter()
+        error = None
+        try:
+            return lambda_handler(event, context)
+        except Exception as exception:
+            error = repr(exception)
+            raise
+        finally:
+            _current_invocation = None
+            invocation.add(
+                "InvocationTime", (time.perf_counter() - start) * 1000, "Milliseconds"
+            )
+            invocation.add("Errors", error is not None, "Count")
+            put_metrics(
+                dict(invocation.metrics),
+                units=invocation.units,
+                dimensions={
+                    "FunctionName": os.environ.get(
+                        "AWS_LAMBDA_FUNCTION_NAME", lambda_handler.__module__
+                    )
+                },
+                properties={
+                    "RequestId": getattr(context, "aws_request_id", None),
+                    "Error": error,
+                },
+            )
+
+    return wrapper
@@ -0,0 +1,182 @@
+"""DynamoDB changes through Kinesis Data Streams into a Redshift streaming
+ingestion materialized view, as an alternative to the stream -> S3 -> COPY path.
+
+DynamoDB puts each change on the table's Kinesis stream as a JSON payload like a
+DynamoDB stream record (`eventName`, `dynamodb.NewImage` in DynamoDB JSON, and
+`dynamodb.ApproximateCreationDateTime` in milliseconds). The materialized view
+extracts the `REDSHIFT_COLUMNS` and `PROMOTED_COLUMNS` of the CDC table from it,
+plus the same freshness and sequence number columns as the S3 path's tables, so
+that queries of scalar and promoted columns (eg of the latest version of an item)
+work on either. SUPER columns differ: the S3 path loads plain JSON, whereas the
+view keeps the DynamoDB JSON of the attribute, eg `details.bids[0]` of the S3
+path is `details."M".bids."L"[0]."N"` here (as text). SQL has no recursive
+function to untype it, so queries that navigate SUPER columns are written for 1
+mode, or read `PROMOTED_COLUMNS` instead, which are typed alike in both.
+
+`parse_kinesis_record` parses a payload in Python the same way the view's SQL
+does, so that the parsing can be checked locally against recorded records (see
+`benchmarks/parse_kinesis_records.py`)."""
+import base64
+import json
+from datetime import datetime, timezone
+
+from cdc_runtime.freshness import (
+    APPROXIMATE_CREATION_TIME_COLUMN,
+    LOADED_AT_COLUMN,
+    WRITTEN_AT_COLUMN,
+    format_timestamp,
+)
+from cdc_runtime.promotion import (
+    BOOLEAN_TYPES,
+    INTEGER_TYPES,
+    NUMERIC_TYPES,
+    TIMESTAMP_TYPES,
+    convert_value,
+)
+from cdc_runtime.serializers import (
+    SEQUENCE_NUMBER_COLUMN,
+    SEQUENCE_NUMBER_LENGTH,
+    format_sequence_number,
+)
+
+LOADED_EVENT_NAMES = ["INSERT", "MODIFY"]  # like the stream writer, drops `REMOVE`
+
+
+def get_dynamodb_type(column_type: str):
+    """DynamoDB type of the attributes extracted into a column of `column_type`,
+    or None for SUPER (and other) columns, which keep the attribute's DynamoDB
+    JSON, eg {"M": {"bids": {"L": [{"N": "109.9"}]}}}, as SQL cannot untype it"""
+    if INTEGER_TYPES.match(column_type) or NUMERIC_TYPES.match(column_type):
+        return "N"
+    if BOOLEAN_TYPES.match(column_type):
+        return "BOOL"
+    if column_type.lower() == "super":
+        return None
+    return "S"  # strings, and ISO 8601 timestamps
+
+
+def get_column_extractions(redshift_columns: list) -> list:
+    """[(column name, Redshift type, DynamoDB type)] of the CDC table's columns"""
+    column_extractions = []
+    for column_name_and_type in redshift_columns:
+        column_name, column_type = column_name_and_type.split()[:2]
+        column_extractions.append((column_name, column_type, get_dynamodb_type(column_type)))
+    return column_extractions
+
+
+def create_streaming_materialized_view_sql_statements(
+    redshift_table: str,
+    external_schema_name: str,
+    kinesis_stream_name: str,
+    redshift_columns: list,
+    redshift_role_arn: str,
+    promoted_columns: list = (),
+) -> list:
+    """External schema of Kinesis and the auto refreshed (and incrementally
+    refreshed, like every streaming ingestion view) materialized view, named
+    like the CDC table of the S3 path. `promoted_columns` are those of
+    `cdc_runtime.promotion.get_promoted_columns`."""
+    payload = "FROM_VARBYTE(kinesis_data, 'utf-8')"
+    column_expressions = []
+    for column_name, column_type, dynamodb_type in get_column_extractions(redshift_columns):
+        path = f"{payload}, 'dynamodb', 'NewImage', '{column_name}'"
+        if dynamodb_type is None:
+            expression = f"JSON_PARSE(NULLIF(JSON_EXTRACT_PATH_TEXT({path}), ''))"
+        else:
+            expression = (
+                f"CAST(NULLIF(JSON_EXTRACT_PATH_TEXT({path}, '{dynamodb_type}'), '') "
+                f"AS {column_type})"
+            )
+        column_expressions.append(f'{expression} AS "{column_name}"')
+    for path, column_name, column_type in promoted_columns:  # maps down to the scalar
+        typed_path = "', 'M', '".join(path)
+        text = (
+            f"NULLIF(JSON_EXTRACT_PATH_TEXT({payload}, 'dynamodb', 'NewImage', "
+            f"'{typed_path}', '{get_dynamodb_type(column_type)}'), '')"
+        )
+        if TIMESTAMP_TYPES.match(column_type):  # in UTC, like the staged rows
+            expression = f"CAST(CAST({text} AS TIMESTAMPTZ) AS {column_type})"
+        else:
+            expression = f"CAST({text} AS {column_type})"
+        column_expressions.append(f'{expression} AS "{column_name}"')
+    column_expressions += [
+        "DATEADD(ms, CAST(JSON_EXTRACT_PATH_TEXT("
+        f"{payload}, 'dynamodb', 'ApproximateCreationDateTime') AS BIGINT), "
+        f"TIMESTAMP '1970-01-01') AS {APPROXIMATE_CREATION_TIME_COLUMN}",
+        f"approximate_arrival_timestamp AS {WRITTEN_AT_COLUMN}",  # put on Kinesis
+        f"refresh_time AS {LOADED_AT_COLUMN}",
+        f"LPAD(sequence_number, {SEQUENCE_NUMBER_LENGTH}, '0') "  # of Kinesis, per shard
+        f"AS {SEQUENCE_NUMBER_COLUMN}",
+    ]
+    column_expressions = ",\n            ".join(column_expressions)
+    event_names = ", ".join(f"'{event_name}'" for event_name in LOADED_EVENT_NAMES)
+    return [
+        f"""CREATE EXTERNAL SCHEMA IF NOT EXISTS "{external_schema_name}"
+        FROM KINESIS
+        IAM_ROLE '{redshift_role_arn}';""",
+        f"""CREATE MATERIALIZED VIEW {redshift_table}
+        AUTO REFRESH YES
+        AS SELECT
+            {column_expressions}
+        FROM "{external_schema_name}"."{kinesis_stream_name}"
+        WHERE CAN_JSON_PARSE(kinesis_data)
+        AND JSON_EXTRACT_PATH_TEXT({payload}, 'eventName') IN ({event_names});""",
+    ]
+
+
+def _cast(value: str, column_type: str):
+    if INTEGER_TYPES.match(column_type):
+        return int(value)
+    if NUMERIC_TYPES.match(column_type):
+        return float(value)
+    return value
+
+
+def _extract_promoted_value(new_image: dict, path: list, column_type: str):
+    typed_value = {"M": new_image}
+    for key in path:
+        typed_value = typed_value.get("M", {}).get(key) or {}
+    value = typed_value.get(get_dynamodb_type(column_type))
+    return None if value == "" else convert_value(value, column_type)
+
+
+def parse_kinesis_record(
+    kinesis_record: dict, redshift_columns: list, promoted_columns: list = ()
+):
+    """Row of the materialized view for 1 Kinesis record (as in Lambda events or
+    `GetRecords`, with base64 `data`), or None if the view skips it"""
+    kinesis = kinesis_record.get("kinesis", kinesis_record)
+    try:
+        payload = json.loads(base64.b64decode(kinesis["data"]))
+    except ValueError:  # not `CAN_JSON_PARSE`
+        return None
+    if payload.get("eventName") not in LOADED_EVENT_NAMES:
+        return None
+    new_image = payload["dynamodb"].get("NewImage", {})
+    row = {}
+    for column_name, column_type, dynamodb_type in get_column_extractions(redshift_columns):
+        typed_value = new_image.get(column_name)
+        if typed_value is None:
+            row[column_name] = None
+        elif dynamodb_type is None:
+            row[column_name] = typed_value
+        elif dynamodb_type == "BOOL":
+            row[column_name] = typed_value.get("BOOL")
+        elif typed_value.get(dynamodb_type) in (None, ""):
+            row[column_name] = None
+        else:
+            row[column_name] = _cast(typed_value[dynamodb_type], column_type)
+    for path, column_name, column_type in promoted_columns:
+        row[column_name] = _extract_promoted_value(new_image, path, column_type)
+    row[APPROXIMATE_CREATION_TIME_COLUMN] = format_timestamp(
+        int(payload["dynamodb"]["ApproximateCreationDateTime"]) / 1000
+    )
+    arrival = kinesis.get("approximateArrivalTimestamp", kinesis.get("ApproximateArrivalTimestamp"))
+    if isinstance(arrival, datetime):  # `GetRecords` via boto3
+        arrival = arrival.astimezone(timezone.utc).timestamp()
+    row[WRITTEN_AT_COLUMN] = format_timestamp(arrival)
+    row[SEQUENCE_NUMBER_COLUMN] = format_sequence_number(
+        kinesis.get("sequenceNumber", kinesis.get("SequenceNumber"))
+    )
+    return row
+
@@ -0,0 +1,42 @@
+"""CloudWatch embedded metric format (EMF): metrics are written as 1 structured
+log line, which CloudWatch Logs turns into metrics without any extra API call"""
+import json
+import time
+
+NAMESPACE = "CDC"
+
+
+def put_metrics(
+    metrics: dict,
+    units: dict = None,
+    dimensions: dict = None,
+    properties: dict = None,
+    namespace: str = NAMESPACE,
+) -> None:
+    """`units` maps metric names to CloudWatch units (defaults to "None"), while
+    `properties` are logged alongside without becoming metrics"""
+    units = units or {}
+    dimensions = dimensions or {}
+    print(
+        json.dumps(
+            {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": namespace,
+                            "Dimensions": [list(dimensions)],
+                            "Metrics": [
+                                {"Name": name, "Unit": units.get(name, "None")}
+                                for name in metrics
+                            ],
+                        }
+                    ],
+                },
+                **(properties or {}),
+                **dimensions,
+                **metrics,
+            },
+            default=str,
+        )
+    )
@@ -0,0 +1,104 @@
+"""Normalization of the CSV columns loaded into RDS: headers trimmed into column
+names (" WITHDRAWAL AMT " -> `withdrawal_amt`) and values parsed into the typed
+columns of `RDS_CSV_NORMALIZATION` in `cdk.json`, so that DMS replicates them to
+Redshift already typed and queries there do not trim and cast strings per row.
+
+`COLUMN_TYPES` maps column names to MySQL types: DECIMAL (amounts like
+"  1,000,000.00 "), DATE (`DATE_FORMAT`, eg "29-Jun-17") and BOOLEAN ("TRUE" or
+"FALSE"). Other columns stay `varchar(40)` strings. Blank values are NULL.
+
+Tables created before (with untrimmed names like `_withdrawal_amt_` and only
+`varchar(40)` columns) are migrated with `get_legacy_column_names` and
+`create_conversion_sql_expression`."""
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+DEFAULT_COLUMN_TYPE = "varchar(40)"
+DECIMAL_TYPES = re.compile(r"^(decimal|numeric)\b", re.I)
+DATE_TYPES = re.compile(r"^date$", re.I)
+BOOLEAN_TYPES = re.compile(r"^(boolean|bool)$", re.I)
+BOOLEAN_VALUES = {"true": True, "false": False, "1": True, "0": False}
+
+
+def get_column_names(header: list) -> list:
+    return [column_name.strip().replace(" ", "_").lower() for column_name in header]
+
+
+def get_legacy_column_names(header: list) -> list:
+    """Column names of the tables created before the headers were trimmed"""
+    return [column_name.replace(" ", "_").lower() for column_name in header]
+
+
+def create_conversion_sql_expression(column_name: str, column_type: str, date_format: str):
+    """MySQL expression of a `varchar` column's strings as text that `MODIFY`
+    casts to `column_type`, like `convert_value` parses them (`DATE_FORMAT`'s
+    `%d`, `%b`, `%y`, etc are also `STR_TO_DATE` specifiers), or None if the
+    column stays a string"""
+    text = f"NULLIF(TRIM(`{column_name}`), '')"
+    if DECIMAL_TYPES.match(column_type):
+        return f"REPLACE({text}, ',', '')"
+    if DATE_TYPES.match(column_type):
+        return f"STR_TO_DATE({text}, '{date_format}')"
+    if BOOLEAN_TYPES.match(column_type):
+        return (
+            f"CASE LOWER({text}) WHEN 'true' THEN 1 WHEN '1' THEN 1 "
+            "WHEN 'false' THEN 0 WHEN '0' THEN 0 END"
+        )
+    return None
+
+
+def get_column_definitions(column_names: list, column_types: dict) -> list:
+    return [
+        f"{column_name} {column_types.get(column_name, DEFAULT_COLUMN_TYPE)}"
+        for column_name in column_names
+    ]
+
+
+def convert_value(text: str, column_type: str, date_format: str):
+    """Raises ValueError if the value does not fit its column's type, as RDS
+    keeps no other copy of it"""
+    text = text.strip()
+    if not text:
+        return None
+    if DECIMAL_TYPES.match(column_type):
+        try:
+            return Decimal(text.replace(",", ""))  # exact, unlike floats
+        except InvalidOperation:
+            raise ValueError(f"{text!r} is not a {column_type}") from None
+    if DATE_TYPES.match(column_type):
+        return datetime.strptime(text, date_format).date()
+    if BOOLEAN_TYPES.match(column_type):
+        try:
+            return BOOLEAN_VALUES[text.lower()]
+        except KeyError:
+            raise ValueError(f"{text!r} is not a {column_type}") from None
+    return text
+
+
+def normalize_row(row: list, column_names: list, normalization: dict) -> tuple:
+    values = []
+    for value, column_name in zip(row, column_names):
+        column_type = normalization["COLUMN_TYPES"].get(column_name)
+        if column_type is not None:  # else strings are loaded as they are
+            try:
+                value = convert_value(value, column_type, normalization["DATE_FORMAT"])
+            except ValueError as e:
+                raise ValueError(f"`{column_name}`: {e}") from e
+        values.append(value)
+    return tuple(values)
+
+
+def normalize_rows(csv_reader, column_names: list, normalization: dict):
+    """Yields lists of up to `BATCH_SIZE` rows of typed values"""
+    batch = []
+    for row in csv_reader:
+        try:
+            batch.append(normalize_row(row, column_names, normalization))
+        except ValueError as e:
+            raise ValueError(f"line {csv_reader.line_num} of the CSV, {e}") from e
+        if len(batch) == normalization["BATCH_SIZE"]:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
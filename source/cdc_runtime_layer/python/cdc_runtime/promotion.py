@@ -0,0 +1,80 @@
+"""Promoted columns: scalars nested in SUPER columns (eg `time.date`) also loaded
+into typed columns of their own, which Redshift filters, sorts and compresses
+without navigating semi-structured data on every row. The SUPER columns keep the
+whole value.
+
+A CDC table's `PROMOTED_COLUMNS` in `cdk.json` maps each JSON path to the
+definition of its column, eg {"time.date": "time_date timestamp"}. The
+configuration Lambda adds these columns next to the `REDSHIFT_COLUMNS`, and the
+stream writer and the export bootstrap extract them while staging the rows, so
+that COPY loads them by name like any other column."""
+import json
+import re
+from datetime import datetime, timezone
+
+from cdc_runtime.freshness import format_timestamp
+
+INTEGER_TYPES = re.compile(r"^(smallint|integer|int|int2|int4|int8|bigint)\b", re.I)
+NUMERIC_TYPES = re.compile(r"^(decimal|numeric|real|float|float4|float8|double)\b", re.I)
+BOOLEAN_TYPES = re.compile(r"^(boolean|bool)\b", re.I)
+TIMESTAMP_TYPES = re.compile(r"^(timestamp|timestamptz)\b", re.I)
+
+
+def get_promoted_columns(cdc_table: dict) -> list:
+    """[(JSON path as a list of keys, column name, Redshift type)]"""
+    return [
+        (path.split("."), *column_name_and_type.split()[:2])
+        for path, column_name_and_type in cdc_table.get("PROMOTED_COLUMNS", {}).items()
+    ]
+
+
+def get_promoted_column_definitions(cdc_table: dict) -> list:
+    return list(cdc_table.get("PROMOTED_COLUMNS", {}).values())
+
+
+def parse_timestamp(text: str):
+    """Epoch seconds of an ISO 8601 timestamp (UTC unless it has an offset, eg
+    "2012-03-02T22:00:00.000Z"), or None if it is not one"""
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def convert_value(value, column_type: str):
+    """Value of a promoted column, or None if the JSON value does not fit its type,
+    so that 1 odd item does not fail the COPY of its whole file (its SUPER column
+    still has the value)"""
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    if BOOLEAN_TYPES.match(column_type):
+        return value if isinstance(value, bool) else None
+    if TIMESTAMP_TYPES.match(column_type):
+        epoch_seconds = parse_timestamp(value)
+        return None if epoch_seconds is None else format_timestamp(epoch_seconds)
+    if INTEGER_TYPES.match(column_type) or NUMERIC_TYPES.match(column_type):
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, int):  # exact, even beyond float precision
+            return value if INTEGER_TYPES.match(column_type) else float(value)
+        try:
+            number = float(value)  # numbers, or numeric strings like DynamoDB's
+        except ValueError:
+            return None
+        if INTEGER_TYPES.match(column_type):
+            return int(number) if number.is_integer() else None
+        return number
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def promote_columns(row: dict, promoted_columns: list) -> dict:
+    """Adds the promoted columns to a row of deserialized item attributes"""
+    for path, column_name, column_type in promoted_columns:
+        value = row
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        row[column_name] = convert_value(value, column_type)
+    return row
@@ -0,0 +1,34 @@
+"""Retries with capped exponential backoff and full jitter, for calls that are
+not already retried by botocore (eg database connections)"""
+import functools
+import random
+import time
+
+
+def retry(
+    attempts: int = 3,
+    base_delay_seconds: float = 0.1,
+    max_delay_seconds: float = 5.0,
+    retryable_exceptions: tuple = (Exception,),
+):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except retryable_exceptions as exception:
+                    if attempt == attempts:
+                        raise
+                    delay_seconds = random.uniform(
+                        0, min(max_delay_seconds, base_delay_seconds * 2**attempt)
+                    )
+                    print(
+                        f"Attempt {attempt}/{attempts} of `{func.__name__}` failed "
+                        f"with {exception!r}, so retrying in {delay_seconds:.2f}s"
+                    )
+                    time.sleep(delay_seconds)
+
+        return wrapper
+
+    return decorator
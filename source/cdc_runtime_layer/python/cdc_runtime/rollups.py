@@ -0,0 +1,114 @@
+"""Rollups: Redshift materialized views that aggregate a CDC table (eg volume per
+ticker), so that dashboards read a few precomputed rows instead of scanning the
+CDC table on every refresh.
+
+`REDSHIFT_ROLLUPS` in `cdk.json` defines them in its `SCHEMA_NAME`, each over
+either a `DYNAMODB_CDC_TABLE` (a `DYNAMODB_CDC_TABLES` registry key) or an
+`RDS_TABLE` replicated by DMS (`table`, or `schema.table` like the DMS table
+patterns), as `GROUP_BY` columns and `AGGREGATES`. Only SUM and COUNT
+aggregates (of any expression) keep the refresh incremental, ie proportional to
+the rows loaded since the last refresh, so ratios of them (eg VWAP) go into
+`DERIVED` columns of a plain view `<rollup>_view` over the materialized view.
+
+The loader refreshes the rollups of a DynamoDB CDC table after each load, and
+the DMS monitor those of the RDS tables on each run. Rollups of the Kinesis
+streaming views refresh themselves (`AUTO REFRESH YES`), as there is no loader."""
+from cdc_runtime.instrumentation import count, time_stage
+
+
+def get_rollups(redshift_rollups: dict, source_key: str, source: str = None) -> dict:
+    """Rollups over a `DYNAMODB_CDC_TABLE` or `RDS_TABLE` (`source_key`), or only
+    over the table `source` of it"""
+    return {
+        rollup_name: rollup
+        for rollup_name, rollup in redshift_rollups["ROLLUPS"].items()
+        if source_key in rollup and (source is None or rollup[source_key] == source)
+    }
+
+
+def create_rollup_sql_statements(
+    schema_name: str, rollup_name: str, rollup: dict, source_table: tuple, auto_refresh: bool
+) -> list:
+    """The materialized view (and the view of its `DERIVED` columns) over the
+    (schema, table) `source_table`"""
+    group_by = ", ".join(f'"{column_name}"' for column_name in rollup["GROUP_BY"])
+    select_list = ",\n            ".join([group_by] + rollup["AGGREGATES"])
+    sql_statements = [
+        f"""CREATE MATERIALIZED VIEW "{schema_name}"."{rollup_name}"
+        AUTO REFRESH {"YES" if auto_refresh else "NO"}
+        AS SELECT
+            {select_list}
+        FROM "{source_table[0]}"."{source_table[1]}"
+        GROUP BY {group_by};"""
+    ]
+    if rollup.get("DERIVED"):
+        derived = ",\n            ".join(rollup["DERIVED"])
+        sql_statements.append(
+            f"""CREATE OR REPLACE VIEW "{schema_name}"."{rollup_name}_view" AS SELECT
+            *,
+            {derived}
+        FROM "{schema_name}"."{rollup_name}";"""
+        )
+    return sql_statements
+
+
+def materialized_view_exists(cursor, schema_name: str, name: str) -> bool:
+    """Materialized views have no `CREATE ... IF NOT EXISTS`"""
+    cursor.execute(
+        "SELECT 1 FROM stv_mv_info WHERE schema = %s AND name = %s;", (schema_name, name)
+    )
+    count("RedshiftStatements")
+    return cursor.fetchone() is not None
+
+
+def table_exists(cursor, schema_name: str, table_name: str) -> bool:
+    cursor.execute(
+        "SELECT table_schema, table_name FROM information_schema.tables "
+        "WHERE table_schema LIKE %s AND table_name LIKE %s;",
+        (schema_name, table_name),
+    )
+    count("RedshiftStatements")
+    return (schema_name, table_name) in {tuple(row) for row in cursor.fetchall()}
+
+
+def create_missing_rollups(
+    conn, schema_name: str, rollups: dict, source_tables: dict, auto_refresh: bool = False
+) -> list:
+    """Returns the names of the rollups that exist (now). `source_tables` maps
+    each rollup name to its (schema, table) source table, and rollups whose
+    source table does not exist yet (eg before DMS created it) are skipped."""
+    existing_rollup_names = []
+    with conn.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}";')
+        conn.commit()
+        count("RedshiftStatements")
+        for rollup_name, rollup in rollups.items():
+            if not materialized_view_exists(cursor, schema_name, rollup_name):
+                if not table_exists(cursor, *source_tables[rollup_name]):
+                    print(f"Skipped rollup `{rollup_name}` until its source table exists")
+                    continue
+                for sql_statement in create_rollup_sql_statements(
+                    schema_name,
+                    rollup_name,
+                    rollup,
+                    source_table=source_tables[rollup_name],
+                    auto_refresh=auto_refresh,
+                ):
+                    cursor.execute(sql_statement)
+                    count("RedshiftStatements")
+                conn.commit()
+                print(f'Created rollup "{schema_name}"."{rollup_name}"')
+            existing_rollup_names.append(rollup_name)
+    return existing_rollup_names
+
+
+def refresh_rollups(conn, schema_name: str, rollups: dict, source_tables: dict) -> None:
+    """Creates the rollups that do not exist yet, then refreshes them"""
+    rollup_names = create_missing_rollups(conn, schema_name, rollups, source_tables)
+    with conn.cursor() as cursor:
+        for rollup_name in rollup_names:
+            with time_stage("Refresh"):
+                cursor.execute(f'REFRESH MATERIALIZED VIEW "{schema_name}"."{rollup_name}";')
+                conn.commit()
+            count("RedshiftStatements")
+            count("RollupRefreshes")
@@ -0,0 +1,8 @@
+"""Sample data loaded into RDS and DynamoDB by the scheduled loaders"""
+from pathlib import Path
+
+SEED_DATA_DIR = Path(__file__).resolve().parent
+
+
+def get_seed_data_path(filename: str) -> Path:
+    return SEED_DATA_DIR / filename
@@ -0,0 +1,89 @@
+"""Conversion of DynamoDB stream images into the JSON lines that Redshift COPYs,
+and of items into DynamoDB JSON for the low level client"""
+import json
+from decimal import Decimal
+
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+_json_encoder = DecimalEncoder(separators=(",", ":"))  # compact, and built once
+
+SEQUENCE_NUMBER_COLUMN = "cdc_sequence_number"
+# DynamoDB stream sequence numbers have 21 to 40 digits and Kinesis ones 56, so
+# both are padded to the width of Redshift's streaming ingestion `sequence_number`
+SEQUENCE_NUMBER_LENGTH = 128
+SEQUENCE_NUMBER_COLUMN_DEFINITION = (
+    f"{SEQUENCE_NUMBER_COLUMN} varchar({SEQUENCE_NUMBER_LENGTH})"
+)
+
+
+def format_sequence_number(sequence_number: str) -> str:
+    """Zero padded, so that sequence numbers sort as strings (eg in Redshift or
+    S3 keys), to order the versions of an item"""
+    return sequence_number.zfill(SEQUENCE_NUMBER_LENGTH)
+
+
+def to_json_lines(records: list) -> bytes:
+    """1 JSON object per line, as expected by Redshift's `format as json 'auto'`"""
+    return "\n".join(map(_json_encoder.encode, records)).encode()
+
+
+def _deserialize_number(value: str):
+    if "." in value or "e" in value or "E" in value:
+        return float(value)
+    return int(value)
+
+
+def _deserialize_value(typed_value: dict):
+    ((dynamodb_type, value),) = typed_value.items()
+    if dynamodb_type == "S":
+        return value
+    if dynamodb_type == "N":
+        return _deserialize_number(value)
+    if dynamodb_type == "M":
+        return {key: _deserialize_value(item) for key, item in value.items()}
+    if dynamodb_type == "L":
+        return [_deserialize_value(item) for item in value]
+    if dynamodb_type in ("BOOL", "B"):  # binary stays as the stream's base64 string
+        return value
+    if dynamodb_type == "NULL":
+        return None
+    if dynamodb_type in ("SS", "BS"):
+        return list(value)
+    if dynamodb_type == "NS":
+        return [_deserialize_number(item) for item in value]
+    raise ValueError(f'Did not expect DynamoDB type "{dynamodb_type}"')
+
+
+def deserialize_dynamodb_image(dynamodb_image: dict) -> dict:
+    """Same as `boto3.dynamodb.types.TypeDeserializer`, except that numbers become
+    int/float (instead of Decimal, which is slower and needs `DecimalEncoder`)
+    and sets become lists, so that the result is JSON serializable as is"""
+    return {key: _deserialize_value(value) for key, value in dynamodb_image.items()}
+
+
+def _serialize_value(value) -> dict:
+    if isinstance(value, bool):  # before numbers, as bools are ints
+        return {"BOOL": value}
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": str(value)}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, dict):
+        return {"M": {key: _serialize_value(item) for key, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"L": [_serialize_value(item) for item in value]}
+    raise TypeError(f"Cannot serialize {value!r} to DynamoDB")
+
+
+def serialize_dynamodb_item(item: dict) -> dict:
+    """Inverse of `deserialize_dynamodb_image` (lists stay lists rather than
+    sets), like `boto3.dynamodb.types.TypeSerializer` without importing boto3"""
+    return {key: _serialize_value(value) for key, value in item.items()}
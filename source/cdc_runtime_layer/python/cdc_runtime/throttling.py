@@ -0,0 +1,80 @@
+"""Client side rate limiting, to keep bulk reads/writes of provisioned capacity
+(eg DynamoDB read/write capacity units) from starving the table's other users,
+and to back off when the service throttles instead of retrying into it"""
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket shared by threads. `acquire` can take more than is available
+    (eg the capacity a DynamoDB request reports it consumed, only known after the
+    request), in which case the debt is paid by sleeping, so that the rate
+    averages out to at most `rate_per_second`."""
+
+    def __init__(self, rate_per_second: float, burst: float = None):
+        self.rate_per_second = rate_per_second
+        self.burst = burst if burst is not None else rate_per_second  # 1 second's worth
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> float:
+        """Returns the number of seconds slept"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate_per_second
+            )
+            self._updated_at = now
+            self._tokens -= amount
+            delay_seconds = max(0.0, -self._tokens / self.rate_per_second)
+        if delay_seconds:
+            time.sleep(delay_seconds)
+        return delay_seconds
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """`RateLimiter` that finds the rate the service sustains: it grows by
+    `increase_factor` after each request that went through, and shrinks by
+    `decrease_factor` after each throttled one (down to `min_rate_per_second`)"""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        min_rate_per_second: float,
+        max_rate_per_second: float,
+        increase_factor: float = 1.1,
+        decrease_factor: float = 0.5,
+    ):
+        super().__init__(rate_per_second)
+        self.min_rate_per_second = min_rate_per_second
+        self.max_rate_per_second = max_rate_per_second
+        self.increase_factor = increase_factor
+        self.decrease_factor = decrease_factor
+
+    def _set_rate(self, rate_per_second: float) -> None:
+        with self._lock:
+            self.rate_per_second = min(
+                self.max_rate_per_second, max(self.min_rate_per_second, rate_per_second)
+            )
+            self.burst = self.rate_per_second
+            self._tokens = min(self._tokens, self.burst)
+
+    def on_success(self) -> None:
+        self._set_rate(self.rate_per_second * self.increase_factor)
+
+    def on_throttle(self) -> None:
+        self._set_rate(self.rate_per_second * self.decrease_factor)
+
+
+THROTTLING_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "ThrottlingException",
+}
+
+
+def is_throttling_error(exception: Exception) -> bool:
+    """For `botocore.exceptions.ClientError`s, without importing botocore"""
+    error_code = getattr(exception, "response", {}).get("Error", {}).get("Code")
+    return error_code in THROTTLING_ERROR_CODES
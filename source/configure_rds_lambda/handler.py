@@ -1,27 +1,71 @@
 import csv
-import os
+import functools
 
-import pymysql
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import ConnectionPool, connect_to_rds, ping_rds
+from cdc_runtime.instrumentation import instrumented
+from cdc_runtime.normalization import (
+    create_conversion_sql_expression,
+    get_column_definitions,
+    get_column_names,
+    get_legacy_column_names,
+)
+from cdc_runtime.seed_data import get_seed_data_path
 
-CSV_FILENAME = os.environ["CSV_FILENAME"]
-RDS_HOST = os.environ["RDS_HOST"]
-RDS_USER = os.environ["RDS_USER"]
-RDS_PASSWORD = os.environ["RDS_PASSWORD"]
-RDS_DATABASE_NAME = os.environ["RDS_DATABASE_NAME"]
-RDS_TABLE_NAME = os.environ["RDS_TABLE_NAME"]
+CSV_FILENAME = get_env("CSV_FILENAME")
+RDS_DATABASE_NAME = get_env("RDS_DATABASE_NAME")
+RDS_TABLE_NAME = get_env("RDS_TABLE_NAME")
+RDS_CSV_NORMALIZATION = get_json_env("RDS_CSV_NORMALIZATION")
+
+rds_connection_pool = ConnectionPool(  # reused by later warm invocations
+    functools.partial(
+        connect_to_rds,
+        autocommit=True,  # needs be True for the statements to run successfully
+    ),
+    health_check=ping_rds,
+)
+
+
+def migrate_legacy_columns_sql_statements(cursor, header: list) -> list:
+    """Renames the columns of tables created before the headers were trimmed
+    (`_withdrawal_amt_` to `withdrawal_amt`), and converts the strings of their
+    `COLUMN_TYPES` columns to those types. Nothing once migrated."""
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = %s AND table_name = %s;",
+        (RDS_DATABASE_NAME, RDS_TABLE_NAME),
+    )
+    data_types = {column_name: data_type.lower() for column_name, data_type in cursor.fetchall()}
+    table = f"`{RDS_DATABASE_NAME}`.`{RDS_TABLE_NAME}`"
+    sql_statements = []
+    for legacy_column_name, column_name in zip(
+        get_legacy_column_names(header), get_column_names(header)
+    ):
+        if column_name not in data_types and legacy_column_name in data_types:
+            sql_statements.append(
+                f"ALTER TABLE {table} RENAME COLUMN `{legacy_column_name}` TO `{column_name}`;"
+            )
+            data_types[column_name] = data_types.pop(legacy_column_name)
+        column_type = RDS_CSV_NORMALIZATION["COLUMN_TYPES"].get(column_name)
+        if column_type is None or data_types.get(column_name) != "varchar":
+            continue
+        conversion = create_conversion_sql_expression(
+            column_name, column_type, RDS_CSV_NORMALIZATION["DATE_FORMAT"]
+        )
+        if conversion is not None:
+            sql_statements += [
+                f"UPDATE {table} SET `{column_name}` = {conversion};",
+                f"ALTER TABLE {table} MODIFY `{column_name}` {column_type};",
+            ]
+    return sql_statements
 
 
+@instrumented
 def lambda_handler(event, context) -> None:
     """Currently only works with MySQL variant of RDS"""
-    conn = pymysql.connect(
-        host=RDS_HOST,
-        user=RDS_USER,
-        passwd=RDS_PASSWORD,
-        db=RDS_DATABASE_NAME,
-        connect_timeout=5,
-        autocommit=True,  # needs be True for the statements to run successfully
-    )
-    with conn, conn.cursor() as cursor, open(CSV_FILENAME) as f:
+    with rds_connection_pool.connection() as conn, conn.cursor() as cursor, open(
+        get_seed_data_path(CSV_FILENAME)
+    ) as f:
         cursor.execute("call mysql.rds_show_configuration;")
         print("original `binlog retention hours`:", cursor.fetchone())
 
@@ -32,18 +76,19 @@ def lambda_handler(event, context) -> None:
         print("new `binlog retention hours`:", cursor.fetchone())
 
         csv_reader = csv.reader(f)
-        column_names = next(csv_reader)
-        column_names = [
-            column_name.replace(" ", "_").lower() for column_name in column_names
-        ]
-        csv_data = [tuple(row) for row in csv_reader]
-        # print(csv_data)
+        header = next(csv_reader)
+        column_names = get_column_names(header)
         cursor.execute(
             "CREATE TABLE if not exists `{rds_database_name}`.`{rds_table_name}` ({column_name_and_types});".format(
                 rds_database_name=RDS_DATABASE_NAME,
                 rds_table_name=RDS_TABLE_NAME,
                 column_name_and_types=", ".join(
-                    f"{column_name} varchar(40)" for column_name in column_names
+                    get_column_definitions(
+                        column_names, RDS_CSV_NORMALIZATION["COLUMN_TYPES"]
+                    )
                 ),
             )  # did not define a primary key
         )
+        for sql_statement in migrate_legacy_columns_sql_statements(cursor, header):
+            cursor.execute(sql_statement)
+            print(f"Finished executing the following SQL statement: {sql_statement}")
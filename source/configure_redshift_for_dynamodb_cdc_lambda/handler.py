@@ -1,43 +1,180 @@
-import os
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import connect_to_redshift
+from cdc_runtime.freshness import FRESHNESS_COLUMNS
+from cdc_runtime.instrumentation import count, instrumented
+from cdc_runtime.kinesis import create_streaming_materialized_view_sql_statements
+from cdc_runtime.promotion import get_promoted_column_definitions, get_promoted_columns
+from cdc_runtime.rollups import (
+    create_missing_rollups,
+    get_rollups,
+    materialized_view_exists,
+    table_exists,
+)
+from cdc_runtime.serializers import (
+    SEQUENCE_NUMBER_COLUMN,
+    SEQUENCE_NUMBER_COLUMN_DEFINITION,
+    SEQUENCE_NUMBER_LENGTH,
+)
 
-import redshift_connector
+REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC = get_env("REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC")
+DYNAMODB_CDC_TABLES = get_json_env("DYNAMODB_CDC_TABLES")
+DYNAMODB_CDC_PIPELINE = get_json_env("DYNAMODB_CDC_PIPELINE")
+REDSHIFT_ROLLUPS = get_json_env("REDSHIFT_ROLLUPS")
+if DYNAMODB_CDC_PIPELINE["MODE"] == "KINESIS":
+    REDSHIFT_ROLE_ARN = get_env("REDSHIFT_ROLE_ARN")
+    DYNAMODB_CDC_TABLE_KEY_TO_KINESIS_STREAM_NAME = get_json_env(
+        "DYNAMODB_CDC_TABLE_KEY_TO_KINESIS_STREAM_NAME"
+    )
 
 
-# aws_redshift.CfnCluster(...).attr_id (for cluster name) is broken, so using endpoint address instead
-REDSHIFT_HOST = os.environ["REDSHIFT_ENDPOINT_ADDRESS"].split(":")[0]
-REDSHIFT_USER = os.environ["REDSHIFT_USER"]
-REDSHIFT_PASSWORD = os.environ["REDSHIFT_PASSWORD"]
-REDSHIFT_DATABASE_NAME = os.environ["REDSHIFT_DATABASE_NAME"]
-REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC = os.environ[
-    "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
-]
-REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC = os.environ[
-    "REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC"
-]
+def create_table_sql_statement(cdc_table: dict) -> str:
+    column_names_and_types = ",\n                ".join(
+        cdc_table["REDSHIFT_COLUMNS"]
+        + get_promoted_column_definitions(cdc_table)  # typed copies of JSON paths
+        + FRESHNESS_COLUMNS
+        + [SEQUENCE_NUMBER_COLUMN_DEFINITION]  # to order the versions of an item
+    )
+    return f"""CREATE TABLE IF NOT EXISTS
+            "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}"."{cdc_table["REDSHIFT_TABLE_NAME"]}" (
+                {column_names_and_types}
+            );"""
 
 
-def lambda_handler(event, context) -> None:
-    sql_statements = [
-        f'CREATE SCHEMA IF NOT EXISTS "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}";',
-        f"""CREATE TABLE IF NOT EXISTS
-            "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}"."{REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC}" (
-                id varchar(30) UNIQUE NOT NULL,
-                details super,
-                price float,
-                shares integer,
-                ticker varchar(10),
-                ticket varchar(10),
-                time super
-            );""",  # hard coded columns
-    ]
-    conn = redshift_connector.connect(
-        host=REDSHIFT_HOST,
-        database=REDSHIFT_DATABASE_NAME,
-        user=REDSHIFT_USER,
-        password=REDSHIFT_PASSWORD,
+def get_added_column_definitions(cdc_table: dict) -> list:
+    """Columns that tables created by earlier versions (or before the promoted
+    columns were configured) may lack, while the loaders COPY into them"""
+    return (
+        get_promoted_column_definitions(cdc_table)
+        + FRESHNESS_COLUMNS
+        + [SEQUENCE_NUMBER_COLUMN_DEFINITION]
+    )
+
+
+def get_column_lengths(cursor, cdc_table: dict) -> dict:
+    """{column name: its maximum length, or None if not a character column}"""
+    cursor.execute(
+        "SELECT column_name, character_maximum_length FROM information_schema.columns "
+        "WHERE table_schema = %s AND table_name = %s;",
+        (REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC, cdc_table["REDSHIFT_TABLE_NAME"]),
     )
+    count("RedshiftStatements")
+    return dict(cursor.fetchall())
+
+
+def add_missing_columns_sql_statements(cdc_table: dict, column_lengths: dict) -> list:
+    """`ALTER TABLE`s for the added columns that the table lacks. Rows loaded
+    before keep NULLs in them (or the default)."""
+    return [
+        f'ALTER TABLE "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}".'
+        f'"{cdc_table["REDSHIFT_TABLE_NAME"]}" ADD COLUMN {column_name_and_type};'
+        for column_name_and_type in get_added_column_definitions(cdc_table)
+        if column_name_and_type.split()[0] not in column_lengths
+    ]
+
+
+def widen_sequence_number_column_sql_statements(cdc_table: dict, column_lengths: dict) -> list:
+    """Widens the `varchar(40)` sequence number column of earlier versions (too
+    narrow for Kinesis sequence numbers) and pads its values to the new width, so
+    that they keep sorting before the ones loaded after"""
+    length = column_lengths.get(SEQUENCE_NUMBER_COLUMN)
+    if length is None or length >= SEQUENCE_NUMBER_LENGTH:  # or just added
+        return []
+    table = f'"{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}"."{cdc_table["REDSHIFT_TABLE_NAME"]}"'
+    return [
+        f"ALTER TABLE {table} ALTER COLUMN {SEQUENCE_NUMBER_COLUMN} "
+        f"TYPE varchar({SEQUENCE_NUMBER_LENGTH});",
+        f"UPDATE {table} SET {SEQUENCE_NUMBER_COLUMN} = "
+        f"LPAD({SEQUENCE_NUMBER_COLUMN}, {SEQUENCE_NUMBER_LENGTH}, '0') "
+        f"WHERE LEN({SEQUENCE_NUMBER_COLUMN}) < {SEQUENCE_NUMBER_LENGTH};",
+    ]
+
+
+def check_pipeline_mode_of_existing_table(cursor, cdc_table: dict) -> bool:
+    """Whether the materialized view of the `KINESIS` mode exists. The table of
+    the `S3` mode has the same name, so a table left by the other mode (after
+    switching `DYNAMODB_CDC_PIPELINE`) raises a ValueError here, rather than
+    failing the view's creation or the loader's COPYs later."""
+    schema_and_name = (REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC, cdc_table["REDSHIFT_TABLE_NAME"])
+    table = '"{}"."{}"'.format(*schema_and_name)
+    if materialized_view_exists(cursor, *schema_and_name):
+        if DYNAMODB_CDC_PIPELINE["MODE"] != "KINESIS":
+            raise ValueError(
+                f"{table} is the materialized view of the `KINESIS` pipeline mode, so the "
+                f"`S3` mode cannot load it. Drop the view and configure again."
+            )
+        return True
+    if DYNAMODB_CDC_PIPELINE["MODE"] == "KINESIS" and table_exists(cursor, *schema_and_name):
+        raise ValueError(
+            f"{table} is a table (eg of the `S3` pipeline mode), so the `KINESIS` mode "
+            f"cannot create its materialized view of the same name. Rename or drop the "
+            f"table (after copying out its rows if they are needed) and configure again."
+        )
+    return False
+
+
+def execute_sql_statements(conn, cursor, sql_statements: list) -> None:
+    for sql_statement in sql_statements:
+        cursor.execute(sql_statement)
+        conn.commit()
+        count("RedshiftStatements")
+        print(f"Finished executing the following SQL statement: {sql_statement}")
+
+
+@instrumented
+def lambda_handler(event, context) -> None:
+    conn = connect_to_redshift()
     with conn, conn.cursor() as cursor:
-        for sql_statement in sql_statements:
-            cursor.execute(sql_statement)
-            conn.commit()
-            print(f"Finished executing the following SQL statement: {sql_statement}")
+        sql_statements = [
+            f'CREATE SCHEMA IF NOT EXISTS "{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}";',
+        ]
+        for cdc_table_key, cdc_table in DYNAMODB_CDC_TABLES.items():  # in `cdk.json`
+            view_exists = check_pipeline_mode_of_existing_table(cursor, cdc_table)
+            if DYNAMODB_CDC_PIPELINE["MODE"] != "KINESIS":
+                sql_statements.append(create_table_sql_statement(cdc_table))
+            elif not view_exists:
+                sql_statements += create_streaming_materialized_view_sql_statements(
+                    redshift_table=(
+                        f'"{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}".'
+                        f'"{cdc_table["REDSHIFT_TABLE_NAME"]}"'
+                    ),
+                    external_schema_name=DYNAMODB_CDC_PIPELINE["KINESIS"][
+                        "EXTERNAL_SCHEMA_NAME"
+                    ],
+                    kinesis_stream_name=DYNAMODB_CDC_TABLE_KEY_TO_KINESIS_STREAM_NAME[
+                        cdc_table_key
+                    ],
+                    redshift_columns=cdc_table["REDSHIFT_COLUMNS"],
+                    redshift_role_arn=REDSHIFT_ROLE_ARN,
+                    promoted_columns=get_promoted_columns(cdc_table),
+                )
+        execute_sql_statements(conn, cursor, sql_statements)
+        if DYNAMODB_CDC_PIPELINE["MODE"] != "KINESIS":  # views are not altered, but
+            for cdc_table in DYNAMODB_CDC_TABLES.values():  # dropped and recreated
+                column_lengths = get_column_lengths(cursor, cdc_table)
+                execute_sql_statements(
+                    conn, cursor, add_missing_columns_sql_statements(cdc_table, column_lengths)
+                )
+                conn.autocommit = True  # ALTER COLUMN cannot run inside a transaction block
+                execute_sql_statements(
+                    conn,
+                    cursor,
+                    widen_sequence_number_column_sql_statements(cdc_table, column_lengths),
+                )
+                conn.autocommit = False
+        rollups = get_rollups(REDSHIFT_ROLLUPS, "DYNAMODB_CDC_TABLE")
+        if rollups:  # created here, as there is no loader to do it in "KINESIS" mode
+            create_missing_rollups(
+                conn,
+                schema_name=REDSHIFT_ROLLUPS["SCHEMA_NAME"],
+                rollups=rollups,
+                source_tables={
+                    rollup_name: (
+                        REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC,
+                        DYNAMODB_CDC_TABLES[rollup["DYNAMODB_CDC_TABLE"]][
+                            "REDSHIFT_TABLE_NAME"
+                        ],
+                    )
+                    for rollup_name, rollup in rollups.items()
+                },
+                auto_refresh=DYNAMODB_CDC_PIPELINE["MODE"] == "KINESIS",
+            )
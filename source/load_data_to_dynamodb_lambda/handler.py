@@ -1,16 +1,123 @@
 import json
-import os
+import time
+from collections import deque
 from decimal import Decimal
 
-import boto3
+from cdc_runtime.clients import get_boto3_client
+from cdc_runtime.config import get_json_env
+from cdc_runtime.instrumentation import count, instrumented, time_stage
+from cdc_runtime.metrics import put_metrics
+from cdc_runtime.seed_data import get_seed_data_path
+from cdc_runtime.serializers import serialize_dynamodb_item
+from cdc_runtime.throttling import AdaptiveRateLimiter, is_throttling_error
 
-table = boto3.resource("dynamodb").Table(os.environ["DYNAMODB_TABLE_NAME"])
-JSON_FILENAME = os.environ["JSON_FILENAME"]
+DYNAMODB_TABLE_NAME_TO_JSON_FILENAME = get_json_env(
+    "DYNAMODB_TABLE_NAME_TO_JSON_FILENAME"
+)
+DYNAMODB_SEEDING = get_json_env("DYNAMODB_SEEDING")  # items per second
 
+MAX_BATCH_WRITE_ITEMS = 25  # limit of `BatchWriteItem`
+MIN_REMAINING_MILLISECONDS = 500  # to report before the Lambda times out
 
+
+def write_items(dynamodb_table_name: str, items: list, context) -> dict:
+    """Writes `items` in batches at an adaptive rate: faster while DynamoDB takes
+    them, slower whenever it throttles (with an exception, or by returning
+    unprocessed items), which are then retried. Stops early instead of timing
+    out, since every run rewrites the whole seed file anyway. The time waited
+    before a batch is `PacingSeconds`, or `BackoffSeconds` before retrying a
+    throttled one, so that throttling shows apart from the rate limit itself."""
+    dynamodb_client = get_boto3_client("dynamodb")
+    rate_limiter = AdaptiveRateLimiter(
+        DYNAMODB_SEEDING["INITIAL_WRITES_PER_SECOND"],
+        min_rate_per_second=DYNAMODB_SEEDING["MIN_WRITES_PER_SECOND"],
+        max_rate_per_second=DYNAMODB_SEEDING["MAX_WRITES_PER_SECOND"],
+    )
+    put_requests = [{"PutRequest": {"Item": serialize_dynamodb_item(item)}} for item in items]
+    batches = deque(
+        put_requests[start : start + MAX_BATCH_WRITE_ITEMS]
+        for start in range(0, len(put_requests), MAX_BATCH_WRITE_ITEMS)
+    )
+    stats = {
+        "Records": 0,
+        "WriteCapacityUnits": 0,
+        "Throttles": 0,
+        "PacingSeconds": 0.0,
+        "BackoffSeconds": 0.0,
+    }
+    is_retry = False  # of a throttled batch
+    while batches:
+        if context is not None and (
+            context.get_remaining_time_in_millis() < MIN_REMAINING_MILLISECONDS
+        ):
+            break
+        batch = batches.popleft()
+        stats["BackoffSeconds" if is_retry else "PacingSeconds"] += rate_limiter.acquire(
+            len(batch)
+        )
+        try:
+            response = dynamodb_client.batch_write_item(
+                RequestItems={dynamodb_table_name: batch},
+                ReturnConsumedCapacity="TOTAL",
+            )
+        except Exception as exception:
+            if not is_throttling_error(exception):
+                raise
+            unprocessed_batch = batch
+        else:
+            unprocessed_batch = response.get("UnprocessedItems", {}).get(
+                dynamodb_table_name, []
+            )
+            stats["Records"] += len(batch) - len(unprocessed_batch)
+            stats["WriteCapacityUnits"] += sum(
+                consumed_capacity["CapacityUnits"]
+                for consumed_capacity in response.get("ConsumedCapacity", [])
+            )
+        count("DynamoDBRequests")
+        is_retry = bool(unprocessed_batch)
+        if unprocessed_batch:
+            stats["Throttles"] += 1
+            rate_limiter.on_throttle()
+            batches.appendleft(unprocessed_batch)
+        else:
+            rate_limiter.on_success()
+    stats["UnwrittenRecords"] = sum(map(len, batches))
+    stats["FinalWritesPerSecond"] = rate_limiter.rate_per_second
+    return stats
+
+
+@instrumented
 def lambda_handler(event, context):
-    with table.batch_writer() as writer, open(JSON_FILENAME) as f:
-        trades = json.load(f, parse_float=Decimal)["data"]
-        for trade in trades:
-            writer.put_item(Item=trade)
+    for dynamodb_table_name, json_filename in DYNAMODB_TABLE_NAME_TO_JSON_FILENAME.items():
+        with open(get_seed_data_path(json_filename)) as f, time_stage("Deserialize"):
+            items = json.load(f, parse_float=Decimal)["data"]
+        start = time.perf_counter()
+        with time_stage("Write"):
+            stats = write_items(dynamodb_table_name, items, context)
+        seconds = time.perf_counter() - start
+        count("Records", stats["Records"])
+        stats["RecordsPerSecond"] = stats["Records"] / seconds if seconds else 0.0
+        stats["WriteCapacityUnitsPerSecond"] = (
+            stats["WriteCapacityUnits"] / seconds if seconds else 0.0
+        )
+        put_metrics(  # achieved throughput, to size the table's capacity
+            stats,
+            units={
+                "Records": "Count",
+                "WriteCapacityUnits": "Count",
+                "Throttles": "Count",
+                "PacingSeconds": "Seconds",
+                "BackoffSeconds": "Seconds",
+                "UnwrittenRecords": "Count",
+                "FinalWritesPerSecond": "Count/Second",
+                "RecordsPerSecond": "Count/Second",
+                "WriteCapacityUnitsPerSecond": "Count/Second",
+            },
+            dimensions={"DynamoDBTable": dynamodb_table_name},
+        )
+        if stats["UnwrittenRecords"]:
+            print(
+                f"Ran out of time with {stats['UnwrittenRecords']} items of "
+                f"`{json_filename}` left, which the next run writes"
+            )
     return
@@ -1,40 +1,40 @@
 import csv
-import os
 
-import pymysql
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import ConnectionPool, connect_to_rds, ping_rds
+from cdc_runtime.instrumentation import count, instrumented, time_stage
+from cdc_runtime.normalization import get_column_names, normalize_rows
+from cdc_runtime.seed_data import get_seed_data_path
 
-CSV_FILENAME = os.environ["CSV_FILENAME"]
-RDS_HOST = os.environ["RDS_HOST"]
-RDS_USER = os.environ["RDS_USER"]
-RDS_PASSWORD = os.environ["RDS_PASSWORD"]
-RDS_DATABASE_NAME = os.environ["RDS_DATABASE_NAME"]
-RDS_TABLE_NAME = os.environ["RDS_TABLE_NAME"]
+CSV_FILENAME = get_env("CSV_FILENAME")
+RDS_DATABASE_NAME = get_env("RDS_DATABASE_NAME")
+RDS_TABLE_NAME = get_env("RDS_TABLE_NAME")
+RDS_CSV_NORMALIZATION = get_json_env("RDS_CSV_NORMALIZATION")
 
+rds_connection_pool = ConnectionPool(  # reused by later warm invocations
+    connect_to_rds, health_check=ping_rds
+)
 
+
+@instrumented
 def lambda_handler(event, context) -> None:
-    conn = pymysql.connect(
-        host=RDS_HOST,
-        user=RDS_USER,
-        passwd=RDS_PASSWORD,
-        db=RDS_DATABASE_NAME,
-        connect_timeout=5,
-    )
-    with conn, conn.cursor() as cursor, open(CSV_FILENAME) as f:
+    with rds_connection_pool.connection() as conn, conn.cursor() as cursor, open(
+        get_seed_data_path(CSV_FILENAME)
+    ) as f:
         csv_reader = csv.reader(f)
-        column_names = next(csv_reader)
-        column_names = [
-            column_name.replace(" ", "_").lower() for column_name in column_names
-        ]
-        csv_data = [tuple(row) for row in csv_reader]
-        cursor.executemany(
-            """
+        column_names = get_column_names(next(csv_reader))
+        sql_statement = """
             INSERT INTO `{rds_database_name}`.`{rds_table_name}` ({column_names})
             VALUES ({column_types});""".format(
-                rds_database_name=RDS_DATABASE_NAME,
-                rds_table_name=RDS_TABLE_NAME,
-                column_names=", ".join(column_names),
-                column_types=", ".join(["%s"] * len(column_names)),
-            ),
-            csv_data,
+            rds_database_name=RDS_DATABASE_NAME,
+            rds_table_name=RDS_TABLE_NAME,
+            column_names=", ".join(column_names),
+            column_types=", ".join(["%s"] * len(column_names)),
         )
-        conn.commit()
+        num_records = 0
+        for rows in normalize_rows(csv_reader, column_names, RDS_CSV_NORMALIZATION):
+            with time_stage("Insert"):
+                cursor.executemany(sql_statement, rows)
+            num_records += len(rows)
+        conn.commit()  # all the batches or none, as the table has no key to dedupe
+        count("Records", num_records)
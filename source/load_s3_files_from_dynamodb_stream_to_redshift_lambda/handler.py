@@ -1,98 +1,208 @@
-import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
-import boto3
-import redshift_connector
+from cdc_runtime.clients import get_boto3_client
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import ConnectionPool, connect_to_redshift
+from cdc_runtime.freshness import (
+    PERCENTILES,
+    STAMPED_COLUMN_NAMES,
+    create_freshness_sql_statement,
+)
+from cdc_runtime.instrumentation import count, instrumented, time_stage
+from cdc_runtime.metrics import put_metrics
+from cdc_runtime.promotion import get_promoted_columns
+from cdc_runtime.rollups import get_rollups, refresh_rollups
+from cdc_runtime.serializers import SEQUENCE_NUMBER_COLUMN
 
-AWS_REGION = os.environ["AWSREGION"]
+AWS_REGION = get_env("AWSREGION")
 
-s3_client = boto3.client("s3")
-S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT = os.environ[
+S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT = get_env(
     "S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT"
-]
-UNPROCESSED_DYNAMODB_STREAM_FOLDER = os.environ["UNPROCESSED_DYNAMODB_STREAM_FOLDER"]
-PROCESSED_DYNAMODB_STREAM_FOLDER = os.environ["PROCESSED_DYNAMODB_STREAM_FOLDER"]
-
-# aws_redshift.CfnCluster(...).attr_id (for cluster name) is broken, so using endpoint address instead
-REDSHIFT_HOST = os.environ["REDSHIFT_ENDPOINT_ADDRESS"].split(":")[0]
-REDSHIFT_USER = os.environ["REDSHIFT_USER"]
-REDSHIFT_PASSWORD = os.environ["REDSHIFT_PASSWORD"]
-REDSHIFT_ROLE_ARN = os.environ["REDSHIFT_ROLE_ARN"]
-REDSHIFT_DATABASE_NAME = os.environ["REDSHIFT_DATABASE_NAME"]
-REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC = os.environ[
-    "REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC"
-]
-REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC = os.environ[
-    "REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC"
-]
+)
+UNPROCESSED_DYNAMODB_STREAM_FOLDER = get_env("UNPROCESSED_DYNAMODB_STREAM_FOLDER")
+PROCESSED_DYNAMODB_STREAM_FOLDER = get_env("PROCESSED_DYNAMODB_STREAM_FOLDER")
+
+REDSHIFT_ROLE_ARN = get_env("REDSHIFT_ROLE_ARN")
+REDSHIFT_DATABASE_NAME = get_env("REDSHIFT_DATABASE_NAME")
+REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC = get_env("REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC")
+DYNAMODB_CDC_TABLES = get_json_env("DYNAMODB_CDC_TABLES")
+DEFAULT_CDC_TABLE_KEY = next(iter(DYNAMODB_CDC_TABLES))  # the table of earlier versions
+MAX_CONCURRENT_REDSHIFT_COPIES = get_json_env(
+    "MAX_CONCURRENT_REDSHIFT_COPIES"
+)  # bounded by the cluster's WLM query slots
+REDSHIFT_ROLLUPS = get_json_env("REDSHIFT_ROLLUPS")
+
+redshift_connection_pool = ConnectionPool(  # reused by later warm invocations
+    connect_to_redshift, max_idle=MAX_CONCURRENT_REDSHIFT_COPIES
+)
 
 
 def move_s3_file(s3_bucket: str, old_s3_filename: str, new_s3_filename) -> None:
-    s3_client.copy_object(
-        Bucket=s3_bucket,
-        Key=new_s3_filename,
-        CopySource={"Bucket": s3_bucket, "Key": old_s3_filename},
-    )
-    s3_client.delete_object(
-        Bucket=s3_bucket,
-        Key=old_s3_filename,
-    )
-    print(
-        f"Moved s3://{s3_bucket}/{old_s3_filename} to "
-        f"s3://{s3_bucket}/{new_s3_filename}"
+    s3_client = get_boto3_client("s3")
+    with time_stage("Archive"):
+        s3_client.copy_object(
+            Bucket=s3_bucket,
+            Key=new_s3_filename,
+            CopySource={"Bucket": s3_bucket, "Key": old_s3_filename},
+        )
+        s3_client.delete_object(
+            Bucket=s3_bucket,
+            Key=old_s3_filename,
+        )
+    count("S3Requests", 2)
+
+
+def list_s3_files(s3_bucket: str, s3_folder: str) -> list:
+    paginator = get_boto3_client("s3").get_paginator("list_objects_v2")
+    s3_files = []
+    with time_stage("List"):
+        for page in paginator.paginate(
+            Bucket=s3_bucket, Prefix=f"{s3_folder}/", Delimiter="/"
+        ):
+            count("S3Requests")
+            s3_files.extend(dct["Key"] for dct in page.get("Contents", []))
+    return s3_files
+
+
+def get_copy_column_names(cdc_table: dict) -> list:
+    """Every column but the load time, which Redshift fills with its default"""
+    return [
+        column_name_and_type.split()[0]
+        for column_name_and_type in cdc_table["REDSHIFT_COLUMNS"]
+    ] + [
+        column_name for _, column_name, _ in get_promoted_columns(cdc_table)
+    ] + STAMPED_COLUMN_NAMES + [SEQUENCE_NUMBER_COLUMN]
+
+
+def copy_s3_file_to_redshift_table(
+    s3_file: str, redshift_table_name: str, column_names: list
+) -> None:
+    sql_statement = f"""
+        COPY {REDSHIFT_DATABASE_NAME}.{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}.{redshift_table_name}
+        ({", ".join(f'"{column_name}"' for column_name in column_names)})
+        FROM 's3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/{s3_file}'
+        REGION '{AWS_REGION}'
+        iam_role '{REDSHIFT_ROLE_ARN}'
+        format as json 'auto';
+    """
+    with redshift_connection_pool.connection() as conn, conn.cursor() as cursor:
+        with time_stage("Copy"):
+            cursor.execute(sql_statement)
+            conn.commit()
+    count("RedshiftStatements")
+
+
+def measure_freshness(
+    cdc_table_key: str, redshift_table_name: str, loaded_since: datetime
+) -> None:
+    """Emits the lag percentiles of the rows loaded since `loaded_since`"""
+    sql_statement = create_freshness_sql_statement(
+        f"{REDSHIFT_DATABASE_NAME}.{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}.{redshift_table_name}",
+        loaded_since=loaded_since,
     )
+    with redshift_connection_pool.connection() as conn, conn.cursor() as cursor:
+        with time_stage("Freshness"):
+            cursor.execute(sql_statement)
+            num_rows, *lags_ms = cursor.fetchone()
+    count("RedshiftStatements")
+    if num_rows:
+        freshness_metrics = {
+            f"FreshnessLagP{percentile}": float(lag_ms) / 1000
+            for percentile, lag_ms in zip(PERCENTILES, lags_ms)
+        }
+        put_metrics(
+            freshness_metrics,
+            units={name: "Seconds" for name in freshness_metrics},
+            dimensions={"CDCTable": cdc_table_key},
+            properties={"FreshnessRows": num_rows},
+        )
 
 
-def lambda_handler(event, context) -> None:
-    dynamodb_stream_s3_files = s3_client.list_objects_v2(
-        Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
-        Prefix=f"{UNPROCESSED_DYNAMODB_STREAM_FOLDER}/",
-        Delimiter="/",
-    ).get("Contents", [])
-    dynamodb_stream_s3_files = [dct["Key"] for dct in dynamodb_stream_s3_files]
-    if dynamodb_stream_s3_files:
-        for s3_file in dynamodb_stream_s3_files:
-            if "__inserted_or_modified_records.json" in s3_file:  # hard coded suffix
-                sql_statement = f"""
-                    COPY {REDSHIFT_DATABASE_NAME}.{REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC}.{REDSHIFT_TABLE_NAME_FOR_DYNAMODB_CDC}
-                    FROM 's3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/{s3_file}'
-                    REGION '{AWS_REGION}'
-                    iam_role '{REDSHIFT_ROLE_ARN}'
-                    format as json 'auto';
-                """
-                conn = redshift_connector.connect(
-                    host=REDSHIFT_HOST,
-                    database=REDSHIFT_DATABASE_NAME,
-                    user=REDSHIFT_USER,
-                    password=REDSHIFT_PASSWORD,
-                )
-                with conn, conn.cursor() as cursor:
-                    cursor.execute(sql_statement)
-                    conn.commit()
-                    print(f"Finished executing the following SQL statement: {sql_statement}")
-                move_s3_file(
-                    s3_bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
-                    old_s3_filename=s3_file,
-                    new_s3_filename=s3_file.replace(
-                        UNPROCESSED_DYNAMODB_STREAM_FOLDER,
-                        PROCESSED_DYNAMODB_STREAM_FOLDER,
-                    ),
-                )
-            elif (
-                "__no_inserted_or_modified_records.txt" in s3_file
-            ):  # hard coded suffix
-                move_s3_file(
-                    s3_bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
-                    old_s3_filename=s3_file,
-                    new_s3_filename=s3_file.replace(
-                        UNPROCESSED_DYNAMODB_STREAM_FOLDER,
-                        PROCESSED_DYNAMODB_STREAM_FOLDER,
-                    ),
-                )
-            else:
-                raise  ### figure out useful message in exception
-    else:
+def load_s3_files_to_redshift_table(cdc_table_key: str, cdc_table: dict) -> int:
+    """Loads every unprocessed file of 1 CDC table. Each thread takes its own
+    connection from the pool (`redshift_connector` connections are not thread safe)"""
+    loaded_since = datetime.now(tz=timezone.utc)
+    unprocessed_s3_folder = f"{UNPROCESSED_DYNAMODB_STREAM_FOLDER}/{cdc_table_key}"
+    dynamodb_stream_s3_files = []
+    if cdc_table_key == DEFAULT_CDC_TABLE_KEY:  # files of the single table of earlier
+        dynamodb_stream_s3_files += list_s3_files(  # versions, written directly in
+            s3_bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,  # the folder, go first
+            s3_folder=UNPROCESSED_DYNAMODB_STREAM_FOLDER,
+        )
+    dynamodb_stream_s3_files += list_s3_files(
+        s3_bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+        s3_folder=unprocessed_s3_folder,
+    )
+    if not dynamodb_stream_s3_files:
         print(
             "No DynamoDB stream files in "
-            f"s3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/"
-            f"{UNPROCESSED_DYNAMODB_STREAM_FOLDER}/ folder"
+            f"s3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/{unprocessed_s3_folder}/ folder"
         )
+        return 0
+    count("Files", len(dynamodb_stream_s3_files))
+    for s3_file in dynamodb_stream_s3_files:
+        if "__inserted_or_modified_records.json" in s3_file:  # hard coded suffix
+            copy_s3_file_to_redshift_table(
+                s3_file=s3_file,
+                redshift_table_name=cdc_table["REDSHIFT_TABLE_NAME"],
+                column_names=get_copy_column_names(cdc_table),
+            )
+        elif "__no_inserted_or_modified_records.txt" in s3_file:  # hard coded suffix
+            count("SkippedFiles")  # empty markers of earlier versions of the writer
+        else:
+            raise ValueError(
+                f"Did not expect s3://{S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT}/{s3_file}"
+            )
+        move_s3_file(
+            s3_bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
+            old_s3_filename=s3_file,
+            new_s3_filename=s3_file.replace(
+                UNPROCESSED_DYNAMODB_STREAM_FOLDER,
+                PROCESSED_DYNAMODB_STREAM_FOLDER,
+                1,
+            ),
+        )
+    measure_freshness(
+        cdc_table_key,
+        redshift_table_name=cdc_table["REDSHIFT_TABLE_NAME"],
+        loaded_since=loaded_since,
+    )
+    rollups = get_rollups(REDSHIFT_ROLLUPS, "DYNAMODB_CDC_TABLE", cdc_table_key)
+    if rollups:  # incrementally, ie only the rows just loaded are aggregated
+        with redshift_connection_pool.connection() as conn:
+            refresh_rollups(
+                conn,
+                schema_name=REDSHIFT_ROLLUPS["SCHEMA_NAME"],
+                rollups=rollups,
+                source_tables={
+                    rollup_name: (
+                        REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC,
+                        cdc_table["REDSHIFT_TABLE_NAME"],
+                    )
+                    for rollup_name in rollups
+                },
+            )
+    return len(dynamodb_stream_s3_files)
+
+
+@instrumented
+def lambda_handler(event, context) -> None:
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REDSHIFT_COPIES) as executor:
+        futures = {
+            cdc_table_key: executor.submit(
+                load_s3_files_to_redshift_table,
+                cdc_table_key=cdc_table_key,
+                cdc_table=cdc_table,
+            )
+            for cdc_table_key, cdc_table in DYNAMODB_CDC_TABLES.items()
+        }
+    failed_cdc_table_keys = []
+    for cdc_table_key, future in futures.items():
+        try:  # 1 failing table should not stop the other tables from loading
+            print(f"Processed {future.result()} S3 files for `{cdc_table_key}`")
+        except Exception as exception:
+            print(f"Failed to load `{cdc_table_key}`: {exception!r}")
+            failed_cdc_table_keys.append(cdc_table_key)
+    if failed_cdc_table_keys:
+        raise RuntimeError(f"Failed to load CDC tables: {failed_cdc_table_keys}")
@@ -0,0 +1,151 @@
+import json
+import time
+
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import connect_to_redshift
+from cdc_runtime.instrumentation import count, instrumented, time_stage
+from cdc_runtime.metrics import put_metrics
+
+RDS_DATABASE_NAME = get_env("RDS_DATABASE_NAME")  # DMS creates a schema of its name
+REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC = get_env("REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC")
+DYNAMODB_CDC_PIPELINE = get_json_env("DYNAMODB_CDC_PIPELINE")
+REDSHIFT_MAINTENANCE = get_json_env("REDSHIFT_MAINTENANCE")
+
+
+def get_cdc_schema_names() -> list:
+    """Schemas of the CDC target tables. Streaming ingestion views (the "KINESIS"
+    `DYNAMODB_CDC_PIPELINE`) are maintained by Redshift itself."""
+    schema_names = [RDS_DATABASE_NAME]
+    if DYNAMODB_CDC_PIPELINE["MODE"] != "KINESIS":
+        schema_names.append(REDSHIFT_SCHEMA_NAME_FOR_DYNAMODB_CDC)
+    return schema_names
+
+
+def list_tables(cursor) -> list:
+    """Health of the CDC target tables (tables without rows are not in
+    `SVV_TABLE_INFO`), most unsorted first"""
+    schema_names = get_cdc_schema_names()
+    cursor.execute(
+        f"""
+        SELECT "schema", "table", unsorted, stats_off, tbl_rows, estimated_visible_rows
+        FROM svv_table_info
+        WHERE "schema" IN ({", ".join(["%s"] * len(schema_names))})
+        ORDER BY unsorted DESC NULLS LAST;
+        """,
+        schema_names,
+    )
+    count("RedshiftStatements")
+    tables = []
+    for schema_name, table_name, unsorted, stats_off, num_rows, num_visible_rows in (
+        cursor.fetchall()
+    ):
+        num_rows = int(num_rows or 0)
+        tables.append(
+            {
+                "table": f"{schema_name}.{table_name}",
+                "UnsortedPercent": float(unsorted or 0),  # NULL without a sort key
+                "StatsOff": float(stats_off or 0),
+                "DeletedPercent": (  # rows deleted (or updated, by DMS) but not reclaimed
+                    100 * max(0, num_rows - int(num_visible_rows or 0)) / num_rows
+                    if num_rows
+                    else 0.0
+                ),
+            }
+        )
+    return tables
+
+
+def get_maintenance_sql_statements(table: dict) -> list:
+    """Only what is over its threshold. Deleted rows are reclaimed before
+    sorting, so that the sort does not move them around."""
+    schema_name, table_name = table["table"].split(".", 1)
+    redshift_table = f'"{schema_name}"."{table_name}"'
+    vacuum_to = f"TO {REDSHIFT_MAINTENANCE['VACUUM_TO_PERCENT']} PERCENT"
+    sql_statements = []
+    if table["DeletedPercent"] >= REDSHIFT_MAINTENANCE["DELETED_PERCENT_THRESHOLD"]:
+        sql_statements.append(f"VACUUM DELETE ONLY {redshift_table} {vacuum_to};")
+    if table["UnsortedPercent"] >= REDSHIFT_MAINTENANCE["UNSORTED_PERCENT_THRESHOLD"]:
+        sql_statements.append(f"VACUUM SORT ONLY {redshift_table} {vacuum_to};")
+    if table["StatsOff"] >= REDSHIFT_MAINTENANCE["STATS_OFF_THRESHOLD"]:
+        sql_statements.append(f"ANALYZE {redshift_table} PREDICATE COLUMNS;")
+    return sql_statements
+
+
+def count_active_copies(cursor) -> int:
+    """COPYs running on the cluster (by the DynamoDB loader, the export bootstrap
+    or DMS), which a VACUUM would slow down and be slowed down by. Their text
+    starts as sent, eg with the newline and indentation of a triple quoted string."""
+    cursor.execute(
+        """
+        SELECT COUNT(*)
+        FROM stv_recents
+        WHERE status = 'Running'
+        AND pid <> PG_BACKEND_PID()
+        AND query ~* '^[[:space:]]*copy[[:space:]]';
+        """
+    )
+    count("RedshiftStatements")
+    return int(cursor.fetchone()[0])
+
+
+@instrumented
+def lambda_handler(event, context) -> dict:
+    """Runs the maintenance statements table by table, and stops (until the next
+    scheduled run) when a COPY is active or the Lambda is about to time out"""
+    conn = connect_to_redshift()
+    conn.autocommit = True  # VACUUM cannot run inside a transaction block
+    maintained, deferred = [], []
+    with conn, conn.cursor() as cursor:
+        with time_stage("List"):
+            tables = list_tables(cursor)
+        count("Tables", len(tables))
+        stop_reason = None
+        for table in tables:
+            sql_statements = get_maintenance_sql_statements(table)
+            if not sql_statements:
+                continue
+            if stop_reason is None and context is not None and (
+                context.get_remaining_time_in_millis()
+                < REDSHIFT_MAINTENANCE["MIN_REMAINING_SECONDS"] * 1000
+            ):
+                stop_reason = "time"
+            if stop_reason is None and count_active_copies(cursor):
+                stop_reason = "active COPY"
+            if stop_reason is not None:
+                deferred.append({**table, "reason": stop_reason})
+                continue
+            start = time.perf_counter()
+            with time_stage("Maintain"):
+                for sql_statement in sql_statements:
+                    cursor.execute(sql_statement)
+                    count("RedshiftStatements")
+            seconds = time.perf_counter() - start
+            maintained.append({**table, "statements": sql_statements})
+            put_metrics(
+                {
+                    "UnsortedPercent": table["UnsortedPercent"],
+                    "StatsOff": table["StatsOff"],
+                    "DeletedPercent": table["DeletedPercent"],
+                    "Vacuums": sum(
+                        sql_statement.startswith("VACUUM") for sql_statement in sql_statements
+                    ),
+                    "Analyzes": sum(
+                        sql_statement.startswith("ANALYZE") for sql_statement in sql_statements
+                    ),
+                    "MaintenanceSeconds": seconds,
+                },
+                units={
+                    "UnsortedPercent": "Percent",
+                    "DeletedPercent": "Percent",
+                    "Vacuums": "Count",
+                    "Analyzes": "Count",
+                    "MaintenanceSeconds": "Seconds",
+                },
+                dimensions={"RedshiftTable": table["table"]},
+                properties={"Statements": sql_statements},
+            )
+    count("MaintainedTables", len(maintained))
+    count("DeferredTables", len(deferred))
+    summary = {"maintained": maintained, "deferred": deferred}
+    print(json.dumps(summary))  # what was done, and what is left to the next run
+    return summary
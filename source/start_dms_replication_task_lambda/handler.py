@@ -1,79 +1,126 @@
-import json
-import os
+from cdc_runtime.clients import get_boto3_client
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.connections import (
+    ConnectionPool,
+    connect_to_rds,
+    connect_to_redshift,
+    ping_rds,
+)
+from cdc_runtime.instrumentation import count, instrumented
+from cdc_runtime.rollups import get_rollups, refresh_rollups
 
-import boto3
-import redshift_connector
+DMS_REPLICATION_TASK_ARNS = get_json_env("DMS_REPLICATION_TASK_ARNS")
+PRINT_RDS_AND_REDSHIFT_NUM_ROWS = get_json_env("PRINT_RDS_AND_REDSHIFT_NUM_ROWS")
+if PRINT_RDS_AND_REDSHIFT_NUM_ROWS:
+    DMS_REPLICATION_TASK_TABLE_GROUPS = get_json_env(
+        "DMS_REPLICATION_TASK_TABLE_GROUPS"
+    )
+    REDSHIFT_DATABASE_NAME = get_env("REDSHIFT_DATABASE_NAME")
+REDSHIFT_ROLLUPS = get_json_env("REDSHIFT_ROLLUPS")
+RDS_ROLLUPS = get_rollups(REDSHIFT_ROLLUPS, "RDS_TABLE")  # of the DMS targets
+if RDS_ROLLUPS:
+    RDS_DATABASE_NAME = get_env("RDS_DATABASE_NAME")  # DMS target schema
 
-dms_client = boto3.client("dms")
-DMS_REPLICATION_TASK_ARN = os.environ["DMS_REPLICATION_TASK_ARN"]
-PRINT_RDS_AND_REDSHIFT_NUM_ROWS = json.loads(
-    os.environ["PRINT_RDS_AND_REDSHIFT_NUM_ROWS"]
+rds_connection_pool = ConnectionPool(  # reused by later warm invocations
+    connect_to_rds, health_check=ping_rds
 )
-if PRINT_RDS_AND_REDSHIFT_NUM_ROWS:
-    import pymysql
 
-    RDS_HOST = os.environ["RDS_HOST"]
-    RDS_USER = os.environ["RDS_USER"]
-    RDS_PASSWORD = os.environ["RDS_PASSWORD"]
-    RDS_DATABASE_NAME = os.environ["RDS_DATABASE_NAME"]
-    RDS_TABLE_NAME = os.environ["RDS_TABLE_NAME"]
 
-    REDSHIFT_HOST = os.environ["REDSHIFT_ENDPOINT_ADDRESS"].split(":")[0]
-    REDSHIFT_USER = os.environ["REDSHIFT_USER"]
-    REDSHIFT_PASSWORD = os.environ["REDSHIFT_PASSWORD"]
-    REDSHIFT_DATABASE_NAME = os.environ["REDSHIFT_DATABASE_NAME"]
+def count_rds_table_num_rows() -> list:
+    """Currently only works with MySQL variant of RDS. Returns the
+    (schema, table) pairs matched by the DMS table patterns."""
+    rds_tables = []
+    with rds_connection_pool.connection() as conn, conn.cursor() as cursor:
+        for table_patterns in DMS_REPLICATION_TASK_TABLE_GROUPS:
+            for table_pattern in table_patterns:
+                schema_name, _, table_name = table_pattern.rpartition(".")
+                cursor.execute(  # same `%` wildcard semantics as DMS selection rules
+                    """
+                    SELECT table_schema, table_name FROM information_schema.tables
+                    WHERE table_schema LIKE %s AND table_name LIKE %s
+                    AND table_schema NOT IN
+                        ('mysql', 'sys', 'information_schema', 'performance_schema');""",
+                    (schema_name or "%", table_name),
+                )
+                rds_tables.extend(cursor.fetchall())
+        for rds_schema_name, rds_table_name in sorted(set(rds_tables)):
+            cursor.execute(f"SELECT COUNT(*) FROM `{rds_schema_name}`.`{rds_table_name}`")
+            print(
+                f"RDS table `{rds_schema_name}.{rds_table_name}` "
+                f"has {cursor.fetchone()[0]} rows."
+            )
+    return sorted(set(rds_tables))
 
 
-def count_rds_table_num_rows():
-    """Currently only works with MySQL variant of RDS"""
-    conn = pymysql.connect(
-        host=RDS_HOST,
-        user=RDS_USER,
-        passwd=RDS_PASSWORD,
-        db=RDS_DATABASE_NAME,
-        connect_timeout=5,
-    )
+def count_redshift_table_num_rows(rds_tables: list) -> None:
+    """DMS creates a Redshift schema named after each source MySQL database"""
+    conn = connect_to_redshift()
     with conn, conn.cursor() as cursor:
-        cursor.execute("SELECT COUNT(*) FROM rds_cdc_table")
-        print(
-            f"RDS table `{RDS_DATABASE_NAME}.{RDS_TABLE_NAME}` "
-            f"has {cursor.fetchone()[0]} rows."
-        )
+        for rds_schema_name, rds_table_name in rds_tables:
+            sql_statement = "SELECT COUNT(*) FROM {}.{}.{};".format(
+                REDSHIFT_DATABASE_NAME, rds_schema_name, rds_table_name
+            )
+            cursor.execute(sql_statement)
+            conn.commit()
+            print(
+                f"Finished executing the following SQL statement: {sql_statement} "
+                f"Redshift table has {cursor.fetchone()[0]} rows."
+            )
 
 
-def count_redshift_table_num_rows():
-    conn = redshift_connector.connect(
-        host=REDSHIFT_HOST,
-        database=REDSHIFT_DATABASE_NAME,
-        user=REDSHIFT_USER,
-        password=REDSHIFT_PASSWORD,
-    )
-    with conn, conn.cursor() as cursor:
-        sql_statement = "SELECT COUNT(*) FROM {}.{}.{};".format(
-            REDSHIFT_DATABASE_NAME, RDS_DATABASE_NAME, RDS_TABLE_NAME
+def refresh_rds_rollups() -> None:
+    """DMS applies changes continuously, so the rollups of its target tables are
+    refreshed on every run of this monitor"""
+    source_tables = {}
+    for rollup_name, rollup in RDS_ROLLUPS.items():
+        schema_name, _, table_name = rollup["RDS_TABLE"].rpartition(".")
+        source_tables[rollup_name] = (schema_name or RDS_DATABASE_NAME, table_name)
+    conn = connect_to_redshift()
+    with conn:
+        refresh_rollups(
+            conn,
+            schema_name=REDSHIFT_ROLLUPS["SCHEMA_NAME"],
+            rollups=RDS_ROLLUPS,
+            source_tables=source_tables,
         )
-        cursor.execute(sql_statement)
-        conn.commit()
-        print(f"Finished executing the following SQL statement: {sql_statement}")
 
 
+@instrumented
 def lambda_handler(event, context):
+    dms_client = get_boto3_client("dms")
     response = dms_client.describe_replication_tasks(
-        Filters=[{"Name": "replication-task-arn", "Values": [DMS_REPLICATION_TASK_ARN]}]
+        Filters=[{"Name": "replication-task-arn", "Values": DMS_REPLICATION_TASK_ARNS}]
     )["ReplicationTasks"]
-    assert len(response) == 1, "There should be exactly 1 replication task ARN"
-    status = response[0]["Status"]
-    assert status in ["ready", "stopped", "running"], f"Unexpected status: {status}"
-    if status in ["ready", "stopped"]:
-        response = dms_client.start_replication_task(
-            ReplicationTaskArn=DMS_REPLICATION_TASK_ARN,
-            StartReplicationTaskType="start-replication",
-        )
-        print(f"Started DMS Replication Task. Here is the response: {response}")
-    elif status == "running":
-        print("DMS Replication Task is already running, so do no extra action.")
-        if PRINT_RDS_AND_REDSHIFT_NUM_ROWS:
-            count_rds_table_num_rows()
-            count_redshift_table_num_rows()
-    else:
-        raise
+    count("DMSRequests")
+    assert len(response) == len(
+        DMS_REPLICATION_TASK_ARNS
+    ), f"There should be exactly {len(DMS_REPLICATION_TASK_ARNS)} replication task ARNs"
+    all_running = True
+    for replication_task in response:
+        replication_task_arn = replication_task["ReplicationTaskArn"]
+        status = replication_task["Status"]
+        assert status in ["ready", "stopped", "running"], f"Unexpected status: {status}"
+        if status in ["ready", "stopped"]:
+            all_running = False
+            start_response = dms_client.start_replication_task(
+                ReplicationTaskArn=replication_task_arn,
+                StartReplicationTaskType="start-replication",
+            )
+            count("DMSRequests")
+            count("ReplicationTasksStarted")
+            print(
+                f"Started DMS Replication Task {replication_task_arn}. "
+                f"Here is the response: {start_response}"
+            )
+        elif status == "running":
+            print(
+                f"DMS Replication Task {replication_task_arn} is already running, "
+                "so do no extra action."
+            )
+        else:
+            raise
+    if all_running and PRINT_RDS_AND_REDSHIFT_NUM_ROWS:
+        rds_tables = count_rds_table_num_rows()
+        count_redshift_table_num_rows(rds_tables)
+    if all_running and RDS_ROLLUPS:
+        refresh_rds_rollups()
@@ -1,61 +1,166 @@
-import json
-import os
-import uuid
-from datetime import datetime
-from decimal import Decimal
+import hashlib
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
 
-import boto3
-from boto3.dynamodb.types import TypeDeserializer
+from cdc_runtime.clients import get_boto3_client
+from cdc_runtime.config import get_env, get_json_env
+from cdc_runtime.freshness import (
+    APPROXIMATE_CREATION_TIME_COLUMN,
+    WRITTEN_AT_COLUMN,
+    format_timestamp,
+)
+from cdc_runtime.instrumentation import count, instrumented, time_stage
+from cdc_runtime.promotion import get_promoted_columns, promote_columns
+from cdc_runtime.serializers import (
+    SEQUENCE_NUMBER_COLUMN,
+    deserialize_dynamodb_image,
+    format_sequence_number,
+    to_json_lines,
+)
 
-s3_bucket = boto3.resource("s3").Bucket(
-    os.environ["S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT"]
+S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT = get_env(
+    "S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT"
+)
+UNPROCESSED_DYNAMODB_STREAM_FOLDER = get_env("UNPROCESSED_DYNAMODB_STREAM_FOLDER")
+DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY = get_json_env(
+    "DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY"
 )
-UNPROCESSED_DYNAMODB_STREAM_FOLDER = os.environ["UNPROCESSED_DYNAMODB_STREAM_FOLDER"]
+PROMOTED_COLUMNS_PER_CDC_TABLE = {  # JSON paths also staged as typed columns
+    cdc_table_key: get_promoted_columns(cdc_table)
+    for cdc_table_key, cdc_table in get_json_env("DYNAMODB_CDC_TABLES").items()
+}
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, Decimal):
-            return float(o)
-        return super().default(o)
+def get_cdc_table_key(event_source_arn: str) -> str:
+    """`eventSourceARN` looks like
+    arn:aws:dynamodb:<region>:<account>:table/<table name>/stream/<timestamp>"""
+    dynamodb_table_name = event_source_arn.split(":", 5)[5].split("/")[1]
+    try:
+        return DYNAMODB_TABLE_NAME_TO_CDC_TABLE_KEY[dynamodb_table_name]
+    except KeyError:
+        raise ValueError(
+            f'DynamoDB table "{dynamodb_table_name}" is not in the CDC table registry'
+        )
 
 
-def lambda_handler(event, context) -> None:
-    s3_file_contents = []
-    # print(event["Records"])
-    print(f"Number of records received from DynamoDB stream: {len(event['Records'])}")
-    for record in event["Records"]:
-        if record["eventName"] in ["INSERT", "MODIFY"]:
-            s3_file_contents.append(
-                TypeDeserializer().deserialize({"M": record["dynamodb"]["NewImage"]})
-            )
-        elif record["eventName"] in ["REMOVE"]:
-            pass
-        else:
-            raise ValueError(
-                "Did not expect DynamoDB stream's `eventName` "
-                f'to be "{record["eventName"]}"'
-            )
-    # print(s3_file_contents)
-    s3_file_contents_in_redshift_json_string = "\n".join(
-        json.dumps(record, cls=DecimalEncoder) for record in s3_file_contents
+def create_s3_file_prefix(cdc_table_key: str, stream_records: list) -> str:
+    """Derived from the stream records of the file only, so that a retried batch
+    overwrites its file instead of adding a copy that would be loaded twice.
+    Stream records do not carry their shard ID, so a hash of their `eventID`s
+    (unique per record) tells apart batches of different shards.
+
+    The loader loads files in key order, ie by creation time of the first record,
+    then by sequence number, but that does not order the versions of an item:
+    with a parallelization factor above 1, batches of 1 shard are written
+    concurrently, and sequence numbers of different shards do not compare.
+    Correctness comes from `cdc_sequence_number` instead: queries take the latest
+    version of an item by `cdc_approximate_creation_time, cdc_sequence_number`
+    (as the audit does), whatever order its rows were loaded in."""
+    first_record, last_record = stream_records[0]["dynamodb"], stream_records[-1]["dynamodb"]
+    batch_hash = hashlib.sha1(
+        "".join(record["eventID"] for record in stream_records).encode()
+    ).hexdigest()[:16]
+    return (
+        f"{UNPROCESSED_DYNAMODB_STREAM_FOLDER}/{cdc_table_key}/"
+        f"{datetime.fromtimestamp(first_record['ApproximateCreationDateTime'], tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}__"
+        f"{format_sequence_number(first_record['SequenceNumber'])}__"
+        f"{format_sequence_number(last_record['SequenceNumber'])}__{batch_hash}"
     )
-    if s3_file_contents_in_redshift_json_string:
-        s3_bucket.put_object(
+
+
+def write_s3_file(cdc_table_key: str, s3_file_contents: list, stream_records: list) -> None:
+    if not s3_file_contents:  # eg only `REMOVE` records, so nothing to load
+        count("EmptyBatches")  # instead of writing an empty file
+        return
+    s3_file_prefix = create_s3_file_prefix(cdc_table_key, stream_records)
+    with time_stage("Serialize"):
+        s3_file_contents_in_redshift_json_lines = to_json_lines(s3_file_contents)
+    with time_stage("Upload"):
+        get_boto3_client("s3").put_object(  # low-level client is cheaper than resource
+            Bucket=S3_BUCKET_FOR_DYNAMODB_STREAM_TO_REDSHIFT,
             Key=(
-                f"{UNPROCESSED_DYNAMODB_STREAM_FOLDER}/"
-                f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')}__{uuid.uuid4()}__"
-                f"{len(s3_file_contents)}__inserted_or_modified_records.json"  # hard coded suffix
+                f"{s3_file_prefix}__{len(s3_file_contents)}"
+                "__inserted_or_modified_records.json"  # hard coded suffix
             ),
-            Body=s3_file_contents_in_redshift_json_string.encode(),
+            Body=s3_file_contents_in_redshift_json_lines,
+        )
+    count("S3Requests")
+    count("RecordsWritten", len(s3_file_contents))
+    count("BytesWritten", len(s3_file_contents_in_redshift_json_lines), "Bytes")
+
+
+def convert_record(record: dict, written_at: str, promoted_columns: list = ()):
+    """Returns the row to load into Redshift, or None if there is none"""
+    if record["eventName"] in ["INSERT", "MODIFY"]:
+        s3_file_content = promote_columns(
+            deserialize_dynamodb_image(record["dynamodb"]["NewImage"]), promoted_columns
+        )
+        s3_file_content[APPROXIMATE_CREATION_TIME_COLUMN] = format_timestamp(
+            record["dynamodb"]["ApproximateCreationDateTime"]
         )
+        s3_file_content[WRITTEN_AT_COLUMN] = written_at
+        s3_file_content[SEQUENCE_NUMBER_COLUMN] = format_sequence_number(
+            record["dynamodb"]["SequenceNumber"]
+        )
+        return s3_file_content
+    elif record["eventName"] in ["REMOVE"]:
+        return None
     else:
-        s3_bucket.put_object(
-            Key=(
-                f"{UNPROCESSED_DYNAMODB_STREAM_FOLDER}/"
-                f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')}__{uuid.uuid4()}"
-                "__no_inserted_or_modified_records.txt"  # hard coded suffix
-            )
+        raise ValueError(
+            "Did not expect DynamoDB stream's `eventName` "
+            f'to be "{record["eventName"]}"'
         )
-    print(f"Number of records written to S3 file: {len(s3_file_contents)}")
-    return
+
+
+@instrumented
+def lambda_handler(event, context) -> dict:
+    """Returns the sequence number of the first record that failed as a batch item
+    failure (`ReportBatchItemFailures`), after writing the records before it.
+    Lambda then retries the shard from that record on, so records after it are
+    not written either, which keeps each shard in order."""
+    s3_file_contents_per_cdc_table = defaultdict(list)
+    stream_records_per_cdc_table = defaultdict(list)  # converted ones only
+    failed_sequence_numbers = []
+    # print(event["Records"])
+    count("Records", len(event["Records"]))
+    written_at = format_timestamp(time.time())  # the S3 files are written right after
+    with time_stage("Deserialize"):
+        for record in event["Records"]:
+            sequence_number = record["dynamodb"]["SequenceNumber"]
+            try:
+                cdc_table_key = get_cdc_table_key(record["eventSourceARN"])
+                s3_file_content = convert_record(
+                    record,
+                    written_at=written_at,
+                    promoted_columns=PROMOTED_COLUMNS_PER_CDC_TABLE[cdc_table_key],
+                )
+            except Exception as exception:
+                print(f"Failed to convert record {sequence_number}: {exception!r}")
+                failed_sequence_numbers.append(sequence_number)
+                break
+            stream_records_per_cdc_table[cdc_table_key].append(record)
+            s3_file_contents = s3_file_contents_per_cdc_table[cdc_table_key]
+            if s3_file_content is not None:
+                s3_file_contents.append(s3_file_content)
+    # print(s3_file_contents_per_cdc_table)
+    for cdc_table_key, s3_file_contents in s3_file_contents_per_cdc_table.items():
+        try:
+            write_s3_file(
+                cdc_table_key=cdc_table_key,
+                s3_file_contents=s3_file_contents,
+                stream_records=stream_records_per_cdc_table[cdc_table_key],
+            )
+        except Exception as exception:
+            print(f"Failed to write S3 file for `{cdc_table_key}`: {exception!r}")
+            failed_sequence_numbers.append(
+                stream_records_per_cdc_table[cdc_table_key][0]["dynamodb"]["SequenceNumber"]
+            )
+    if not failed_sequence_numbers:
+        return {"batchItemFailures": []}
+    count("BatchItemFailures")
+    return {  # sequence numbers are numeric strings of varying length
+        "batchItemFailures": [
+            {"itemIdentifier": min(failed_sequence_numbers, key=int)}
+        ]
+    }